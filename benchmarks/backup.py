@@ -0,0 +1,120 @@
+"""Compares the old str(dict) backup with snapshot backups.
+
+Measures the time and peak python memory of a legacy dump, a full
+backup, an incremental backup after 1% of keys change and a restore.
+
+Run from the repository root with:
+
+    python -m benchmarks.backup [keys ...]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import orjson
+
+from cogs.utils import codec
+from cogs.utils.backup import Backups, is_excluded
+from cogs.utils.database import Database
+
+
+def populate(db: Database, keys: int):
+    """Fills a db with a mix of json blobs and encoded numbers."""
+    rng = random.Random(0)
+
+    with db.main.write_batch() as wb:
+        for i in range(keys):
+            member_id = str(100000000000000000 + i).encode()
+            match i % 3:
+                case 0:
+                    wb.put(db.bal.prefix + member_id, codec.encode_decimal(i))
+                case 1:
+                    wb.put(db.karma.prefix + member_id, codec.encode_int(i))
+                case _:
+                    holdings = {
+                        f"S{rng.randint(0, 5000)}": {
+                            "total": rng.uniform(0, 100),
+                            "history": [[1, rng.uniform(1, 500)]],
+                        }
+                    }
+                    wb.put(db.stockbal.prefix + member_id, orjson.dumps(holdings))
+
+
+def change(db: Database, fraction: float = 0.01):
+    """Rewrites a fraction of the karma keys."""
+    rng = random.Random(1)
+
+    with db.karma.write_batch() as wb:
+        for key, _ in db.karma:
+            if rng.random() < fraction * 3:
+                wb.put(key, codec.encode_int(rng.randint(0, 1000)))
+
+
+def legacy_backup(db: Database, path: str):
+    """The backup task as it was before snapshot backups."""
+    with open(path, "w", encoding="utf-8") as file:
+        database = {}
+
+        for key, value in db.main:
+            if not is_excluded(key):
+                if value[:1] in [b"{", b"["]:
+                    value = orjson.loads(value)
+                else:
+                    value = codec.display(value)
+                database[key.decode()] = value
+
+        file.write(str(database))
+
+
+def measured(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(sizes=(10_000, 100_000)):
+    print(f"{'Keys':>10} {'Step':<20} {'Time':>12} {'Peak':>10} {'Size':>10}")
+
+    for keys in sizes:
+        with tempfile.TemporaryDirectory() as path:
+            db = Database(f"{path}/db")
+            backups = Backups(db, f"{path}/backup")
+            populate(db, keys)
+
+            legacy_path = f"{path}/legacy.json"
+            steps = (
+                ("Legacy dump", legacy_backup, (db, legacy_path)),
+                ("Full backup", backups.create, ()),
+                ("Change 1% of keys", change, (db,)),
+                ("Incremental backup", backups.create, ()),
+                ("Restore", backups.restore, (1,)),
+            )
+
+            for name, func, args in steps:
+                result, elapsed, peak = measured(func, *args)
+
+                if func is legacy_backup:
+                    size = os.path.getsize(legacy_path)
+                elif func == backups.create:
+                    size = os.path.getsize(result)
+                else:
+                    size = 0
+
+                print(
+                    f"{keys:>10,} {name:<20} {elapsed:>10,.1f}ms "
+                    f"{peak:>8,.1f}MB {size / 1024:>8,.0f}KB"
+                )
+
+            db.main.close()
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or (10_000, 100_000))
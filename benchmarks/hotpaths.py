@@ -0,0 +1,362 @@
+"""Replays synthetic traffic through the bot's hot paths.
+
+Messages, reactions and commands built from the test mocks are run
+through the real cogs against a temporary db filled with realistic
+volumes. Every benchmark reports operations per second and the peak and
+retained memory allocated while running it, results can be saved as
+json and compared with a previous run.
+
+Run from the repository root with:
+
+    python -m benchmarks.hotpaths [--members N] [--ops N] [--only NAME]
+        [--output results.json] [--compare previous.json]
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import types
+import unittest.mock
+
+import orjson
+
+import tests.helpers as helpers
+from benchmarks.networth import populate as populate_economy
+from bot import Bot
+from cogs.compsci import compsci
+from cogs.economy import economy
+from cogs.events import events
+from cogs.information import information
+from cogs.utils import codec
+from cogs.utils.database import Database
+
+GUILDS = 20
+CHANNELS = 10
+POOL = 300
+# Building a MockContext also builds a MockBot so fewer are made
+CONTEXTS = 40
+
+EXPRESSIONS = (
+    "A ⇒ B",
+    "(A ∧ B) ∨ ~C",
+    "A ↔ (B ∨ C)",
+    "(A ⇒ B) ∧ (B ⇒ C) ⇒ (A ⇒ C)",
+    "~(A ∧ B) ↔ (~A ∨ ~B)",
+    "(A ∨ B) ∧ (C ∨ D) ∧ ~(E ∧ F)",
+)
+
+
+async def noop(*args, **kwargs):
+    pass
+
+
+class OfflineResponse:
+    """Stands in for every request, returning a quickchart response."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self):
+        return {"url": "https://quickchart.io/chart/render/1"}
+
+
+class OfflineSession:
+    def get(self, *args, **kwargs):
+        return OfflineResponse()
+
+
+def populate(db: Database, members: int):
+    """Fills a db with guild settings, message counts and an economy."""
+    rng = random.Random(0)
+    populate_economy(db, members, stocks=2000, cryptos=500)
+
+    with db.main.write_batch() as wb:
+        for guild in range(GUILDS):
+            guild_id = 1000 + guild
+
+            if guild % 4 == 0:
+                wb.put(f"{guild_id}-prefix".encode(), b"!")
+            if guild % 2 == 0:
+                wb.put(f"anti_spam-{guild_id}".encode(), b"1")
+            if guild % 5 == 0:
+                wb.put(
+                    f"{guild_id}-disabled_channels".encode(),
+                    orjson.dumps([2000 + guild * CHANNELS]),
+                )
+                wb.put(f"{guild_id}-t-truth".encode(), b"1")
+
+        for member in range(members):
+            member_id = 100000000000000000 + member
+            guild_id = 1000 + member % GUILDS
+            wb.put(
+                db.message_count.prefix + f"{guild_id}-{member_id}".encode(),
+                codec.encode_int(rng.randint(1, 50000)),
+            )
+
+            if rng.random() < 0.01:
+                wb.put(db.blacklist.prefix + str(member_id).encode(), b"1")
+
+
+class Traffic:
+    """Pools of mocks reused by the benchmarks as building a mock is far
+    slower than anything being measured.
+
+    The methods the cogs await are replaced with plain coroutines so
+    mocks don't record every call made during a run.
+    """
+
+    def __init__(self, members: int):
+        rng = random.Random(1)
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        self.guilds = [helpers.MockGuild(id=1000 + guild) for guild in range(GUILDS)]
+        self.users = {
+            100000000000000000
+            + member: types.SimpleNamespace(display_name=f"member{member}")
+            for member in range(members)
+        }
+
+        self.messages = []
+        self.contexts = []
+        self.reactions = []
+        self.payloads = []
+
+        for _ in range(POOL):
+            guild = rng.randrange(GUILDS)
+            member_id = 100000000000000000 + rng.randrange(members)
+            author = helpers.MockMember(id=member_id, bot=False)
+            author.timeout = noop
+            channel = helpers.MockTextChannel(
+                id=2000 + guild * CHANNELS + rng.randrange(CHANNELS),
+                name=rng.choice(("general", "bot", "memes")),
+            )
+
+            message = helpers.MockMessage(
+                author=author,
+                channel=channel,
+                guild=self.guilds[guild],
+                content=rng.choice(("hello", "what is a monad", ".bal", "lol")),
+                created_at=now,
+                mentions=[],
+            )
+            message.add_reaction = noop
+            self.messages.append(message)
+
+            if len(self.contexts) < CONTEXTS:
+                ctx = helpers.MockContext(
+                    author=author,
+                    guild=self.guilds[guild],
+                    channel=channel,
+                    message=message,
+                )
+                ctx.send = noop
+                self.contexts.append(ctx)
+
+            emoji = helpers.MockEmoji(name=rng.choice(("upvote", "downvote", "x")))
+            reaction = helpers.MockReaction(emoji=emoji, message=message)
+            reaction.is_custom_emoji = lambda: True
+            # Reactions by someone other than the author of the message
+            self.reactions.append((reaction, helpers.MockMember()))
+
+            self.payloads.append(
+                types.SimpleNamespace(
+                    member=author,
+                    guild_id=1000 + guild,
+                    message_id=rng.randrange(100),
+                    emoji=types.SimpleNamespace(
+                        name=rng.choice(("1️⃣", "2️⃣", "3️⃣")),
+                        is_custom_emoji=lambda: False,
+                    ),
+                )
+            )
+
+
+def benchmarks(bot, traffic: Traffic) -> dict:
+    """Returns a coroutine function running one operation by name."""
+    events_cog = events(bot)
+    economy_cog = economy(bot)
+    information_cog = information(bot)
+    compsci_cog = compsci(bot)
+
+    messages = itertools.cycle(traffic.messages)
+    contexts = itertools.cycle(traffic.contexts)
+    reactions = itertools.cycle(traffic.reactions)
+    payloads = itertools.cycle(traffic.payloads)
+    expressions = itertools.cycle(EXPRESSIONS)
+    guilds = itertools.cycle(traffic.guilds)
+
+    commands = itertools.cycle(
+        (economy_cog.nettop, information_cog.message_top, compsci_cog.truth)
+    )
+
+    async def on_message():
+        await events_cog.on_message(next(messages))
+
+    async def on_reaction_add():
+        await events_cog.on_reaction_add(*next(reactions))
+
+    async def on_raw_reaction_add():
+        await events_cog.on_raw_reaction_add(next(payloads))
+
+    async def bot_check_once():
+        ctx = next(contexts)
+        ctx.command = next(commands)
+        await events_cog.bot_check_once(ctx)
+
+    async def get_prefix():
+        await Bot.get_prefix(bot, next(messages))
+
+    async def nettop():
+        await economy_cog.nettop._callback(economy_cog, next(contexts))
+
+    async def message_top():
+        ctx = next(contexts)
+        ctx.guild = next(guilds)
+        await information_cog.message_top._callback(information_cog, ctx)
+
+    async def truth():
+        await compsci_cog.truth._callback(
+            compsci_cog, next(contexts), expr=next(expressions)
+        )
+
+    return {
+        "on_message": on_message,
+        "on_reaction_add": on_reaction_add,
+        "on_raw_reaction_add": on_raw_reaction_add,
+        "bot_check_once": bot_check_once,
+        "get_prefix": get_prefix,
+        "nettop": nettop,
+        "message_top": message_top,
+        "truth": truth,
+    }
+
+
+# Whole command invocations are far slower than listeners
+OPS_SCALE = {"nettop": 0.1, "message_top": 0.01, "truth": 0.1}
+
+
+async def measure(func, ops: int) -> dict:
+    for _ in range(min(ops // 10, 100)):
+        await func()
+
+    start = time.perf_counter()
+    for _ in range(ops):
+        await func()
+    elapsed = time.perf_counter() - start
+
+    # A separate pass so tracing doesn't skew the timing
+    traced = max(ops // 10, 1)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for _ in range(traced):
+        await func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops": ops,
+        "seconds": elapsed,
+        "ops_per_sec": ops / elapsed,
+        "us_per_op": elapsed / ops * 1_000_000,
+        "peak_kb": (peak - baseline) / 1024,
+        "retained_bytes_per_op": (current - baseline) / traced,
+    }
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous: dict):
+    print(f"\nCompared with {previous.get('commit')}:")
+
+    for name, result in results["benchmarks"].items():
+        if old := previous["benchmarks"].get(name):
+            change = result["ops_per_sec"] / old["ops_per_sec"] - 1
+            print(f"{name:<20} {change:>+8.1%}")
+
+
+async def run(args) -> dict:
+    results = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "members": args.members,
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory() as path:
+        with unittest.mock.patch("bot.Database", lambda: Database(f"{path}/db")):
+            bot = Bot(command_prefix=".")
+        bot.owner_ids = (1,)
+        bot.client_session = OfflineSession()
+        bot.user = helpers.MockUser()
+
+        populate(bot.DB, args.members)
+        traffic = Traffic(args.members)
+        bot.get_user = traffic.users.get
+
+        print(
+            f"{'Benchmark':<20} {'Ops/s':>12} {'us/op':>10} {'Peak':>10} {'Kept/op':>9}"
+        )
+
+        for name, func in benchmarks(bot, traffic).items():
+            if args.only and name not in args.only:
+                continue
+
+            ops = max(int(args.ops * OPS_SCALE.get(name, 1)), 10)
+            result = await measure(func, ops)
+            results["benchmarks"][name] = result
+
+            print(
+                f"{name:<20} {result['ops_per_sec']:>12,.0f} {result['us_per_op']:>10,.1f}"
+                f" {result['peak_kb']:>8,.0f}KB {result['retained_bytes_per_op']:>8,.0f}B"
+            )
+
+        bot.DB.executor.shutdown()
+        bot.DB.main.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=10_000)
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Compares the old per call nettop scan with the NetWorth engine.
+
+Run from the repository root with:
+
+    python -m benchmarks.networth [members]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+import orjson
+
+from cogs.utils import codec
+from cogs.utils.database import Database
+from cogs.utils.prices import stock_row
+
+
+def populate(db: Database, members: int, stocks: int = 5000, cryptos: int = 2000):
+    """Fills a db with synthetic balances, holdings and prices."""
+    rng = random.Random(0)
+    stock_symbols = [f"S{i}" for i in range(stocks)]
+    crypto_symbols = [f"C{i}" for i in range(cryptos)]
+
+    with db.stocks.write_batch() as wb:
+        for symbol in stock_symbols:
+            price = f"{rng.uniform(1, 500):.2f}"
+            wb.put(symbol.encode(), orjson.dumps({"name": symbol, "price": price}))
+
+    with db.crypto.write_batch() as wb:
+        for symbol in crypto_symbols:
+            price = rng.uniform(0.01, 50000)
+            wb.put(symbol.encode(), orjson.dumps({"name": symbol, "price": price}))
+
+    with db.main.write_batch() as wb:
+        for member in range(members):
+            member_id = str(100000000000000000 + member).encode()
+            balance = Decimal(rng.uniform(0, 100000)).quantize(Decimal("0.01"))
+            wb.put(db.bal.prefix + member_id, codec.encode_decimal(balance))
+
+            if rng.random() < 0.3:
+                holdings = {
+                    symbol: {"total": rng.uniform(0, 100), "history": []}
+                    for symbol in rng.sample(stock_symbols, rng.randint(1, 5))
+                }
+                wb.put(db.stockbal.prefix + member_id, orjson.dumps(holdings))
+
+            if rng.random() < 0.2:
+                holdings = {
+                    symbol: {"total": rng.uniform(0, 10), "history": []}
+                    for symbol in rng.sample(crypto_symbols, rng.randint(1, 3))
+                }
+                wb.put(db.cryptobal.prefix + member_id, orjson.dumps(holdings))
+
+
+def legacy_nettop(db: Database, amount: int = 10) -> list:
+    """The nettop scan as it was before the NetWorth engine."""
+
+    def get_value(values, prefixed):
+        if values:
+            return sum(
+                [
+                    stock[1]["total"]
+                    * float(orjson.loads(prefixed.get(stock[0].encode()))["price"])
+                    for stock in values.items()
+                ]
+            )
+
+        return 0
+
+    net_top = []
+
+    for member_id, value in db.bal:
+        stock_value = get_value(db.get_stockbal(member_id), db.stocks)
+        crypto_value = get_value(db.get_cryptobal(member_id), db.crypto)
+        net_top.append(
+            (float(codec.decode_decimal(value)) + stock_value + crypto_value, member_id)
+        )
+
+    return sorted(net_top, reverse=True)[:amount]
+
+
+def engine_nettop(db: Database, amount: int = 10) -> list:
+    top = []
+    for member_id, value in db.networth.top():
+        if len(top) >= amount:
+            break
+        top.append((value, member_id))
+    return top
+
+
+async def refresh_prices(db: Database):
+    """Moves every stock price by 1% the way get_stocks writes a refresh."""
+    rows = []
+
+    with db.stocks.write_batch() as wb:
+        for symbol, data in db.stocks:
+            data = orjson.loads(data)
+            data["price"] = f"{float(data['price']) * 1.01:.2f}"
+            wb.put(symbol, orjson.dumps(data))
+            rows.append(stock_row(symbol.decode(), data))
+
+    await db.put_prices("stocks", rows)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(members: int = 100_000):
+    with tempfile.TemporaryDirectory() as path:
+        db = Database(f"{path}/db")
+        populate(db, members)
+
+        legacy, legacy_time = timed(legacy_nettop, db)
+        _, table_time = timed(db.get_prices, "stocks")
+        db.get_prices("crypto")
+        _, load_time = timed(asyncio.run, db.networth.ensure_loaded())
+        engine, first_time = timed(engine_nettop, db)
+        _, cached_time = timed(engine_nettop, db)
+
+        assert legacy == engine, "NetWorth engine disagrees with the legacy scan"
+        assert legacy_nettop(db, None) == engine_nettop(db, members)
+
+        _, refresh_time = timed(asyncio.run, refresh_prices(db))
+        _, refreshed_time = timed(engine_nettop, db)
+
+        member_id = str(100000000000000000).encode()
+        _, update_time = timed(db.put_bal, member_id, db.get_bal(member_id) + 1)
+        _, updated_time = timed(engine_nettop, db)
+
+        assert legacy_nettop(db, None) == engine_nettop(db, members)
+
+        print(f"Members:                   {members:,}")
+        print(f"Legacy nettop:             {legacy_time:,.1f}ms")
+        print(f"Price table build:         {table_time:,.1f}ms")
+        print(f"Engine load:               {load_time:,.1f}ms")
+        print(f"Engine first nettop:       {first_time:,.1f}ms")
+        print(f"Engine cached nettop:      {cached_time:,.3f}ms")
+        print(f"Price refresh and revalue: {refresh_time:,.1f}ms")
+        print(f"Nettop after refresh:      {refreshed_time:,.1f}ms")
+        print(f"put_bal with engine:       {update_time:,.3f}ms")
+        print(f"Nettop after put_bal:      {updated_time:,.3f}ms")
+
+        db.main.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
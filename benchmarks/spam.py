@@ -0,0 +1,185 @@
+"""Replays a raid through the anti spam and the CooldownMapping one it replaced.
+
+Messages arrive at a fixed rate from a mix of regular members and raid
+accounts sending random content, copypasta and mass mentions. Reports
+how fast each checker gets through them, how much memory it is holding
+at the end and how many messages from raid accounts and from regular
+members it flagged.
+
+Run from the repository root with:
+
+    python -m benchmarks.spam [rate] [seconds]
+"""
+
+import datetime
+import random
+import string
+import sys
+import time
+import tracemalloc
+import types
+
+from discord.ext import commands
+
+from cogs.events import SpamChecker
+
+MEMBERS = 200_000
+RAIDERS = 500
+CHANNELS = 500
+WORDS = (
+    "hi lol gm what nice ok same true the a is it that this game play anyone "
+    "want to when are you doing today tonight yeah no why how good bad"
+).split()
+MEMBER_ID = 100000000000000000
+RAID_ID = MEMBER_ID + MEMBERS
+COPYPASTA = "JOIN discord.gg/free-nitro FREE NITRO " * 3
+
+
+class CooldownByContent(commands.CooldownMapping):
+    def _bucket_key(self, message) -> tuple[int, str]:
+        return (message.channel.id, message.content)
+
+
+class LegacySpamChecker:
+    """The SpamChecker as it was before it used bounded counters.
+
+    Buckets are fetched with the time of the message, the bot left it
+    to default to the time now which is the same outside a replay.
+    """
+
+    def __init__(self):
+        self.by_content = CooldownByContent.from_cooldown(
+            15, 17.0, commands.BucketType.member
+        )
+        self.by_user = commands.CooldownMapping.from_cooldown(
+            10, 12.0, commands.BucketType.user
+        )
+
+        self.by_mentions = commands.CooldownMapping.from_cooldown(
+            40, 12.0, commands.BucketType.member
+        )
+
+    def is_spamming(self, message) -> bool:
+        if message.guild is None:
+            return False
+
+        current = message.created_at.timestamp()
+
+        user_bucket = self.by_user.get_bucket(message, current)
+        if user_bucket.update_rate_limit(current):
+            return True
+
+        content_bucket = self.by_content.get_bucket(message, current)
+        if content_bucket.update_rate_limit(current):
+            return True
+
+        if self.is_mention_spam(message, current):
+            return True
+
+        return False
+
+    def is_mention_spam(self, message, current: float) -> bool:
+        mention_bucket = self.by_mentions.get_bucket(message, current)
+        mention_count = sum(
+            not m.bot and m.id != message.author.id for m in message.mentions
+        )
+        mention_bucket._tokens -= mention_count - 1
+
+        return mention_bucket.update_rate_limit(current) is not None
+
+
+def replay(rate: int, seconds: float, start: float) -> list:
+    """Returns messages sent at rate a second for seconds from start.
+
+    Raid accounts send a third of them.
+    """
+    rng = random.Random(0)
+    guild = types.SimpleNamespace(id=1000)
+    members = [
+        types.SimpleNamespace(id=MEMBER_ID + member, bot=False)
+        for member in range(MEMBERS + RAIDERS)
+    ]
+    channels = [types.SimpleNamespace(id=2000 + channel) for channel in range(CHANNELS)]
+    messages = []
+
+    for number in range(int(rate * seconds)):
+        created_at = datetime.datetime.fromtimestamp(
+            start + number / rate, datetime.timezone.utc
+        )
+        mentions = []
+
+        if rng.random() < 1 / 3:
+            author = members[MEMBERS + rng.randrange(RAIDERS)]
+            kind = rng.random()
+
+            if kind < 0.6:
+                content = "".join(rng.choices(string.ascii_letters, k=24))
+            elif kind < 0.9:
+                content = COPYPASTA
+            else:
+                content = "@everyone"
+                mentions = rng.sample(members, 10)
+        else:
+            author = members[rng.randrange(MEMBERS)]
+            content = " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))
+
+        messages.append(
+            types.SimpleNamespace(
+                guild=guild,
+                author=author,
+                channel=rng.choice(channels),
+                content=content,
+                mentions=mentions,
+                created_at=created_at,
+            )
+        )
+
+    return messages
+
+
+def run(checker, messages: list) -> tuple[float, int, list]:
+    """Returns the seconds taken, the bytes held after and the flagged messages."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    flagged = [message for message in messages if checker.is_spamming(message)]
+    elapsed = time.perf_counter() - start
+
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return elapsed, held, flagged
+
+
+def main(rate: int = 10_000, seconds: float = 30):
+    messages = replay(rate, seconds, time.time())
+
+    # The legacy checker scans its whole cache on every message so it
+    # only gets the first second of the replay
+    legacy_count = min(len(messages), rate)
+
+    print(f"Replay:  {len(messages):,} messages at {rate:,}/s over {seconds}s")
+    print(
+        f"{'Checker':<10} {'Messages':>10} {'Msgs/s':>12} {'us/msg':>8}"
+        f" {'Realtime':>9} {'Held':>10} {'Raid':>8} {'Members':>8}"
+    )
+
+    for name, checker, count in (
+        ("bounded", SpamChecker(), len(messages)),
+        ("legacy", LegacySpamChecker(), legacy_count),
+    ):
+        elapsed, held, flagged = run(checker, messages[:count])
+        raid = sum(message.author.id >= RAID_ID for message in flagged)
+        print(
+            f"{name:<10} {count:>10,} {count / elapsed:>12,.0f}"
+            f" {elapsed / count * 1_000_000:>8.2f} {count / rate / elapsed:>8.1f}x"
+            f" {held / 1024:>8,.0f}KB {raid:>8,} {len(flagged) - raid:>8,}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 30,
+    )
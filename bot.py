@@ -4,15 +4,30 @@ import asyncio
 import logging
 import os
 import subprocess
+import time
 from contextlib import suppress
 
 import aiohttp
+import aiohttp.web
 import discord
+import orjson
 from discord.ext import commands
 from discord.gateway import DiscordWebSocket
 
 import config
+from cogs.utils import metrics
+from cogs.utils.cache import ResponseCache
 from cogs.utils.database import Database
+from cogs.utils.fuzzy import CommandIndex
+from cogs.utils.http import (
+    CircuitOpenError,
+    SingleFlight,
+    TTLCache,
+    create_session,
+    max_age,
+)
+from cogs.utils.scheduler import Scheduler
+from cogs.utils.watchdog import Watchdog
 
 log = logging.getLogger()
 log.setLevel(50)
@@ -41,11 +56,28 @@ class Bot(commands.Bot):
     """A subclass of discord.ext.commands.Bot."""
 
     def __init__(self, *args, **kwargs):
+        # Set first as commands are added while initializing
+        self.command_index = CommandIndex()
         super().__init__(*args, **kwargs)
 
         self.client_session = None
-        self.cache = {}
+        self.cache = ResponseCache()
+        self.requests = SingleFlight()
+        self.responses = TTLCache()
         self.DB = Database()
+        self.scheduler = Scheduler(self.DB.schedule)
+        self.metrics = metrics.Metrics()
+        self.metrics_server = None
+        self.watchdog = Watchdog(**getattr(config, "watchdog", {}))
+        self.http.request = metrics.timed("discord", self.http.request)
+
+    def add_command(self, command: commands.Command) -> None:
+        super().add_command(command)
+        self.command_index.invalidate()
+
+    def remove_command(self, name: str) -> commands.Command | None:
+        self.command_index.invalidate()
+        return super().remove_command(name)
 
     async def get_prefix(self, message: discord.Message) -> str:
         default = "."
@@ -88,20 +120,87 @@ class Bot(commands.Bot):
             except Exception as e:
                 print(f"Failed to load extension {extension}.\n{e} \n")
 
-    async def get_json(self, url: str) -> dict:
+        self.build_command_index()
+
+    def build_command_index(self) -> None:
+        """Indexes the names of visible commands for suggestions."""
+        self.command_index.build(
+            str(command) for command in self.walk_commands() if not command.hidden
+        )
+
+    async def invoke(self, ctx: commands.Context) -> None:
+        """Invokes a command recording how long it took."""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+
+        timings = self.metrics.timings()
+        token = metrics.CURRENT.set(timings)
+        start = time.perf_counter()
+
+        try:
+            await super().invoke(ctx)
+        finally:
+            metrics.CURRENT.reset(token)
+            self.metrics.record(
+                ctx.command.qualified_name,
+                time.perf_counter() - start,
+                ctx.command_failed,
+                timings,
+            )
+
+    async def serve_metrics(self, port: int) -> None:
+        """Serves the metrics in the Prometheus text format.
+
+        port: int
+        """
+
+        async def handler(request):
+            return aiohttp.web.Response(text=self.metrics.prometheus())
+
+        app = aiohttp.web.Application()
+        app.router.add_get("/metrics", handler)
+
+        self.metrics_server = aiohttp.web.AppRunner(app)
+        await self.metrics_server.setup()
+        await aiohttp.web.TCPSite(self.metrics_server, "127.0.0.1", port).start()
+
+    async def get_json(self, url: str, **kwargs) -> dict:
         """Gets and loads json from a url.
 
+        Concurrent requests for the same url and arguments share one
+        request and responses are reused for their Cache-Control max-age.
+
         url: str
             The url to fetch the json from.
+        kwargs:
+            Passed to client_session.get.
         """
-        try:
-            async with self.client_session.get(url) as response:
-                return await response.json()
-        except (
-            asyncio.exceptions.TimeoutError,
-            aiohttp.client_exceptions.ContentTypeError,
-        ):
-            return None
+        key = (url, repr(sorted(kwargs.items())))
+
+        if (body := self.responses.get(key)) is None:
+            try:
+                body = await self.requests.do(
+                    key, lambda: self.fetch_json(key, url, **kwargs)
+                )
+            except (
+                asyncio.exceptions.TimeoutError,
+                aiohttp.client_exceptions.ContentTypeError,
+                CircuitOpenError,
+            ):
+                return None
+
+        # Every caller gets its own copy as commands mutate the result
+        return orjson.loads(body) if body else None
+
+    async def fetch_json(self, key: tuple, url: str, **kwargs) -> str:
+        """Fetches the raw json of a url caching it if the response allows."""
+        async with self.client_session.get(url, **kwargs) as response:
+            body = await response.json(loads=str)
+
+        if body and response.ok:
+            self.responses.put(key, body, max_age(response.headers))
+
+        return body
 
     async def run_process(self, command, raw=False) -> list | str:
         """Runs a shell command and returns the output.
@@ -127,16 +226,6 @@ class Bot(commands.Bot):
 
         return "".join([output.decode() for output in result]).split()
 
-    def remove_from_cache(self, search):
-        """Deletes a search from the cache.
-
-        search: str
-        """
-        try:
-            self.cache.pop(search)
-        except KeyError:
-            return
-
     async def close(self) -> None:
         """Close the Discord connection and the aiohttp session."""
         for ext in list(self.extensions):
@@ -147,16 +236,30 @@ class Bot(commands.Bot):
             with suppress(Exception):
                 self.remove_cog(cog)
 
+        # Running jobs may still need the connection to finish
+        await self.scheduler.stop()
         await super().close()
 
+        self.watchdog.stop()
+        self.DB.counters.flush()
+        self.DB.executor.shutdown()
+
         if self.client_session:
             await self.client_session.close()
 
+        if self.metrics_server:
+            await self.metrics_server.cleanup()
+
     async def login(self, *args, **kwargs) -> None:
         """Setup the client_session before logging in."""
-        self.client_session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=10)
-        )
+        self.client_session = create_session(**getattr(config, "http", {}))
+        self.scheduler.start()
+
+        if hasattr(config, "watchdog"):
+            self.watchdog.start()
+
+        if port := getattr(config, "metrics_port", None):
+            await self.serve_metrics(port)
 
         await super().login(*args, **kwargs)
 
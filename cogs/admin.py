@@ -68,7 +68,7 @@ class admin(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.DB = bot.DB
-        self.loop = bot.loop
+        bot.scheduler.register("undownvote", self.undownvote)
 
     async def cog_check(self, ctx):
         """Checks if the member is an administrator.
@@ -320,6 +320,7 @@ class admin(commands.Cog):
 
         await ctx.send(embed=embed)
         self.DB.main.put(key, orjson.dumps(disabled))
+        self.DB.policies.invalidate(ctx.guild.id)
 
     @commands.command()
     async def lockall(self, ctx, toggle: bool = True):
@@ -386,10 +387,12 @@ class admin(commands.Cog):
 
         if not state:
             self.DB.main.put(key, b"1")
+            self.DB.policies.invalidate(ctx.guild.id)
             embed.description = f"```Disabled the {command} command```"
             return await ctx.send(embed=embed)
 
         self.DB.main.delete(key)
+        self.DB.policies.invalidate(ctx.guild.id)
         embed.description = f"```Enabled the {command} command```"
         return await ctx.send(embed=embed)
 
@@ -544,6 +547,11 @@ class admin(commands.Cog):
 
         if self.DB.blacklist.get(member_id):
             self.DB.blacklist.delete(member_id)
+            self.DB.policies.invalidate(ctx.guild.id)
+
+            for _, _, data, job in self.bot.scheduler.jobs("undownvote"):
+                if data["member"] == member_id.decode():
+                    self.bot.scheduler.cancel(job)
 
             embed.title = "User Undownvoted"
             embed.description = (
@@ -555,23 +563,35 @@ class admin(commands.Cog):
 
         if not duration:
             self.DB.blacklist.put(member_id, b"1")
+            self.DB.policies.invalidate(ctx.guild.id)
             embed.title = "User Downvoted"
             embed.description = f"**{member}** has been added to the downvote list"
             return await ctx.send(embed=embed)
 
-        seconds = (parse_time(duration) - discord.utils.utcnow()).total_seconds()
+        end = parse_time(duration)
 
-        if not seconds:
+        if not end or end <= discord.utils.utcnow():
             embed.description = "```Invalid duration. Example: '3d 5h 10m'```"
             return await ctx.send(embed=embed)
 
         self.DB.blacklist.put(member_id, b"1")
-        self.loop.call_later(seconds, self.DB.blacklist.delete, member_id)
+        self.DB.policies.invalidate(ctx.guild.id)
+        self.bot.scheduler.schedule(
+            "undownvote", end.timestamp(), {"member": member_id.decode()}
+        )
 
         embed.title = "User Undownvoted"
         embed.description = f"***{member}*** has been added from the downvote list"
         await ctx.send(embed=embed)
 
+    async def undownvote(self, data: dict):
+        """Removes a temporary downvote when its scheduled job runs.
+
+        data: dict
+        """
+        self.DB.blacklist.delete(data["member"].encode())
+        self.DB.policies.invalidate(int(data["member"].split("-")[0]))
+
     @commands.command()
     async def blacklist(self, ctx, user: discord.User = None):
         """Blacklists someone from using the bot.
@@ -604,12 +624,14 @@ class admin(commands.Cog):
         user_id = f"{ctx.guild.id}-{str(user.id)}".encode()
         if self.DB.blacklist.get(user_id):
             self.DB.blacklist.delete(user_id)
+            self.DB.policies.invalidate(ctx.guild.id)
 
             embed.title = "User Unblacklisted"
             embed.description = f"***{user}*** has been unblacklisted"
             return await ctx.send(embed=embed)
 
         self.DB.blacklist.put(user_id, b"2")
+        self.DB.policies.invalidate(ctx.guild.id)
         embed.title = "User Blacklisted"
         embed.description = f"**{user}** has been added to the blacklist"
 
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import random
+from functools import partial
 from io import BytesIO
 
 import discord
 from discord.ext import commands
 
+from cogs.utils.http import hedge
+
 
 class animals(commands.Cog):
     """For commands related to animals."""
@@ -29,24 +32,31 @@ class animals(commands.Cog):
         await ctx.send(resp[key] if not subkey else resp[key][subkey])
 
     async def get_multiple(self, ctx, arg_tuples):
+        """Sends the result of whichever api answers first.
+
+        The next api is tried if the ones before it fail or haven't
+        answered within a second.
+        """
+        sources = [(*args, *((None,) * (4 - len(args)))) for args in arg_tuples]
+
         with ctx.typing():
-            for args in arg_tuples:
-                url, key, subkey, prefix = *args, *((None,) * abs(len(args) - 4))
-                resp = await self.bot.get_json(url)
-
-                if resp:
-                    break
-            else:
-                return await ctx.send(
-                    embed=discord.Embed(
-                        color=discord.Color.dark_red(),
-                        description="Failed to reach any api",
-                    ).set_footer(
-                        text="apis may be temporarily down or experiencing high trafic"
-                    )
+            index, resp = await hedge(
+                [partial(self.bot.get_json, url) for url, *_ in sources]
+            )
+
+        if resp is None:
+            return await ctx.send(
+                embed=discord.Embed(
+                    color=discord.Color.dark_red(),
+                    description="Failed to reach any api",
+                ).set_footer(
+                    text="apis may be temporarily down or experiencing high trafic"
                 )
+            )
+
+        _, key, subkey, prefix = sources[index]
         return await ctx.send(
-            prefix if prefix else "" + (resp[key] if not subkey else resp[key][subkey])
+            (prefix or "") + (resp[key] if not subkey else resp[key][subkey])
         )
 
     @commands.command()
@@ -155,7 +165,7 @@ class animals(commands.Cog):
                 ("https://api.thecatapi.com/v1/images/search", 0, "url"),
                 ("https://cataas.com/cat?json=true", "url", None, "https://cataas.com"),
                 ("https://thatcopy.pw/catapi/rest", "webpurl"),
-                ("http://shibe.online/api/cats", "0"),
+                ("http://shibe.online/api/cats", 0),
                 ("https://aws.random.cat/meow", "file"),
             ),
         )
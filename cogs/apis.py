@@ -9,6 +9,10 @@ from datetime import datetime
 import discord
 from discord.ext import commands
 
+from cogs.utils import codec
+from cogs.utils.cache import MISSING
+from cogs.utils.http import TIMEOUTS
+
 URBAN_REGEX = re.compile(r"\[(.*?)\]")
 
 
@@ -44,7 +48,7 @@ class AnswerButton(discord.ui.Button["Trivia"]):
             if not stats:
                 wins, losses = 0, 0
             else:
-                wins, losses = map(int, stats.decode().split(":"))
+                wins, losses = codec.decode_pair(stats)
 
             if self.answer == view.answer:
                 style = discord.ButtonStyle.success
@@ -53,7 +57,7 @@ class AnswerButton(discord.ui.Button["Trivia"]):
                 style = discord.ButtonStyle.danger
                 losses += 1
 
-            view.db.trivia_wins.put(key, f"{wins}:{losses}".encode())
+            view.db.trivia_wins.put(key, codec.encode_pair(wins, losses))
 
             for button in view.children:
                 button.disabled = True
@@ -87,7 +91,6 @@ class apis(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.DB = bot.DB
-        self.loop = bot.loop
 
     @commands.command(aliases=["qod"])
     async def qotd(self, ctx):
@@ -205,7 +208,7 @@ class apis(commands.Cog):
         }
 
         async with ctx.typing(), self.bot.client_session.post(
-            url, json=data, timeout=30
+            url, json=data, timeout=TIMEOUTS["slow"]
         ) as resp:
             if resp.status != 200:
                 return await ctx.reply(
@@ -231,15 +234,9 @@ class apis(commands.Cog):
         subreddit = subreddit.lstrip("r/")
 
         subreddit_cache = f"reddit-{subreddit}"
-        cache = self.bot.cache
-
-        if subreddit_cache in cache:
-            post = random.choice(cache[subreddit_cache])
-            cache[subreddit_cache].remove(post)
+        post = self.bot.cache.pop_random(subreddit_cache)
 
-            if not cache[subreddit_cache]:
-                cache.pop(subreddit_cache)
-        else:
+        if post is MISSING:
             url = f"https://old.reddit.com/r/{subreddit}/hot/.json"
 
             with ctx.typing():
@@ -313,10 +310,8 @@ class apis(commands.Cog):
                     )
                 )
 
-            cache[subreddit_cache] = clean_posts
-            self.loop.call_later(300, self.bot.remove_from_cache, subreddit_cache)
-
-            post = random.choice(clean_posts)
+            post = clean_posts.pop(random.randrange(len(clean_posts)))
+            self.bot.cache.put(subreddit_cache, clean_posts)
 
         text = post.get("text")
         if text:
@@ -365,7 +360,7 @@ class apis(commands.Cog):
 
         try:
             async with ctx.typing(), self.bot.client_session.post(
-                url, json=data, timeout=30
+                url, json=data, timeout=TIMEOUTS["slow"]
             ) as resp:
                 if resp.status != 200:
                     return await ctx.reply(
@@ -425,7 +420,7 @@ class apis(commands.Cog):
         description = ""
 
         async with ctx.typing(), self.bot.client_session.post(
-            url, json=json, timeout=60
+            url, json=json, timeout=TIMEOUTS["long"]
         ) as response:
             paths = await response.json()
 
@@ -645,8 +640,7 @@ class apis(commands.Cog):
         url = "https://api.nasa.gov/planetary/apod?api_key=DEMO_KEY"
         embed = discord.Embed(color=discord.Color.blurple())
 
-        async with self.bot.client_session.get(url, timeout=30) as resp:
-            apod = await resp.json()
+        apod = await self.bot.get_json(url, timeout=TIMEOUTS["slow"])
 
         if not apod:
             embed.title = "Failed to get Astronomy Picture of the Day"
@@ -740,7 +734,7 @@ class apis(commands.Cog):
         """Shows the top 10 trivia players."""
         users = []
         for user, stats in self.DB.trivia_wins:
-            wins, losses = map(int, stats.decode().split(":"))
+            wins, losses = codec.decode_pair(stats)
             user = self.bot.get_user(int(user.decode()))
             if not user:
                 continue
@@ -779,7 +773,7 @@ class apis(commands.Cog):
             embed.title = "You haven't played trivia yet"
             return await ctx.send(embed=embed)
 
-        wins, losses = map(int, stats.decode().split(":"))
+        wins, losses = codec.decode_pair(stats)
 
         embed.title = f"{user.display_name}'s Trivia Stats"
         embed.description = (
@@ -983,16 +977,12 @@ class apis(commands.Cog):
             The term to search for.
         """
         cache_search = f"urban-{search}"
-        cache = self.bot.cache
 
         embed = discord.Embed(colour=discord.Color.blurple())
 
-        if cache_search in cache:
-            item = cache[cache_search].pop()
+        item = self.bot.cache.pop(cache_search)
 
-            if not cache[cache_search]:
-                cache.pop(cache_search)
-        else:
+        if item is MISSING:
             url = f"https://api.urbandictionary.com/v0/define?term={search}"
 
             urban = await self.bot.get_json(url)
@@ -1008,9 +998,7 @@ class apis(commands.Cog):
             urban["list"].sort(key=lambda item: item["thumbs_up"] - item["thumbs_down"])
 
             item = urban["list"].pop()
-            cache[cache_search] = urban["list"]
-
-            self.loop.call_later(300, self.bot.remove_from_cache, cache_search)
+            self.bot.cache.put(cache_search, urban["list"])
 
         embed.title = search.title()
         embed.add_field(
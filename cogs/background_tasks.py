@@ -2,11 +2,16 @@ import asyncio
 import os
 from datetime import datetime
 
+import aiohttp
 import discord
 import lxml.html
 import orjson
 from discord.ext import commands, tasks
 
+from cogs.utils import jsonstream
+from cogs.utils.http import TIMEOUTS
+from cogs.utils.prices import crypto_row, stock_row
+
 
 class background_tasks(commands.Cog):
     """Commands related to the background tasks of the bot."""
@@ -235,37 +240,53 @@ class background_tasks(commands.Cog):
         else:
             current_cookies = orjson.loads(current_cookies)
 
-        async with self.bot.client_session.get(
-            url, headers=headers, cookies=current_cookies, timeout=30
-        ) as resp:
-            next_cookies = {}
-            for header, value in resp.raw_headers:
-                if header != b"Set-Cookie":
-                    continue
-                name, cookie = value.decode().split("=", 1)
-                next_cookies[name] = cookie.split(":", 1)[0]
-            self.DB.main.put(b"stock-cookies", orjson.dumps(next_cookies))
-            stocks = await resp.json()
-
-        if not stocks:
-            return
-
-        with self.DB.stocks.write_batch() as wb:
-            for stock in stocks["data"]["table"]["rows"]:
-                stock_data = {
-                    "name": stock["name"],
-                    "price": stock["lastsale"][1:],
-                    "change": stock["netchange"],
-                    "%change": stock["pctchange"][:-1]
-                    if stock["pctchange"] != "--"
-                    else 0,
-                    "cap": stock["marketCap"],
-                }
-
-                wb.put(
-                    stock["symbol"].encode(),
-                    orjson.dumps(stock_data),
-                )
+        rows = []
+        complete = False
+
+        try:
+            async with self.bot.client_session.get(
+                url, headers=headers, cookies=current_cookies, timeout=TIMEOUTS["slow"]
+            ) as resp:
+                next_cookies = {}
+                for header, value in resp.raw_headers:
+                    if header != b"Set-Cookie":
+                        continue
+                    name, cookie = value.decode().split("=", 1)
+                    next_cookies[name] = cookie.split(":", 1)[0]
+                self.DB.main.put(b"stock-cookies", orjson.dumps(next_cookies))
+
+                async for stocks in jsonstream.iter_chunks(resp.content, b"rows"):
+                    with self.DB.stocks.write_batch() as wb:
+                        for stock in stocks:
+                            stock_data = {
+                                "name": stock["name"],
+                                "price": stock["lastsale"][1:],
+                                "change": stock["netchange"],
+                                "%change": stock["pctchange"][:-1]
+                                if stock["pctchange"] != "--"
+                                else 0,
+                                "cap": stock["marketCap"],
+                            }
+
+                            wb.put(
+                                stock["symbol"].encode(),
+                                orjson.dumps(stock_data),
+                            )
+                            rows.append(stock_row(stock["symbol"], stock_data))
+
+                    await asyncio.sleep(0)
+
+            complete = True
+        except (asyncio.exceptions.TimeoutError, aiohttp.ClientError):
+            pass
+        finally:
+            if rows:
+                await self.DB.put_prices("stocks", rows, complete)
+
+    @tasks.loop(seconds=10)
+    async def flush_counters(self):
+        """Writes buffered message count and karma increments to the db."""
+        self.DB.counters.flush()
 
     @tasks.loop(minutes=5)
     async def update_bot(self):
@@ -294,42 +315,10 @@ class background_tasks(commands.Cog):
     @tasks.loop(hours=6)
     async def backup(self):
         """Makes a backup of the db every 6 hours."""
-        if self.DB.main.get(b"restart") == b"1":
+        if self.DB.main.get(b"restart") == b"1" or self.DB.restoring:
             return
 
-        number = self.DB.main.get(b"backup_number")
-
-        if not number:
-            number = -1
-        else:
-            number = int(number.decode())
-
-        number = (number + 1) % 11
-
-        self.DB.main.put(b"backup_number", str(number).encode())
-
-        os.makedirs("backup/", exist_ok=True)
-        with open(f"backup/{number}backup.json", "w", encoding="utf-8") as file:
-            database = {}
-
-            excluded = (
-                b"crypto",
-                b"stocks",
-                b"boot_times",
-                b"tiolanguages",
-                b"helloworlds",
-                b"docs",
-            )
-
-            for key, value in self.DB.main:
-                if key.split(b"-")[0] not in excluded:
-                    if value[:1] in [b"{", b"["]:
-                        value = orjson.loads(value)
-                    else:
-                        value = value.decode()
-                    database[key.decode()] = value
-
-            file.write(str(database))
+        await self.DB.run(self.DB.backups.create)
 
     @tasks.loop(count=1)
     async def get_languages(self):
@@ -370,43 +359,56 @@ class background_tasks(commands.Cog):
     async def get_crypto(self):
         """Updates crypto currency data every 30 minutes."""
         url = "https://api.coinmarketcap.com/data-api/v3/cryptocurrency/listing?limit=50000&convert=NZD&cryptoType=coins"
-        crypto = await self.bot.get_json(url)
-
-        if not crypto:
-            return
-
-        with self.DB.crypto.write_batch() as wb:
-            for coin in crypto["data"]["cryptoCurrencyList"]:
-                if "price" not in coin["quotes"][0]:
-                    continue
-
-                timestamp = datetime.fromisoformat(
-                    coin["quotes"][0]["lastUpdated"][:-1]
-                ).timestamp()
-
-                wb.put(
-                    coin["symbol"].encode(),
-                    orjson.dumps(
-                        {
-                            "name": coin["name"],
-                            "id": coin["id"],
-                            "price": coin["quotes"][0]["price"],
-                            "circulating_supply": int(coin["circulatingSupply"]),
-                            "max_supply": int(coin.get("maxSupply", 0)),
-                            "market_cap": coin["quotes"][0].get("marketCap", 0),
-                            "change_24h": coin["quotes"][0]["percentChange24h"],
-                            "volume_24h": coin["quotes"][0].get("volume24h", 0),
-                            "timestamp": int(timestamp),
-                        }
-                    ),
-                )
+        rows = []
+        complete = False
+
+        try:
+            async with self.bot.client_session.get(url) as resp:
+                async for coins in jsonstream.iter_chunks(
+                    resp.content, b"cryptoCurrencyList"
+                ):
+                    with self.DB.crypto.write_batch() as wb:
+                        for coin in coins:
+                            if "price" not in coin["quotes"][0]:
+                                continue
+
+                            timestamp = datetime.fromisoformat(
+                                coin["quotes"][0]["lastUpdated"][:-1]
+                            ).timestamp()
+
+                            crypto_data = {
+                                "name": coin["name"],
+                                "id": coin["id"],
+                                "price": coin["quotes"][0]["price"],
+                                "circulating_supply": int(coin["circulatingSupply"]),
+                                "max_supply": int(coin.get("maxSupply", 0)),
+                                "market_cap": coin["quotes"][0].get("marketCap", 0),
+                                "change_24h": coin["quotes"][0]["percentChange24h"],
+                                "volume_24h": coin["quotes"][0].get("volume24h", 0),
+                                "timestamp": int(timestamp),
+                            }
+
+                            wb.put(coin["symbol"].encode(), orjson.dumps(crypto_data))
+                            rows.append(crypto_row(coin["symbol"], crypto_data))
+
+                    await asyncio.sleep(0)
+
+            complete = True
+        except (asyncio.exceptions.TimeoutError, aiohttp.ClientError):
+            pass
+        finally:
+            if rows:
+                await self.DB.put_prices("crypto", rows, complete)
 
     @tasks.loop(hours=24)
     async def get_domain(self):
         """Updates the domain used for the tempmail command."""
         url = "https://api.mail.tm/domains?page=1"
-        async with self.bot.client_session.get(url) as resp:
-            data = await resp.json()
+        try:
+            async with self.bot.client_session.get(url) as resp:
+                data = await resp.json()
+        except (asyncio.exceptions.TimeoutError, aiohttp.ClientError):
+            return
 
         domain = data["hydra:member"][0]["domain"]
         self.DB.main.put(b"tempdomain", domain.encode())
@@ -431,6 +433,18 @@ class background_tasks(commands.Cog):
 
         self.DB.main.put(b"currencies", orjson.dumps(symbols))
 
+    def parse_courses(self, courses: dict, html: str) -> list[str]:
+        """Adds the courses in a page to courses returning the pagination links.
+
+        This runs in the db thread pool so lxml doesn't block the event loop.
+
+        courses: dict
+        html: str
+        """
+        soup = lxml.html.fromstring(html)
+        self.find_courses(courses, soup)
+        return soup.xpath('.//div[@id="pagination"]//a/@href')[:-1]
+
     def find_courses(self, courses, soup):
         element_class = '"course-card w3-panel w3-white w3-card w3-round w3-display-container p-3 pl-4 pr-4"'
 
@@ -476,18 +490,18 @@ class background_tasks(commands.Cog):
         )
         courses = {}
 
-        async with self.bot.client_session.get(url) as resp:
-            soup = lxml.html.fromstring(await resp.text())
-
-        self.find_courses(courses, soup)
-
-        links = soup.xpath('.//div[@id="pagination"]//a/@href')[:-1]
-
-        for link in links:
-            async with self.bot.client_session.get(link) as resp:
-                soup = lxml.html.fromstring(await resp.text())
+        try:
+            async with self.bot.client_session.get(url) as resp:
+                links = await self.DB.run(
+                    self.parse_courses, courses, await resp.text()
+                )
 
-            self.find_courses(courses, soup)
+            for link in links:
+                async with self.bot.client_session.get(link) as resp:
+                    await self.DB.run(self.parse_courses, courses, await resp.text())
+        except (asyncio.exceptions.TimeoutError, aiohttp.ClientError):
+            # Keep the courses already saved rather than saving some of them
+            return
 
         self.DB.main.put(b"courses", orjson.dumps(courses))
 
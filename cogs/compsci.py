@@ -8,7 +8,15 @@ import discord
 import orjson
 from discord.ext import commands, pages
 
-from cogs.utils.calculation import bin_float, hex_float, oct_float, safe_eval
+from cogs.utils.calculation import (
+    MAX_TRUTH_VARIABLES,
+    bin_float,
+    compile_expression,
+    hex_float,
+    oct_float,
+    truth_table,
+)
+from cogs.utils.http import TIMEOUTS
 
 TIO_ALIASES = {
     "asm": "assembly-nasm",
@@ -223,7 +231,7 @@ class compsci(commands.Cog):
             numbers = [int(num, base) for num in re.findall(regex, expr)]
             expr = re.sub(regex, "{}", expr).format(*numbers)
 
-        result = safe_eval(compile(expr, "<calc>", "eval", flags=1024).body)
+        result = compile_expression(expr)()
 
         embed = discord.Embed(color=discord.Color.blurple())
 
@@ -376,7 +384,7 @@ class compsci(commands.Cog):
         )[2:-4]
 
         async with ctx.typing(), self.bot.client_session.post(
-            url, data=data, timeout=15
+            url, data=data, timeout=TIMEOUTS["slow"]
         ) as resp:
             output = (await resp.read()).decode("utf-8")
             output = output.replace(output[:16], "")
@@ -901,61 +909,51 @@ class compsci(commands.Cog):
 
         expr: str
         """
-        letters = []
-        table = {}
-
-        for letter in expr:
-            if letter.isalpha() and letter not in letters:
-                letters.append(letter)
-                table[ord(letter)] = f"{{{letter}}}"
-
+        letters = tuple(sorted({letter for letter in expr if letter.isalpha()}))
         count = len(letters)
 
-        if count > 6:
+        if count > MAX_TRUTH_VARIABLES:
             return await ctx.send(
                 embed=discord.Embed(
                     color=discord.Color.blurple(),
-                    title=f"More than 6 variables ({count})",
+                    title=f"More than {MAX_TRUTH_VARIABLES} variables ({count})",
                 ).set_footer(
-                    text="Having more than 6 variables would make the table too large to send"
+                    text="Having more variables would make the table too large to send"
                 )
             )
 
-        letters.sort()
-
-        total = 2**count
-        checks = [list(f"{num:0>{count}b}") for num in range(total)]
-
         # ⇒ | (not A) or B
         # ↔ | A == B
         # ∧ | A and B
         # ∨ | A or B
         # ~ | not (A)
-        table.update(
-            {
-                8658: " @ ",  # ⇒
-                8594: " @ ",  # →
-                8596: " == ",  # ↔
-                8743: " and ",  # ∧
-                8744: " or ",  # ∨
-                172: "not ",  # ¬
-                126: "not ",  # ~
-            }
-        )
+        table = {
+            8658: " @ ",  # ⇒
+            8594: " @ ",  # →
+            8596: " == ",  # ↔
+            8743: " and ",  # ∧
+            8744: " or ",  # ∨
+            172: "not ",  # ¬
+            126: "not ",  # ~
+        }
+        # Space out letters so adjacent ones are separate variables
+        table.update({ord(letter): f" {letter} " for letter in letters})
         expr = expr.replace("<=>", " == ").replace("=>", " @ ").translate(table)
 
-        message = ("| {} " * count).format(*letters) + f"|\n{'_' * ((count * 4) + 1)}\n"
+        results = truth_table(expr.strip(), letters)
 
-        for check in checks:
-            result = safe_eval(
-                compile(
-                    expr.format(**dict(zip(letters, check))),
-                    "<calc>",
-                    "eval",
-                    flags=1024,
-                ).body
+        message = "".join(f"| {letter} " for letter in letters)
+        message += f"|\n{'_' * ((count * 4) + 1)}\n"
+        message += "".join(
+            "".join(f"| {bit} " for bit in (f"{row:0{count}b}" if count else ""))
+            + f"| {results >> row & 1}\n"
+            for row in range(1 << count)
+        )
+
+        if len(message) > 1980:
+            return await ctx.send(
+                file=discord.File(io.BytesIO(message.encode()), "truth_table.txt")
             )
-            message += (("| {} " * count) + "| {}").format(*check, int(result)) + "\n"
 
         await ctx.send(f"```hs\n{message}```")
 
@@ -2,7 +2,6 @@ import textwrap
 from decimal import Decimal
 
 import discord
-import orjson
 from discord.ext import commands, pages
 
 
@@ -200,23 +199,25 @@ class crypto(commands.Cog):
             "Name:    Amount:      Price:             Percent Gain:\n"
         )
 
+        prices = self.DB.get_prices("crypto")
+
         for crypto in cryptobal:
-            data = self.DB.get_crypto(crypto)
+            price = prices.price(crypto)
 
             trades = [
                 trade[1] / trade[0]
                 for trade in cryptobal[crypto]["history"]
                 if trade[0] > 0
             ]
-            change = ((data["price"] / (sum(trades) / len(trades))) - 1) * 100
+            change = ((price / (sum(trades) / len(trades))) - 1) * 100
             color = "31" if change < 0 else "32"
 
             msg += (
                 f"[2;{color}m{crypto + ':':<8} {cryptobal[crypto]['total']:<13.2f}"
-                f"${data['price']:<17.2f} {change:.2f}%\n[0m"
+                f"${price:<17.2f} {change:.2f}%\n[0m"
             )
 
-            net_value += cryptobal[crypto]["total"] * float(data["price"])
+            net_value += cryptobal[crypto]["total"] * price
 
         embed.description = f"```ansi\n{msg}\nNet Value: ${net_value:.2f}```"
         await ctx.send(embed=embed)
@@ -283,13 +284,15 @@ class crypto(commands.Cog):
         """Shows the prices of crypto with pagination."""
         messages = []
         cryptos = ""
-        for i, (crypto, price) in enumerate(self.DB.crypto, start=1):
-            price = orjson.loads(price)["price"]
+        prices = self.DB.get_prices("crypto")
 
+        for i, (crypto, price) in enumerate(
+            zip(prices.symbols.tolist(), prices.prices.tolist()), start=1
+        ):
             if not i % 3:
-                cryptos += f"{crypto.decode():}: ${float(price):.2f}\n"
+                cryptos += f"{crypto}: ${price:.2f}\n"
             else:
-                cryptos += f"{crypto.decode():}: ${float(price):.2f}\t".expandtabs()
+                cryptos += f"{crypto}: ${price:.2f}\t".expandtabs()
 
             if not i % 99:
                 messages.append(discord.Embed(description=f"```prolog\n{cryptos}```"))
@@ -447,12 +447,13 @@ class economy(commands.Cog):
             The amount of balances to get defaulting to 10.
         """
         baltop = []
-        for member, bal in self.DB.bal:
+        for member, bal in self.DB.get_baltop():
+            if len(baltop) >= amount:
+                break
+
             member = self.bot.get_user(int(member))
             if member:
-                baltop.append((float(bal), member.display_name))
-
-        baltop = sorted(baltop, reverse=True)[:amount]
+                baltop.append((bal, member.display_name))
 
         embed = discord.Embed(
             color=discord.Color.blurple(),
@@ -477,22 +478,11 @@ class economy(commands.Cog):
 
         embed = discord.Embed(color=discord.Color.blurple())
 
-        def get_value(values, db):
-            if values:
-                return Decimal(
-                    sum(
-                        [
-                            stock[1]["total"]
-                            * float(orjson.loads(db.get(stock[0].encode()))["price"])
-                            for stock in values.items()
-                        ]
-                    )
-                )
-
-            return 0
+        networth = self.DB.networth
+        await networth.ensure_loaded()
 
-        stock_value = get_value(self.DB.get_stockbal(member_id), self.DB.stocks)
-        crypto_value = get_value(self.DB.get_cryptobal(member_id), self.DB.crypto)
+        stock_value = Decimal(networth.value_of(member_id, "stocks"))
+        crypto_value = Decimal(networth.value_of(member_id, "crypto"))
 
         embed.add_field(
             name=f"{member.display_name}'s net worth",
@@ -514,32 +504,17 @@ class economy(commands.Cog):
         amount: int
             The amount of members to get
         """
+        net_top = []
 
-        def get_value(values, db):
-            if values:
-                return sum(
-                    [
-                        stock[1]["total"]
-                        * float(orjson.loads(db.get(stock[0].encode()))["price"])
-                        for stock in values.items()
-                    ]
-                )
+        await self.DB.networth.ensure_loaded()
 
-            return 0
+        for member_id, value in self.DB.networth.top():
+            if len(net_top) >= amount:
+                break
 
-        net_top = []
+            if member := self.bot.get_user(int(member_id)):
+                net_top.append((value, member.display_name))
 
-        for member_id, value in self.DB.bal:
-            stock_value = get_value(self.DB.get_stockbal(member_id), self.DB.stocks)
-            crypto_value = get_value(self.DB.get_cryptobal(member_id), self.DB.crypto)
-            # fmt: off
-            if (member := self.bot.get_user(int(member_id))):
-                net_top.append(
-                    (float(value) + stock_value + crypto_value, member.display_name)
-                )
-            # fmt: on
-
-        net_top = sorted(net_top, reverse=True)[:amount]
         embed = discord.Embed(color=discord.Color.blurple())
 
         embed.title = f"Top {len(net_top)} Richest Members"
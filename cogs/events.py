@@ -1,4 +1,3 @@
-import difflib
 import logging
 import os
 import platform
@@ -11,6 +10,10 @@ import orjson
 import psutil
 from discord.ext import commands
 
+from cogs.utils import codec
+from cogs.utils.http import CircuitOpenError
+from cogs.utils.ratelimit import SlidingSketch, SlidingWindow
+
 GIST_REGEX = re.compile(
     r"(?P<host>(http(s)?://gist\.github\.com))/"
     r"(?P<owner>[\w,\-,\_]+)/(?P<id>[\w,\-,\_]+)((/){0,1})"
@@ -29,11 +32,6 @@ class DeleteButton(discord.ui.View):
                 await interaction.message.delete()
 
 
-class CooldownByContent(commands.CooldownMapping):
-    def _bucket_key(self, message: discord.Message) -> tuple[int, str]:
-        return (message.channel.id, message.content)
-
-
 class SpamChecker:
     """Checks if someone is spamming via the below criteria
     1) If a user has spammed more than 10 times in 12 seconds
@@ -42,16 +40,9 @@ class SpamChecker:
     """
 
     def __init__(self):
-        self.by_content = CooldownByContent.from_cooldown(
-            15, 17.0, commands.BucketType.member
-        )
-        self.by_user = commands.CooldownMapping.from_cooldown(
-            10, 12.0, commands.BucketType.user
-        )
-
-        self.by_mentions = commands.CooldownMapping.from_cooldown(
-            40, 12.0, commands.BucketType.member
-        )
+        self.by_content = SlidingSketch(15, 17.0)
+        self.by_user = SlidingWindow(10, 12.0)
+        self.by_mentions = SlidingWindow(40, 12.0)
 
     def is_spamming(self, message: discord.Message) -> bool:
         if message.guild is None:
@@ -59,12 +50,10 @@ class SpamChecker:
 
         current = message.created_at.timestamp()
 
-        user_bucket = self.by_user.get_bucket(message)
-        if user_bucket.update_rate_limit(current):
+        if self.by_user.hit(message.author.id, current):
             return True
 
-        content_bucket = self.by_content.get_bucket(message)
-        if content_bucket.update_rate_limit(current):
+        if self.by_content.hit((message.channel.id, message.content), current):
             return True
 
         if self.is_mention_spam(message, current):
@@ -73,13 +62,16 @@ class SpamChecker:
         return False
 
     def is_mention_spam(self, message: discord.Message, current: float) -> bool:
-        mention_bucket = self.by_mentions.get_bucket(message, current)
         mention_count = sum(
             not m.bot and m.id != message.author.id for m in message.mentions
         )
-        mention_bucket._tokens -= mention_count - 1
 
-        return mention_bucket.update_rate_limit(current) is not None
+        if not mention_count:
+            return False
+
+        return self.by_mentions.hit(
+            (message.guild.id, message.author.id), current, mention_count
+        )
 
 
 class events(commands.Cog):
@@ -88,37 +80,20 @@ class events(commands.Cog):
         self.DB = bot.DB
         self.spam_checker = SpamChecker()
 
-    async def poll_check(self, payload):
+    async def poll_check(self, payload, amount: int = 1):
         """Keeps track of poll results.
 
         payload: discord.RawReactionActionEvent
             A payload of raw data about the reaction and member.
+        amount: int
+            -1 when the reaction was removed.
         """
         if not payload.guild_id or payload.emoji.is_custom_emoji():
             return
 
-        polls = self.DB.main.get(b"polls")
-
-        if not polls:
-            return
-
-        polls = orjson.loads(polls)
-        guild = str(payload.guild_id)
-
-        if guild not in polls:
-            return
-
-        message = str(payload.message_id)
-
-        if message not in polls[guild]:
-            return
-
-        if payload.emoji.name not in polls[guild][message]:
-            return
-
-        polls[guild][message][payload.emoji.name]["count"] += 1
-
-        self.DB.main.put(b"polls", orjson.dumps(polls))
+        self.DB.add_vote(
+            payload.guild_id, payload.message_id, payload.emoji.name, amount
+        )
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
@@ -132,6 +107,18 @@ class events(commands.Cog):
 
         await self.poll_check(payload)
 
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        """Takes back the vote of a reaction removed from a poll.
+
+        payload: discord.RawReactionActionEvent
+            A payload of raw data about the reaction and member.
+        """
+        if payload.user_id == self.bot.user.id:
+            return
+
+        await self.poll_check(payload, -1)
+
     @commands.Cog.listener()
     async def on_reaction_add(self, reaction, user):
         """The event called when a reaction is added to a message in the cache.
@@ -229,17 +216,13 @@ class events(commands.Cog):
         ):
             return
 
-        member_id = f"{before.guild.id}-{before.author.id}".encode()
-        edited = self.DB.edited.get(member_id)
-
-        if not edited:
-            edited = {}
-        else:
-            edited = orjson.loads(edited)
-
-        date = str(int(datetime.now().timestamp()))
-        edited[date] = [before.content, after.content]
-        self.DB.edited.put(member_id, orjson.dumps(edited))
+        self.DB.add_history(
+            self.DB.edited,
+            before.guild.id,
+            before.author.id,
+            int(datetime.now().timestamp() * 1000),
+            orjson.dumps([before.content, after.content]),
+        )
         self.DB.main.put(
             f"{before.guild.id}-editsnipe_message".encode(),
             orjson.dumps([before.content, after.content, before.author.display_name]),
@@ -294,18 +277,13 @@ class events(commands.Cog):
             "\n".join(attachments),
         )
 
-        member_id = f"{message.guild.id}-{message.author.id}".encode()
-        deleted = self.DB.deleted.get(member_id)
-
-        if not deleted:
-            deleted = {}
-        else:
-            deleted = orjson.loads(deleted)
-
-        time_sent = str(((message.id >> 22) + 1420070400000) // 1000)
-        deleted[time_sent] = message.content
-
-        self.DB.deleted.put(member_id, orjson.dumps(deleted))
+        self.DB.add_history(
+            self.DB.deleted,
+            message.guild.id,
+            message.author.id,
+            (message.id >> 22) + 1420070400000,
+            message.content.encode(),
+        )
         self.DB.main.put(
             f"{message.guild.id}-snipe_message".encode(),
             orjson.dumps([content, message.author.display_name]),
@@ -355,12 +333,9 @@ class events(commands.Cog):
             except (discord.errors.Forbidden, discord.errors.HTTPException):
                 pass
 
-        key = f"{guild_id}-{message.author.id}".encode()
-        count = self.DB.message_count.get(key)
-        # Add 1 to count and put it back into the database
-        self.DB.message_count.put(key, str(int(count) + 1).encode() if count else b"1")
+        self.DB.add_message_count(guild_id, message.author.id)
 
-        if key == b"815732601302155275-190747796452671488":
+        if guild_id == 815732601302155275 and message.author.id == 190747796452671488:
             if message.content and not message.content.startswith("."):
                 messages = orjson.loads(self.DB.main.get(b"justins-messages"))
                 messages.append(message.content)
@@ -467,10 +442,10 @@ class events(commands.Cog):
             uses = self.DB.invites.get(invite_key.encode())
 
             if not uses:
-                self.DB.invites.put(invite_key.encode(), str(invite.uses).encode())
+                self.DB.invites.put(invite_key.encode(), codec.encode_int(invite.uses))
                 continue
 
-            if invite.uses > int(uses):
+            if invite.uses > codec.decode_int(uses):
                 self.DB.invites.put(member_key.encode(), invite.code.encode())
 
     @commands.Cog.listener()
@@ -501,7 +476,7 @@ class events(commands.Cog):
         invite: discord.Invite
         """
         key = f"{invite.code}-{invite.guild.id}"
-        self.DB.invites.put(key.encode(), str(invite.uses).encode())
+        self.DB.invites.put(key.encode(), codec.encode_int(invite.uses))
 
     @commands.Cog.listener()
     async def on_invite_delete(self, invite):
@@ -541,13 +516,21 @@ class events(commands.Cog):
 
             invoked = ctx.message.content.split()[0].removeprefix(ctx.prefix)
 
-            all_commands = [
-                str(command)
-                for command in self.bot.walk_commands()
-                if not command.hidden and await self.can_run(ctx, command)
-            ]
+            # Rebuilt after a cog has been loaded, reloaded or unloaded
+            if self.bot.command_index.stale:
+                self.bot.build_command_index()
+
+            matches = []
 
-            matches = difflib.get_close_matches(invoked, all_commands, cutoff=0.5)
+            # Only the few close names are permission checked
+            for name in self.bot.command_index.search(invoked, cutoff=0.5):
+                command = self.bot.get_command(name)
+
+                if command and await self.can_run(ctx, command):
+                    matches.append(name)
+
+                    if len(matches) == 3:
+                        break
 
             if not matches:
                 return
@@ -577,6 +560,10 @@ class events(commands.Cog):
                 f"{error}\n\nUsage:\n{ctx.prefix}{ctx.command} {ctx.command.signature}"
             )
 
+        elif isinstance(error, CircuitOpenError):
+            ctx.command.reset_cooldown(ctx)
+            message = f"An api this command uses is down.\n\n{error}"
+
         elif isinstance(error, commands.errors.BotMissingPermissions):
             message = f"{self.bot.user.name} is missing required permissions: {error.missing_perms}"
 
@@ -608,9 +595,6 @@ class events(commands.Cog):
 
             self.DB.main.put(b"boot_times", orjson.dumps(boot_times))
 
-            # Wipe the polls as we have no way of knowing if they have expired
-            self.DB.main.delete(b"polls")
-
             self.bot.get_cog("admin").on_ready()
 
             print(
@@ -624,18 +608,30 @@ class events(commands.Cog):
 
     async def bot_check_once(self, ctx):
         """Checks if a user blacklisted and the if the command is disabled."""
+        # Commands would write to the db while it is being restored
+        if self.DB.restoring:
+            await ctx.send(
+                embed=discord.Embed(
+                    color=discord.Color.red(),
+                    description="```Restoring a backup, try again shortly```",
+                )
+            )
+            return False
+
         if ctx.author.id in self.bot.owner_ids:
             return True
 
         if ctx.guild:
             guild_id = ctx.guild.id
-            disabled = self.DB.main.get(f"{guild_id}-disabled_channels".encode())
+            policy = self.DB.policies.get(guild_id)
 
-            if disabled and ctx.command.name != "disable_channel":
-                if ctx.channel.id in orjson.loads(disabled):
-                    return False
+            if (
+                ctx.channel.id in policy.disabled_channels
+                and ctx.command.name != "disable_channel"
+            ):
+                return False
 
-            if self.DB.main.get(f"{guild_id}-t-{ctx.command}".encode()):
+            if str(ctx.command) in policy.disabled_commands:
                 await ctx.send(
                     embed=discord.Embed(
                         color=discord.Color.red(), description="```Command disabled```"
@@ -4,6 +4,8 @@ from io import BytesIO
 import discord
 from discord.ext import commands
 
+from cogs.utils.http import TIMEOUTS
+
 
 class images(commands.Cog):
     """Image manipulation commands."""
@@ -46,7 +48,7 @@ class images(commands.Cog):
         }
 
         async with ctx.typing(), self.bot.client_session.post(
-            url, json=data, headers=headers, timeout=30
+            url, json=data, headers=headers, timeout=TIMEOUTS["slow"]
         ) as resp:
             if resp.content_type == "text/plain":
                 return await ctx.reply(
@@ -75,7 +77,7 @@ class images(commands.Cog):
         api_url = f"https://api.jeyy.xyz/image/{endpoint}?image_url={url}"
 
         async with ctx.typing(), self.bot.client_session.get(
-            api_url, timeout=30
+            api_url, timeout=TIMEOUTS["slow"]
         ) as resp:
             if resp.status != 200:
                 return await ctx.reply(
@@ -333,7 +335,9 @@ class images(commands.Cog):
         url = "https://api.jeyy.xyz/isometric"
         params = {"iso_code": codes}
 
-        async with self.bot.client_session.get(url, params=params, timeout=30) as resp:
+        async with self.bot.client_session.get(
+            url, params=params, timeout=TIMEOUTS["slow"]
+        ) as resp:
             image = BytesIO()
 
             async for chunk in resp.content.iter_chunked(8 * 1024):
@@ -12,6 +12,8 @@ import orjson
 import psutil
 from discord.ext import commands
 
+from cogs.utils import codec
+
 
 class information(commands.Cog):
     """Commands that give information about the bot or server."""
@@ -105,9 +107,9 @@ class information(commands.Cog):
         msgtop = []
         guild = str(ctx.guild.id).encode()
 
-        for member, count in self.DB.message_count:
-            if member.startswith(guild):
-                msgtop.append((int(count), member.decode()))
+        self.DB.counters.flush()
+        for member, count in await self.DB.ascan(guild + b"-", self.DB.message_count):
+            msgtop.append((codec.decode_int(count), member.decode()))
 
         msgtop.sort(reverse=True)
 
@@ -10,7 +10,9 @@ import opcode
 import orjson
 from discord.ext import commands, pages
 
+from cogs.utils import codec
 from cogs.utils.color import hsslv
+from cogs.utils.http import TIMEOUTS
 from cogs.utils.time import parse_date
 
 try:
@@ -440,16 +442,18 @@ class misc(commands.Cog):
         files = []
 
         async with ctx.typing():
-            resp = await self.bot.client_session.post(url, json=data, timeout=60)
-            if resp.status != 200:
-                ctx.command.reset_cooldown(ctx)
-                return await ctx.send(
-                    embed=discord.Embed(
-                        color=discord.Color.blurple(),
-                        description=f"```Api cannot be reached [{resp.status}]```",
+            async with self.bot.client_session.post(
+                url, json=data, timeout=TIMEOUTS["long"]
+            ) as resp:
+                if resp.status != 200:
+                    ctx.command.reset_cooldown(ctx)
+                    return await ctx.send(
+                        embed=discord.Embed(
+                            color=discord.Color.blurple(),
+                            description=f"```Api cannot be reached [{resp.status}]```",
+                        )
                     )
-                )
-            data = await resp.json(content_type=None)
+                data = await resp.json(content_type=None)
 
             if "wavNames" not in data:
                 ctx.command.reset_cooldown(ctx)
@@ -462,10 +466,12 @@ class misc(commands.Cog):
                 )
 
             for audiofile in data["wavNames"]:
-                audio = await self.bot.client_session.get(
+                async with self.bot.client_session.get(
                     f"https://cdn.15.ai/audio/{audiofile}"
-                )
-                files.append(discord.File(io.BytesIO(await audio.read()), audiofile))
+                ) as audio:
+                    files.append(
+                        discord.File(io.BytesIO(await audio.read()), audiofile)
+                    )
 
         await ctx.send(files=files)
 
@@ -604,15 +610,9 @@ class misc(commands.Cog):
             The user to get the karma of.
         """
         user = user or ctx.author
-        user_id = str(user.id).encode()
-        karma = self.DB.karma.get(user_id)
-
-        if not karma:
-            karma = 0
-        else:
-            karma = karma.decode()
+        karma = self.DB.get_karma(user.id)
 
-        color = "32" if int(karma) > 0 else "31"
+        color = "32" if karma > 0 else "31"
 
         embed = discord.Embed(color=0x0)
 
@@ -622,8 +622,13 @@ class misc(commands.Cog):
     @commands.command(aliases=["kboard", "ktop", "karmatop"])
     async def karmaboard(self, ctx):
         """Displays the top 5 and bottom 5 members karma."""
+        self.DB.counters.flush()
         sorted_karma = sorted(
-            [(int(k), int(m)) for m, k in self.DB.karma], reverse=True
+            [
+                (codec.decode_int(k), int(m))
+                for m, k in await self.DB.ascan(db=self.DB.karma)
+            ],
+            reverse=True,
         )
         embed = discord.Embed(title="Karma Board", color=discord.Color.blurple())
 
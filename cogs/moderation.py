@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import asyncio
 import time
+from contextlib import suppress
 
 import discord
 import orjson
 from discord.ext import commands, pages
 
+from cogs.utils import codec
 from cogs.utils.time import parse_time
 
 
@@ -16,8 +18,7 @@ class moderation(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.DB = bot.DB
-        self.loop = bot.loop
-        self.handles = {}
+        bot.scheduler.register("poll", self.poll_expired)
 
     @commands.has_permissions(moderate_members=True)
     @commands.command()
@@ -50,7 +51,7 @@ class moderation(commands.Cog):
         count = 0
 
         for member, invite in self.DB.invites:
-            if invite.isdigit():
+            if not codec.is_legacy(invite) or invite.isdigit():
                 continue
 
             member = self.bot.get_user(int(member.split(b"-")[0]))
@@ -75,30 +76,34 @@ class moderation(commands.Cog):
         paginator = pages.Paginator(pages=invite_list)
         await paginator.send(ctx)
 
-    async def _end_poll(self, guild, message):
-        """Ends a poll and sends the results."""
-        polls = self.DB.main.get(b"polls")
+    async def end_poll(self, guild_id: int, message_id: int) -> str | None:
+        """Ends a poll, sends the results and returns the winner.
 
-        if not polls:
-            return
+        guild_id: int
+        message_id: int
+        """
+        poll = self.DB.get_poll(guild_id, message_id)
+        votes = self.DB.end_poll(guild_id, message_id)
 
-        message_id = str(message.id)
-        polls = orjson.loads(polls)
+        if not votes:
+            return None
 
-        if guild not in polls:
-            return
+        winner = max(votes, key=votes.get)
 
-        if message_id not in polls[guild]:
-            return
+        if channel := self.bot.get_channel(poll["channel"]):
+            with suppress(discord.HTTPException):
+                await channel.get_partial_message(message_id).reply(
+                    f"Winner of the poll was {winner}"
+                )
 
-        winner = max(
-            polls[guild][message_id], key=lambda x: polls[guild][message_id][x]["count"]
-        )
+        return winner
 
-        await message.reply(f"Winner of the poll was {winner}")
+    async def poll_expired(self, data: dict):
+        """Ends a poll when its scheduled job runs.
 
-        polls[guild].pop(message_id)
-        self.DB.main.put(b"polls", orjson.dumps(polls))
+        data: dict
+        """
+        await self.end_poll(data["guild"], int(data["message"]))
 
     @commands.command()
     @commands.has_permissions(kick_members=True)
@@ -119,83 +124,51 @@ class moderation(commands.Cog):
             embed.description = "```You need at least 2 options```"
             return await ctx.send(embed=embed)
 
-        polls = self.DB.main.get(b"polls")
-
-        if not polls:
-            polls = {}
-        else:
-            polls = orjson.loads(polls)
-
-        guild = str(ctx.guild.id)
-
-        if guild not in polls:
-            polls[guild] = {}
-
-        polls[guild]["temp"] = {}
+        poll = {}
         embed.description = ""
 
         for number, option in enumerate(options):
             emoji = chr(127462 + number)
-            polls[guild]["temp"][emoji] = {
-                "name": option,
-                "count": 0,
-            }
+            poll[emoji] = option
             embed.description += f"{emoji}: {option}\n"
 
         embed.title = title
         message = await ctx.send(embed=embed)
-        message_id = str(message.id)
-
-        polls[guild][message_id] = polls[guild].pop("temp")
 
         for i in range(len(options)):
             await message.add_reaction(chr(127462 + i))
 
-        self.DB.main.put(b"polls", orjson.dumps(polls))
-        handle = self.loop.call_later(
-            21600, asyncio.create_task, self._end_poll(guild, message)
+        job = self.bot.scheduler.schedule(
+            "poll",
+            time.time() + 21600,
+            {"guild": ctx.guild.id, "message": str(message.id)},
         )
-        self.handles[message_id] = handle
+        self.DB.add_poll(ctx.guild.id, ctx.channel.id, message.id, poll, job)
 
     @commands.command()
     @commands.has_permissions(kick_members=True)
     @commands.guild_only()
-    async def endpoll(self, ctx, message_id):
+    async def endpoll(self, ctx, message_id: int):
         """Ends a poll based off its message id."""
-        polls = self.DB.main.get(b"polls")
-
-        if not polls:
-            return
-
-        polls = orjson.loads(polls)
+        poll = self.DB.get_poll(ctx.guild.id, message_id)
 
-        if str(ctx.guild.id) not in polls:
+        if not poll:
             return await ctx.send(
                 embed=discord.Embed(
-                    color=discord.Color.blurple(), description="No polls found"
+                    color=discord.Color.blurple(), description="Poll not found"
                 )
             )
 
-        if message_id not in polls[str(ctx.guild.id)]:
-            return await ctx.send(
+        self.bot.scheduler.cancel(poll["job"])
+
+        # end_poll announces the winner as a reply to the poll
+        if await self.end_poll(ctx.guild.id, message_id) is None:
+            await ctx.send(
                 embed=discord.Embed(
-                    color=discord.Color.blurple(), description="Poll not found"
+                    color=discord.Color.blurple(), description="Poll already ended"
                 )
             )
 
-        winner = max(
-            polls[str(ctx.guild.id)][message_id],
-            key=lambda x: polls[str(ctx.guild.id)][message_id][x]["count"],
-        )
-
-        await ctx.reply(f"Winner of the poll was {winner}")
-
-        polls[str(ctx.guild.id)].pop(message_id)
-        self.DB.main.put(b"polls", orjson.dumps(polls))
-
-        self.handles[message_id].cancel()
-        self.handles.pop(message_id)
-
     @commands.command(name="warn")
     @commands.has_permissions(manage_messages=True)
     @commands.guild_only()
@@ -600,7 +573,7 @@ class moderation(commands.Cog):
     @history.command(aliases=["d"])
     @commands.has_permissions(manage_messages=True)
     @commands.guild_only()
-    async def deleted(self, ctx, member: discord.User = None):
+    async def deleted(self, ctx, member: discord.User = None, amount: int = 100):
         """Shows a members most recent deleted message history.
 
         member: discord.User
@@ -610,23 +583,16 @@ class moderation(commands.Cog):
         """
         member = member or ctx.author
 
-        member_id = f"{ctx.guild.id}-{member.id}".encode()
-        deleted = self.DB.deleted.get(member_id)
         embed = discord.Embed(color=discord.Color.blurple())
-
-        if not deleted:
-            embed.description = "```No deleted messages found```"
-            return await ctx.send(embed=embed)
-
-        deleted = orjson.loads(deleted)
-
         embeds = []
         count = 0
 
-        for date, message in reversed(deleted.items()):
-            message = message.replace("`", "`\u200B")
+        for date, message in self.DB.get_history(
+            self.DB.deleted, ctx.guild.id, member.id, amount
+        ):
+            message = message.decode().replace("`", "`\u200B")
             if message:
-                embed.add_field(name=f"<t:{date}:R>", value=message)
+                embed.add_field(name=f"<t:{date // 1000}:R>", value=message)
                 count += 1
 
                 if count == 10:
@@ -634,7 +600,11 @@ class moderation(commands.Cog):
                     embed = discord.Embed(color=discord.Color.blurple())
                     count = 0
 
-        if count != 10:
+        if not embeds and not count:
+            embed.description = "```No deleted messages found```"
+            return await ctx.send(embed=embed)
+
+        if count:
             embeds.append(embed)
 
         paginator = pages.Paginator(pages=embeds)
@@ -643,7 +613,7 @@ class moderation(commands.Cog):
     @history.command(aliases=["e"])
     @commands.has_permissions(manage_messages=True)
     @commands.guild_only()
-    async def edited(self, ctx, member: discord.User = None):
+    async def edited(self, ctx, member: discord.User = None, amount: int = 100):
         """Shows a users most recent edit message history.
 
         member: discord.User
@@ -653,23 +623,18 @@ class moderation(commands.Cog):
         """
         member = member or ctx.author
 
-        member_id = f"{ctx.guild.id}-{member.id}".encode()
-        edited = self.DB.edited.get(member_id)
         embed = discord.Embed(color=discord.Color.blurple())
-
-        if not edited:
-            embed.description = "```No edited messages found```"
-            return await ctx.send(embed=embed)
-
-        edited = orjson.loads(edited)
         embeds = []
         count = 0
 
-        for index, (date, (before, after)) in enumerate(reversed(edited.items())):
+        for date, edit in self.DB.get_history(
+            self.DB.edited, ctx.guild.id, member.id, amount
+        ):
+            before, after = orjson.loads(edit)
             before = before.replace("`", "`\u200b")
             after = after.replace("`", "`\u200b")
 
-            embed.add_field(name=f"<t:{date}:R>", value=f"{before} >>> {after}")
+            embed.add_field(name=f"<t:{date // 1000}:R>", value=f"{before} >>> {after}")
             count += 1
 
             if count == 10:
@@ -677,7 +642,11 @@ class moderation(commands.Cog):
                 embed = discord.Embed(color=discord.Color.blurple())
                 count = 0
 
-        if count != 10:
+        if not embeds and not count:
+            embed.description = "```No edited messages found```"
+            return await ctx.send(embed=embed)
+
+        if count:
             embeds.append(embed)
 
         paginator = pages.Paginator(pages=embeds)
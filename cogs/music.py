@@ -1,5 +1,8 @@
 import asyncio
+import copy
 import functools
+import re
+import time
 
 import discord
 import yt_dlp
@@ -14,6 +17,15 @@ else:
     asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 
+MAX_QUEUE = 200
+
+# Youtube's signed stream urls say when they expire, others are assumed
+# to last an hour
+EXPIRE_REGEX = re.compile(r"[?&/]expire[=/](\d+)")
+STREAM_TTL = 3600
+STREAM_MARGIN = 60
+
+
 class VoiceError(Exception):
     pass
 
@@ -44,34 +56,9 @@ class YTDLSource(discord.PCMVolumeTransformer):
 
     ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
 
-    def __init__(
-        self,
-        ctx,
-        source: discord.FFmpegPCMAudio,
-        *,
-        data: dict,
-        volume: float = 0.5,
-    ):
+    def __init__(self, song, source: discord.FFmpegPCMAudio, *, volume: float = 0.5):
         super().__init__(source, volume)
-
-        self.requester = ctx.author
-        self.channel = ctx.channel
-        self.data = data
-
-        self.uploader = data.get("uploader")
-        self.title = data.get("title")
-        self.title_limited = self.parse_limited_title(data["title"])
-        self.title_limited_embed = self.parse_limited_title_embed(data["title"])
-        self.thumbnail = data.get("thumbnail")
-        self.description = data.get("description")
-        self.duration = self.parse_duration(data["duration"])
-        self.url = data.get("webpage_url")
-        self.views = self.parse_number(data["view_count"])
-        self.likes = self.parse_number(data["like_count"])
-        self.stream_url = data.get("url")
-
-    def __str__(self):
-        return f"**{self.title}** by **{self.uploader}**"
+        self.song = song
 
     @classmethod
     async def check_type(cls, search: str, *, loop):
@@ -112,16 +99,30 @@ class YTDLSource(discord.PCMVolumeTransformer):
         return songs
 
     @classmethod
-    async def create_source_single(cls, ctx, data, *, loop):
-        search = data.get("id")
+    async def extract(cls, data, *, loop) -> dict:
+        """Returns the processed info of a video including its stream url.
 
-        if search:
-            search = f"https://www.youtube.com/watch?v={search}"
+        data: dict
+            Info from check_type, a playlist entry or a song's url.
+        """
+        # Videos from check_type have already been fetched, only a format
+        # needs picking
+        if data.get("formats"):
+            partial = functools.partial(
+                cls.ytdl.process_ie_result, data, download=False
+            )
+            processed_info = await loop.run_in_executor(None, partial)
+            search = data.get("webpage_url")
         else:
-            search = data["webpage_url"]
+            search = data.get("id")
+
+            if search:
+                search = f"https://www.youtube.com/watch?v={search}"
+            else:
+                search = data["webpage_url"]
 
-        partial = functools.partial(cls.ytdl.extract_info, search, download=False)
-        processed_info = await loop.run_in_executor(None, partial)
+            partial = functools.partial(cls.ytdl.extract_info, search, download=False)
+            processed_info = await loop.run_in_executor(None, partial)
 
         if processed_info is None:
             raise YTDLError(f"Couldn't fetch: {search}")
@@ -136,14 +137,59 @@ class YTDLSource(discord.PCMVolumeTransformer):
         else:
             info = processed_info
 
-        duration = info["duration"]
+        cls.check_playable(info, search)
+        return info
+
+    @staticmethod
+    def check_playable(info: dict, search: str):
+        """Raises YTDLError if a video can't be queued.
+
+        info: dict
+            Processed or unprocessed info of a video.
+        search: str
+        """
+        duration = info.get("duration")
+
+        # Livestreams and premieres have no duration to seek or expire by
+        if (
+            duration is None
+            or info.get("is_live")
+            or info.get("live_status") in ("is_live", "is_upcoming")
+        ):
+            raise YTDLError(f"Can't play livestreams or premieres: {search}")
 
         if duration > 72000:
             raise YTDLError(f"Video is longer than 20 hours({duration//3600} hours)")
 
-        return cls(
-            ctx, discord.FFmpegPCMAudio(info["url"], **cls.FFMPEG_OPTIONS), data=info
-        )
+    @classmethod
+    def create_song(cls, ctx, data: dict):
+        """Returns a song from the info of check_type or a playlist entry.
+
+        Nothing is extracted, the stream url is resolved when the song
+        is about to play.
+
+        data: dict
+        """
+        cls.check_playable(data, data.get("webpage_url") or data.get("url"))
+        return Song(ctx, data)
+
+    @classmethod
+    def create_songs(cls, ctx, entries: list) -> tuple[list, int]:
+        """Returns the songs of a playlist and how many entries were skipped.
+
+        entries: list[dict]
+            The unprocessed entries of the playlist.
+        """
+        songs = []
+        skipped = 0
+
+        for entry in entries:
+            try:
+                songs.append(cls.create_song(ctx, entry))
+            except YTDLError:
+                skipped += 1
+
+        return songs, skipped
 
     @staticmethod
     def parse_duration(duration: int):
@@ -203,6 +249,7 @@ class VoiceState:
         self.songs = SongQueue()
 
         self.processing = False
+        self.prefetching = None
         self._loop = False
         self._volume = 0.5
         self.skip_votes = set()
@@ -236,20 +283,43 @@ class VoiceState:
                 except asyncio.TimeoutError:
                     self.bot.loop.create_task(self.stop())
                     return
-                self.current.source.volume = self._volume
-                self.voice.play(self.current.source, after=self.play_next_song)
             else:
-                self.now = discord.FFmpegPCMAudio(
-                    self.current.source.stream_url, **YTDLSource.FFMPEG_OPTIONS
-                )
-                self.voice.play(self.now, after=self.play_next_song)
+                self.current.start = 0
 
             if not self.voice:
                 self.bot.loop.create_task(self.stop())
                 return
 
+            try:
+                await self.current.resolve(self.bot.loop)
+            except (YTDLError, yt_dlp.utils.DownloadError):
+                # The song is no longer available
+                self._loop = False
+                continue
+
+            self.voice.play(
+                self.current.create_source(self._volume), after=self.play_next_song
+            )
+
+            if len(self.songs):
+                self.prefetching = self.bot.loop.create_task(
+                    self.prefetch(self.current.duration - self.current.start)
+                )
+
             await self.next.wait()
             self.current.source.cleanup()
+            self.current.source = None
+
+    async def prefetch(self, delay: float):
+        """Makes sure the next song's stream url lasts until it has played.
+
+        delay: float
+            How many seconds until the next song starts.
+        """
+        try:
+            await self.songs[0].resolve(self.bot.loop, delay)
+        except (IndexError, YTDLError, yt_dlp.utils.DownloadError):
+            pass
 
     def play_next_song(self, error=None):
         if error:
@@ -264,6 +334,9 @@ class VoiceState:
             self.voice.stop()
 
     async def stop(self):
+        if self.prefetching:
+            self.prefetching.cancel()
+
         self.songs.clear()
         self.audio_player.cancel()
 
@@ -273,12 +346,124 @@ class VoiceState:
             self.voice = None
 
 
+def stream_expiry(stream_url: str) -> float:
+    """Returns when a stream url stops working.
+
+    stream_url: str
+    """
+    if match := EXPIRE_REGEX.search(stream_url or ""):
+        return float(match[1])
+    return time.time() + STREAM_TTL
+
+
 class Song:
-    __slots__ = ("source", "requester")
+    """A queued song keeping only what is shown and what is needed to play it.
+
+    Only the metadata shown in the queue is kept, the stream url is
+    extracted just before the song plays and again if it would expire
+    before the song ends.
+    """
+
+    __slots__ = (
+        "requester",
+        "channel",
+        "url",
+        "title",
+        "uploader",
+        "thumbnail",
+        "duration",
+        "views",
+        "stream_url",
+        "expires",
+        "start",
+        "source",
+        "resolving",
+    )
+
+    def __init__(self, ctx, info: dict):
+        """
+        info: dict
+            Unprocessed info of a video or a flat playlist entry, which
+            only has the video's url in url.
+        """
+        self.requester = ctx.author
+        self.channel = ctx.channel
+
+        self.url = info.get("webpage_url") or info.get("url")
+        self.title = info.get("title")
+        self.uploader = info.get("uploader") or info.get("channel")
+        self.thumbnail = info.get("thumbnail")
+        self.duration = info["duration"]
+        self.views = info.get("view_count") or 0
+        self.stream_url = None
+        self.expires = 0.0
+
+        if not self.thumbnail and info.get("thumbnails"):
+            self.thumbnail = info["thumbnails"][-1]["url"]
+
+        self.start = 0
+        self.source = None
+        self.resolving = None
+
+    def __str__(self):
+        return f"**{self.title}** by **{self.uploader}**"
+
+    @property
+    def title_limited(self):
+        return YTDLSource.parse_limited_title(self.title)
+
+    @property
+    def title_limited_embed(self):
+        return YTDLSource.parse_limited_title_embed(self.title)
+
+    def expiring(self, delay: float = 0) -> bool:
+        """Returns whether the stream url expires before the song could end.
 
-    def __init__(self, source: YTDLSource):
-        self.source = source
-        self.requester = source.requester
+        delay: float
+            How many seconds until the song starts.
+        """
+        end = time.time() + delay + self.duration - self.start + STREAM_MARGIN
+        return not self.stream_url or self.expires < end
+
+    async def resolve(self, loop, delay: float = 0) -> str:
+        """Returns a stream url that lasts the song, extracting a new one if needed.
+
+        delay: float
+            How many seconds until the song starts.
+        """
+        if not self.expiring(delay):
+            return self.stream_url
+
+        if self.resolving is None or self.resolving.done():
+            self.resolving = asyncio.ensure_future(
+                YTDLSource.extract({"webpage_url": self.url}, loop=loop)
+            )
+
+        info = await asyncio.shield(self.resolving)
+        self.stream_url = info.get("url")
+        self.expires = stream_expiry(self.stream_url)
+        return self.stream_url
+
+    def create_source(self, volume: float) -> YTDLSource:
+        options = YTDLSource.FFMPEG_OPTIONS
+
+        if self.start:
+            options = {**options, "options": f"{options['options']} -ss {self.start}"}
+
+        self.source = YTDLSource(
+            self, discord.FFmpegPCMAudio(self.stream_url, **options), volume=volume
+        )
+        return self.source
+
+    def seek(self, seconds: int):
+        """Returns a copy of the song that starts at seconds.
+
+        seconds: int
+        """
+        song = copy.copy(self)
+        song.start = seconds
+        song.source = None
+        return song
 
     def create_embed(self, songs, looped):
         if not len(songs):
@@ -287,8 +472,8 @@ class Song:
             queue = ""
             for i, song in enumerate(songs[:5], start=0):
                 queue += (
-                    f"`{i + 1}.` [**{song.source.title_limited_embed}**]"
-                    f"({song.source.url} '{song.source.title}')\n"
+                    f"`{i + 1}.` [**{song.title_limited_embed}**]"
+                    f"({song.url} '{song.title}')\n"
                 )
 
         if len(songs) > 6:
@@ -297,20 +482,20 @@ class Song:
         embed = (
             discord.Embed(
                 title="Now playing",
-                description=f"```css\n{self.source.title}\n```",
+                description=f"```css\n{self.title}\n```",
                 color=discord.Color.blurple(),
             )
-            .set_thumbnail(url=self.source.thumbnail)
-            .add_field(name="Duration", value=self.source.duration)
+            .set_thumbnail(url=self.thumbnail)
+            .add_field(name="Duration", value=YTDLSource.parse_duration(self.duration))
             .add_field(name="Requested by", value=self.requester.mention)
             .add_field(name="\u200b", value="\u200b")
             .add_field(
                 name="Looped", value="Currently looped" if looped else "Not looped"
             )
-            .add_field(name="URL", value=f"[Click]({self.source.url})")
+            .add_field(name="URL", value=f"[Click]({self.url})")
             .add_field(name="\u200b", value="\u200b")
             .add_field(name="Queue:", value=queue)
-            .add_field(name="Views", value=self.source.views)
+            .add_field(name="Views", value=YTDLSource.parse_number(self.views))
             .add_field(name="\u200b", value="\u200b")
         )
         return embed
@@ -475,9 +660,9 @@ class music(commands.Cog):
             )
             return await self.command_error(ctx.message)
 
-        data = ctx.voice_state.current.source.data
+        current = ctx.voice_state.current
 
-        if seconds < 0 or seconds > data["duration"]:
+        if seconds < 0 or seconds > current.duration:
             await ctx.send(
                 embed=discord.Embed(
                     color=discord.Color.dark_red(),
@@ -486,19 +671,7 @@ class music(commands.Cog):
             )
             return await self.command_error(ctx.message)
 
-        song = Song(
-            YTDLSource(
-                ctx,
-                discord.FFmpegPCMAudio(
-                    ctx.voice_state.current.source.stream_url,
-                    before_options="-reconnect 1 -reconnect_streamed 1 "
-                    "-reconnect_delay_max 5",
-                    options=f"-vn -loglevel -8 -ss {seconds}",
-                ),
-                data=data,
-            )
-        )
-        ctx.voice_state.songs._queue.appendleft(song)
+        ctx.voice_state.songs._queue.appendleft(current.seek(seconds))
         ctx.voice_state.skip()
         await self.command_success(ctx.message)
 
@@ -597,8 +770,8 @@ class music(commands.Cog):
 
             for i, song in enumerate(songs, start=page):
                 queue += (
-                    f"`{i + 1}.` [**{song.source.title_limited}**]"
-                    f"({song.source.url} '{song.source.title}')\n"
+                    f"`{i + 1}.` [**{song.title_limited}**]"
+                    f"({song.url} '{song.title}')\n"
                 )
             embeds.append(
                 discord.Embed(
@@ -661,7 +834,7 @@ class music(commands.Cog):
 
         total_songs = len(ctx.voice_state.songs)
 
-        if total_songs > 200:
+        if total_songs > MAX_QUEUE:
             return await ctx.send(
                 embed=discord.Embed(
                     color=discord.Color.dark_red(),
@@ -680,31 +853,19 @@ class music(commands.Cog):
 
             if typ in ("playlist", "playlist_alt"):
                 ctx.voice_state.processing = True
-                skipped = 0
 
                 playlist = await YTDLSource.create_source_playlist(
                     typ, data, loop=self.bot.loop
                 )
+                songs, skipped = YTDLSource.create_songs(
+                    ctx, playlist[: MAX_QUEUE + 1 - total_songs]
+                )
 
-                for song in playlist:
-                    # If the bot has been disconnected in the middle stop adding songs.
-                    if not ctx.voice_state.voice:
-                        return
-                    try:
-                        source = await YTDLSource.create_source_single(
-                            ctx,
-                            song,
-                            loop=self.bot.loop,
-                        )
-
-                        await ctx.voice_state.songs.put(Song(source))
-                    except discord.errors.HTTPException:
-                        skipped += 1
-
-                    total_songs += 1
+                if not ctx.voice_state.voice:
+                    return
 
-                    if total_songs > 200:
-                        break
+                for song in songs:
+                    await ctx.voice_state.songs.put(song)
 
                 await ctx.send(f"Playlist added. Removed {skipped} songs.")
                 ctx.voice_state.processing = False
@@ -712,20 +873,16 @@ class music(commands.Cog):
                 return await self.refresh_embed(ctx)
 
             ctx.voice_state.processing = True
-            source = await YTDLSource.create_source_single(
-                ctx,
-                data,
-                loop=self.bot.loop,
-            )
+            song = YTDLSource.create_song(ctx, data)
 
             if not ctx.voice_state.voice:
                 return
 
-            await ctx.voice_state.songs.put(Song(source))
+            await ctx.voice_state.songs.put(song)
             await self.command_success(ctx.message)
             ctx.voice_state.processing = False
 
-            await ctx.send(f"Enqueued {source}", delete_after=20)
+            await ctx.send(f"Enqueued {song}", delete_after=20)
             await self.refresh_embed(ctx)
 
     @play.before_invoke
@@ -4,12 +4,16 @@ import textwrap
 import time
 import traceback
 from contextlib import redirect_stdout
+from datetime import datetime
 from io import StringIO
 
 import discord
 import orjson
 from discord.ext import commands, pages
 
+from cogs.utils import codec
+from cogs.utils.http import BREAKERS, LEAKS
+
 
 class PerformanceMocker:
     """A mock object that can also be used in await expressions."""
@@ -185,7 +189,7 @@ class owner(commands.Cog):
         await ctx.send(
             embed=discord.Embed(
                 color=discord.Color.blurple(),
-                description=f"```Usage: {ctx.prefix}db [del/show/get/put/pre]```",
+                description=f"```Usage: {ctx.prefix}db [del/show/get/put/pre/cache/migrate]```",
             )
         )
 
@@ -252,35 +256,42 @@ class owner(commands.Cog):
     @db.command()
     async def show(self, ctx, exclude=True):
         """Sends a json of the entire database."""
-        database = {}
-
-        if exclude:
-            excluded = (
-                b"crypto",
-                b"stocks",
-                b"message_count",
-                b"invites",
-                b"karma",
-                b"boot_times",
-                b"aliases",
-            )
 
-            for key, value in self.DB.main:
-                if key.split(b"-")[0] not in excluded:
+        def dump():
+            database = {}
+
+            if exclude:
+                excluded = (
+                    b"crypto",
+                    b"stocks",
+                    b"message_count",
+                    b"invites",
+                    b"karma",
+                    b"boot_times",
+                    b"aliases",
+                    b"balindex",
+                )
+
+                for key, value in self.DB.main:
+                    if key.split(b"-")[0] not in excluded:
+                        if value[:1] in [b"{", b"["]:
+                            value = orjson.loads(value)
+                        else:
+                            value = codec.display(value)
+                        database[key.decode()] = value
+            else:
+                for key, value in self.DB.main:
+                    if key.startswith(b"balindex-"):
+                        continue
                     if value[:1] in [b"{", b"["]:
                         value = orjson.loads(value)
                     else:
-                        value = value.decode()
+                        value = codec.display(value)
                     database[key.decode()] = value
-        else:
-            for key, value in self.DB.main:
-                if value[:1] in [b"{", b"["]:
-                    value = orjson.loads(value)
-                else:
-                    value = value.decode()
-                database[key.decode()] = value
 
-        file = StringIO(str(database))
+            return StringIO(str(database))
+
+        file = await self.DB.run(dump)
         await ctx.send(file=discord.File(file, "data.json"))
 
     @db.command(aliases=["pre"])
@@ -295,13 +306,68 @@ class owner(commands.Cog):
             )
 
         database = {
-            key.decode(): value.decode() for key, value in getattr(self.DB, prefixed)
+            key.decode(): codec.display(value)
+            for key, value in await self.DB.ascan(db=getattr(self.DB, prefixed))
         }
 
         file = StringIO(str(database))
 
         await ctx.send(file=discord.File(file, "data.json"))
 
+    @db.command(name="cache")
+    async def db_cache(self, ctx):
+        """Shows the hit and miss counters of the database cache."""
+        stats = self.DB.cache.stats()
+
+        embed = discord.Embed(color=discord.Color.blurple())
+        embed.description = (
+            "```prolog\n"
+            f"Hits: {stats['hits']:,}\n"
+            f"Misses: {stats['misses']:,}\n"
+            f"Hit Rate: {stats['hit_rate']:.2%}\n"
+            f"Evictions: {stats['evictions']:,}\n"
+            f"Size: {stats['size']:,}/{stats['maxsize']:,}```"
+        )
+        await ctx.send(embed=embed)
+
+    @db.command()
+    async def migrate(self, ctx):
+        """Re-encodes legacy text values of the numeric prefixed dbs as binary.
+
+        Counter flushes are paused until it is done so they aren't
+        overwritten by the migrated values.
+        """
+
+        def decode_uses(value):
+            if not value.isdigit():
+                raise ValueError("Not an invite use count")
+            return int(value)
+
+        migrations = (
+            ("bal", codec.decode_decimal, codec.encode_decimal),
+            ("karma", codec.decode_int, codec.encode_int),
+            ("message_count", codec.decode_int, codec.encode_int),
+            ("invites", decode_uses, codec.encode_int),
+            ("trivia_wins", codec.decode_pair, lambda pair: codec.encode_pair(*pair)),
+        )
+
+        self.DB.counters.flush()
+        self.DB.counters.paused = True
+
+        msg = ""
+        try:
+            for name, decode, encode in migrations:
+                count = await self.DB.run(
+                    codec.migrate, getattr(self.DB, name), decode, encode
+                )
+                msg += f"{name:<15}{count:,}\n"
+        finally:
+            self.DB.counters.paused = False
+
+        embed = discord.Embed(color=discord.Color.blurple())
+        embed.description = f"```prolog\nMigrated Values:\n\n{msg}```"
+        await ctx.send(embed=embed)
+
     @commands.command(aliases=["removeinf"])
     @commands.guild_only()
     async def remove_infraction(
@@ -343,12 +409,14 @@ class owner(commands.Cog):
         user_id = str(user.id).encode()
         if self.DB.blacklist.get(user_id):
             self.DB.blacklist.delete(user_id)
+            self.DB.policies.invalidate()
 
             embed.title = "User Unblacklisted"
             embed.description = f"***{user}*** has been unblacklisted"
             return await ctx.send(embed=embed)
 
         self.DB.blacklist.put(user_id, b"2")
+        self.DB.policies.invalidate()
         embed.title = "User Blacklisted"
         embed.description = f"**{user}** has been added to the blacklist"
 
@@ -365,12 +433,14 @@ class owner(commands.Cog):
         user_id = str(user.id).encode()
         if self.DB.blacklist.get(user_id):
             self.DB.blacklist.delete(user_id)
+            self.DB.policies.invalidate()
 
             embed.title = "User Undownvoted"
             embed.description = f"***{user}*** has been undownvoted"
             return await ctx.send(embed=embed)
 
         self.DB.blacklist.put(user_id, b"1")
+        self.DB.policies.invalidate()
         embed.title = "User Downvoted"
         embed.description = f"**{user}** has been added to the downvote list"
 
@@ -378,21 +448,66 @@ class owner(commands.Cog):
 
     @commands.command()
     async def backup(self, ctx, number: int = None):
-        """Sends the bot database backup as a json file.
+        """Sends a backup of the bot database.
+
+        number: int
+            Which backup to get, defaults to the newest.
+        """
+        backups = self.DB.backups.backups()
+
+        if number is None and backups:
+            number = max(backups)
+
+        if number not in backups:
+            return await ctx.send(
+                embed=discord.Embed(
+                    color=discord.Color.blurple(),
+                    description=f"```Backup {number} not found```",
+                )
+            )
+
+        with open(backups[number], "rb") as file:
+            await ctx.send(file=discord.File(file, backups[number].name))
+
+    @commands.command()
+    async def restore(self, ctx, number: int = None):
+        """Restores the bot database from a backup.
+
+        Commands, scheduled jobs, backups and counter flushes are paused
+        until it is done. Listeners still run so their writes during a
+        restore may be overwritten.
 
         number: int
-            Which backup to get.
+            Which backup to restore, defaults to the newest.
         """
-        if not number:
-            number = int(self.DB.main.get(b"backup_number").decode())
+        embed = discord.Embed(color=discord.Color.blurple())
 
-            with open(f"backup/{number}backup.json", "rb") as file:
-                return await ctx.send(file=discord.File(file, "backup.json"))
+        if number is None:
+            number = max(self.DB.backups.backups(), default=None)
 
-        number = min(10, max(number, 0))
+        await self.bot.scheduler.stop()
+        self.DB.counters.flush()
+        self.DB.counters.paused = True
+        self.DB.restoring = True
 
-        with open(f"backup/{number}backup.json", "rb") as file:
-            await ctx.send(file=discord.File(file, "backup.json"))
+        try:
+            count = await self.DB.run(self.DB.backups.restore, number)
+        except ValueError as e:
+            embed.description = f"```{e}```"
+            return await ctx.send(embed=embed)
+        finally:
+            await self.DB.run(self.DB.rebuild_bal_index)
+            self.DB.cache.clear()
+            self.DB.history_counts.clear()
+            self.DB.networth.reset()
+            self.DB.policies.clear()
+
+            self.DB.restoring = False
+            self.DB.counters.paused = False
+            self.bot.scheduler.start()
+
+        embed.description = f"```Restored {count:,} keys from backup {number}```"
+        await ctx.send(embed=embed)
 
     @commands.command(name="boot")
     async def boot_times(self, ctx):
@@ -429,8 +544,9 @@ class owner(commands.Cog):
 
     @cache.command()
     async def wipe(self, ctx):
-        """Wipes cache from the db."""
+        """Wipes the response cache."""
         self.bot.cache.clear()
+        self.bot.responses.clear()
 
         await ctx.send(
             embed=discord.Embed(
@@ -440,17 +556,285 @@ class owner(commands.Cog):
 
     @cache.command(name="list")
     async def _list(self, ctx):
-        """Lists the cached items in the db."""
+        """Lists the cached searches and the cache's counters."""
         embed = discord.Embed(color=discord.Color.blurple())
         cache = self.bot.cache
+        stats = cache.stats()
+
+        embed.add_field(
+            name="Stats",
+            value=(
+                "```prolog\n"
+                f"Hits: {stats['hits']:,}\n"
+                f"Misses: {stats['misses']:,}\n"
+                f"Hit Rate: {stats['hit_rate']:.2%}\n"
+                f"Evictions: {stats['evictions']:,}\n"
+                f"Expirations: {stats['expirations']:,}\n"
+                f"Size: {stats['size'] / 1024:,.1f}/{stats['max_bytes'] / 1024:,.0f}KB```"
+            ),
+            inline=False,
+        )
+        embed.add_field(
+            name="Requests",
+            value=(
+                "```prolog\n"
+                f"In Flight: {len(self.bot.requests):,}\n"
+                f"Shared: {self.bot.requests.shared:,}\n"
+                f"Cached Responses: {len(self.bot.responses):,}```"
+            ),
+            inline=False,
+        )
 
         if not cache:
             embed.description = "```Nothing has been cached```"
             return await ctx.send(embed=embed)
 
-        embed.description = "```\n{}```".format("\n".join(cache))
+        embed.description = "```\n{}```".format("\n".join(cache)[:4000])
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def http(self, ctx):
+        """Shows the http pool, open circuits and unreleased responses."""
+        embed = discord.Embed(color=discord.Color.blurple())
+        connector = self.bot.client_session.connector
+        responses = [response for response in LEAKS.open if not response.closed]
+
+        embed.add_field(
+            name="Pool",
+            value=(
+                "```prolog\n"
+                f"Limit: {connector.limit}\n"
+                f"Limit Per Host: {connector.limit_per_host}\n"
+                f"Open Responses: {len(responses):,}\n"
+                f"Leaked: {LEAKS.leaked:,}```"
+            ),
+            inline=False,
+        )
+
+        if breakers := [
+            breaker for breaker in BREAKERS if breaker.state != breaker.CLOSED
+        ]:
+            embed.add_field(
+                name="Open Circuits",
+                value="```prolog\n{}```".format(
+                    "\n".join(
+                        f"{breaker.host}: {breaker.state} ({breaker.open_for:.0f}s)"
+                        for breaker in breakers
+                    )[:1000]
+                ),
+                inline=False,
+            )
+
+        if stale := LEAKS.stale():
+            embed.add_field(
+                name=f"Open Longer Than {LEAKS.threshold}s",
+                value="```prolog\n{}```".format(
+                    "\n".join(
+                        f"{origin} {age:.0f}s\n  {url}" for origin, url, age in stale
+                    )[:1000]
+                ),
+                inline=False,
+            )
+
+        if LEAKS.leaks:
+            embed.add_field(
+                name="Recent Leaks",
+                value="```prolog\n{}```".format(
+                    "\n".join(
+                        f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {origin}\n  {url}"
+                        for timestamp, origin, url, _ in reversed(LEAKS.leaks)
+                    )[:1000]
+                ),
+                inline=False,
+            )
+
+        await ctx.send(embed=embed)
+
+    @commands.group(invoke_without_command=True)
+    async def metrics(self, ctx, *, command=None):
+        """Shows the latency and error counts of commands.
+
+        command: str
+            A command to show the time it spends in the db, http and discord.
+        """
+        embed = discord.Embed(color=discord.Color.blurple())
+        stats = self.bot.metrics.commands
+
+        if command:
+            if command not in stats:
+                embed.description = f"```No metrics for {command}```"
+                return await ctx.send(embed=embed)
+
+            stat = stats[command]
+            histogram = stat.histogram
+            embed.title = command
+            embed.description = (
+                "```prolog\n"
+                f"Invocations: {stat.count:,}\n"
+                f"Errors: {stat.errors:,}\n"
+                f"p50: {histogram.percentile(0.5) * 1000:,.2f}ms\n"
+                f"p95: {histogram.percentile(0.95) * 1000:,.2f}ms\n"
+                f"p99: {histogram.percentile(0.99) * 1000:,.2f}ms\n"
+                f"Max: {histogram.max * 1000:,.2f}ms\n\n"
+                + "".join(
+                    f"{component.title()}: {spent / stat.count * 1000:,.2f}ms avg\n"
+                    for component, spent in stat.components.items()
+                )
+                + "```"
+            )
+            return await ctx.send(embed=embed)
+
+        if not stats:
+            embed.description = "```No commands have been run```"
+            return await ctx.send(embed=embed)
+
+        top = sorted(stats.items(), key=lambda item: -item[1].count)[:20]
+        width = max(len(name) for name, _ in top)
+
+        embed.description = (
+            "```\n{:<{width}} {:>6} {:>4} {:>8} {:>8} {:>8}\n{}```".format(
+                "Command",
+                "Count",
+                "Err",
+                "p50",
+                "p95",
+                "p99",
+                "\n".join(
+                    f"{name:<{width}} {stat.count:>6} {stat.errors:>4} "
+                    + " ".join(
+                        f"{stat.histogram.percentile(quantile) * 1000:>6.1f}ms"
+                        for quantile in (0.5, 0.95, 0.99)
+                    )
+                    for name, stat in top
+                ),
+                width=width,
+            )
+        )
+        embed.set_footer(text="Since")
+        embed.timestamp = datetime.fromtimestamp(self.bot.metrics.started)
+        await ctx.send(embed=embed)
+
+    @metrics.command(name="dump")
+    async def metrics_dump(self, ctx, path="metrics.prom"):
+        """Writes the metrics to a file in the Prometheus text format.
+
+        path: str
+        """
+        self.bot.metrics.dump(path)
+
+        await ctx.send(
+            embed=discord.Embed(
+                color=discord.Color.blurple(),
+                description=f"```Wrote metrics to {path}```",
+            )
+        )
+
+    @metrics.command(name="reset")
+    async def metrics_reset(self, ctx):
+        """Resets every command's metrics."""
+        self.bot.metrics.reset()
+
+        await ctx.send(
+            embed=discord.Embed(
+                color=discord.Color.blurple(),
+                description="```prolog\nReset Metrics```",
+            )
+        )
+
+    @commands.group(invoke_without_command=True)
+    async def watchdog(self, ctx):
+        """Shows the event loop lag and the most recent stalls."""
+        watchdog = self.bot.watchdog
+        embed = discord.Embed(color=discord.Color.blurple())
+
+        embed.add_field(
+            name="Loop",
+            value=(
+                "```prolog\n"
+                f"Running: {watchdog.running}\n"
+                f"Threshold: {watchdog.threshold * 1000:,.0f}ms\n"
+                f"Lag: {watchdog.lag * 1000:,.2f}ms\n"
+                f"Max Lag: {watchdog.max_lag * 1000:,.2f}ms\n"
+                f"Stalls: {len(watchdog.stalls)}```"
+            ),
+            inline=False,
+        )
+
+        if watchdog.stalls:
+            embed.add_field(
+                name="Recent Stalls",
+                value="```prolog\n{}```".format(
+                    "\n".join(
+                        f"{stall.id}. {stall.cog} {stall.source} "
+                        + (
+                            f"{stall.duration * 1000:,.0f}ms"
+                            if stall.duration is not None
+                            else "ongoing"
+                        )
+                        for stall in reversed(list(watchdog.stalls))
+                    )[:1000]
+                ),
+                inline=False,
+            )
+            embed.set_footer(text=f"{ctx.prefix}watchdog stack <number> for a stack")
+
         await ctx.send(embed=embed)
 
+    @watchdog.command(name="start")
+    async def watchdog_start(self, ctx, threshold: float = None):
+        """Starts the stall detector.
+
+        threshold: float
+            How many seconds the loop has to be blocked for to count as a stall.
+        """
+        if threshold:
+            self.bot.watchdog.threshold = threshold
+
+        self.bot.watchdog.start()
+
+        await ctx.send(
+            embed=discord.Embed(
+                color=discord.Color.blurple(),
+                description="```prolog\nStarted Watchdog```",
+            )
+        )
+
+    @watchdog.command(name="stop")
+    async def watchdog_stop(self, ctx):
+        """Stops the stall detector."""
+        self.bot.watchdog.stop()
+
+        await ctx.send(
+            embed=discord.Embed(
+                color=discord.Color.blurple(),
+                description="```prolog\nStopped Watchdog```",
+            )
+        )
+
+    @watchdog.command(name="stack")
+    async def watchdog_stack(self, ctx, number: int = None):
+        """Shows the stack captured during a stall.
+
+        number: int
+            The number of the stall, defaults to the latest.
+        """
+        watchdog = self.bot.watchdog
+
+        if number is None:
+            stall = watchdog.stalls[-1] if watchdog.stalls else None
+        else:
+            stall = watchdog.get(number)
+
+        if stall is None:
+            return await ctx.send(
+                embed=discord.Embed(
+                    color=discord.Color.blurple(), description="```No stall found```"
+                )
+            )
+
+        stack = "".join(stall.stack).replace("`", "`\u200b")
+        await ctx.send(f"**{stall.cog} {stall.source}**```py\n{stack[-1900:]}```")
+
     @commands.command()
     async def disable(self, ctx, *, command):
         """Disables the use of a command for every guild.
@@ -2,7 +2,6 @@ import textwrap
 from decimal import Decimal
 
 import discord
-import orjson
 from discord.ext import commands, pages
 
 
@@ -243,9 +242,10 @@ class stocks(commands.Cog):
             "Name:    Amount:      Price:             Percent Gain:\n"
         )
 
+        prices = self.DB.get_prices("stocks")
+
         for stock in stockbal:
-            data = self.DB.get_stock(stock)
-            price = float(data["price"])
+            price = prices.price(stock)
 
             trades = [
                 trade[1] / trade[0]
@@ -270,13 +270,15 @@ class stocks(commands.Cog):
         """Shows the prices of stocks from the nasdaq api."""
         messages = []
         stocks = ""
-        for i, (stock, price) in enumerate(self.DB.stocks, start=1):
-            price = orjson.loads(price)["price"]
+        prices = self.DB.get_prices("stocks")
 
+        for i, (stock, price) in enumerate(
+            zip(prices.symbols.tolist(), prices.prices.tolist()), start=1
+        ):
             if not i % 3:
-                stocks += f"{stock.decode():}: ${float(price):.2f}\n"
+                stocks += f"{stock}: ${price:.2f}\n"
             else:
-                stocks += f"{stock.decode():}: ${float(price):.2f}\t".expandtabs()
+                stocks += f"{stock}: ${price:.2f}\t".expandtabs()
 
             if not i % 99:
                 messages.append(discord.Embed(description=f"```prolog\n{stocks}```"))
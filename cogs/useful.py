@@ -12,6 +12,10 @@ import lxml.html
 import orjson
 from discord.ext import commands
 
+from cogs.utils.cache import MISSING
+from cogs.utils.http import TIMEOUTS
+from cogs.utils.time import parse_time
+
 STATUS_CODES = {
     "1": {
         "title": "1xx informational response",
@@ -207,8 +211,8 @@ class useful(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.DB = bot.DB
-        self.loop = bot.loop
         self.cache = {}
+        bot.scheduler.register("reminder", self.send_reminder)
 
     @commands.command()
     async def currency(self, ctx, *message):
@@ -341,7 +345,9 @@ class useful(commands.Cog):
 
         url = f"https://api.pikwy.com/?tkn=125&d=3000&u={website}&fs=0&w=1920&h=1080&f=png&rt=jweb"
 
-        async with ctx.typing(), self.bot.client_session.post(url, timeout=40) as resp:
+        async with ctx.typing(), self.bot.client_session.post(
+            url, timeout=TIMEOUTS["long"]
+        ) as resp:
             data = await resp.json()
 
         await ctx.send(data["iurl"], view=DeleteButton(ctx.author))
@@ -555,19 +561,24 @@ class useful(commands.Cog):
             )
         )
 
-        response = await self.bot.client_session.post(url, data=data, headers=headers)
-
-        async for line in response.content:
-            decoded_line = line.decode("utf-8")
-
-            if "MkEWBc" in decoded_line:
-                response = orjson.loads(orjson.loads(decoded_line)[0][2])[1][0][0][5]
+        async with self.bot.client_session.post(
+            url, data=data, headers=headers
+        ) as response:
+            async for line in response.content:
+                decoded_line = line.decode("utf-8")
+
+                if "MkEWBc" in decoded_line:
+                    result = orjson.loads(orjson.loads(decoded_line)[0][2])
+                    sentences = result[1][0][0][5]
+                    break
+            else:
+                return await ctx.reply("Failed to translate that text")
 
-                translate_text = ""
-                for sentence in response:
-                    translate_text += sentence[0].strip() + " "
+        translate_text = ""
+        for sentence in sentences:
+            translate_text += sentence[0].strip() + " "
 
-                return await ctx.reply(translate_text)
+        await ctx.reply(translate_text)
 
     @commands.command()
     async def weather(self, ctx, *, location="auckland"):
@@ -716,23 +727,98 @@ class useful(commands.Cog):
 
         await ctx.send(embed=embed)
 
-    async def cache_check(self, search):
-        """Checks the cache for an search if found randomly return a result.
+    async def send_reminder(self, data: dict):
+        """Sends a reminder when its scheduled job runs.
 
-        search: str
+        data: dict
         """
-        cache = self.bot.cache
+        key = f"{data['member']}-{data['id']}".encode()
+        reminder = self.DB.reminders.get(key)
+
+        if not reminder:
+            return
+
+        self.DB.reminders.delete(key)
+        reminder = orjson.loads(reminder)
+
+        channel = self.bot.get_channel(data["channel"]) or self.bot.get_user(
+            data["member"]
+        )
+
+        if not channel:
+            return
+
+        embed = discord.Embed(color=discord.Color.blurple(), title="Reminder")
+        embed.description = f"```{reminder['reminder']}```"
+        await channel.send(f"<@{data['member']}>", embed=embed)
 
-        if search in cache:
-            if not cache[search]:
-                return {}
+    @commands.group(invoke_without_command=True)
+    async def remind(self, ctx, duration: str, *, reminder: str):
+        """Reminds you of something after a duration.
+
+        duration: str
+            How long until the reminder e.g 5d10h25m5s
+        reminder: str
+        """
+        embed = discord.Embed(color=discord.Color.blurple())
+        end = parse_time(duration)
 
-            url, title = random.choice(list(cache[search].items()))
+        if not end or end <= discord.utils.utcnow():
+            embed.description = "```Invalid duration. Example: '3d5h10m'```"
+            return await ctx.send(embed=embed)
 
-            cache[search].pop(url)
+        reminder_id = secrets.token_hex(4)
+        self.DB.reminders.put(
+            f"{ctx.author.id}-{reminder_id}".encode(),
+            orjson.dumps({"reminder": reminder, "when": int(end.timestamp())}),
+        )
+        self.bot.scheduler.schedule(
+            "reminder",
+            end.timestamp(),
+            {"member": ctx.author.id, "channel": ctx.channel.id, "id": reminder_id},
+        )
 
-            return url, title
-        return cache
+        embed.description = (
+            f"```I'll remind you about {reminder}```<t:{end.timestamp():.0f}:R>"
+        )
+        embed.set_footer(text=f"Reminder ID: {reminder_id}")
+        await ctx.send(embed=embed)
+
+    @remind.command(name="list")
+    async def remind_list(self, ctx):
+        """Lists your pending reminders."""
+        embed = discord.Embed(color=discord.Color.blurple())
+
+        for key, reminder in self.DB.reminders.iterator(
+            prefix=f"{ctx.author.id}-".encode()
+        ):
+            reminder = orjson.loads(reminder)
+            embed.add_field(
+                name=key.decode().split("-")[1],
+                value=f"{reminder['reminder']}\n<t:{reminder['when']}:R>",
+            )
+
+        if not embed.fields:
+            embed.description = "```You have no reminders```"
+
+        await ctx.send(embed=embed)
+
+    @remind.command(name="cancel")
+    async def remind_cancel(self, ctx, reminder_id: str):
+        """Cancels one of your reminders.
+
+        reminder_id: str
+        """
+        key = f"{ctx.author.id}-{reminder_id}".encode()
+        embed = discord.Embed(color=discord.Color.blurple())
+
+        if not self.DB.reminders.get(key):
+            embed.description = "```Reminder not found```"
+            return await ctx.send(embed=embed)
+
+        self.DB.reminders.delete(key)
+        embed.description = f"```Cancelled reminder {reminder_id}```"
+        await ctx.send(embed=embed)
 
     @commands.command()
     async def google(self, ctx, *, search):
@@ -744,10 +830,10 @@ class useful(commands.Cog):
         embed = discord.Embed(color=discord.Color.blurple())
 
         cache_search = f"google-{search.lower()}"
-        cache = await self.cache_check(cache_search)
+        cached = self.bot.cache.pop_random(cache_search)
 
-        if isinstance(cache, tuple):
-            url, title = cache
+        if cached is not MISSING:
+            url, title = cached
             embed.set_image(url=url)
             embed.title = title
 
@@ -781,8 +867,7 @@ class useful(commands.Cog):
 
             await ctx.send(embed=embed, view=DeleteButton(ctx.author))
 
-            cache[cache_search] = images
-            self.loop.call_later(300, self.bot.remove_from_cache, cache_search)
+            self.bot.cache.put(cache_search, list(images.items()))
 
     @commands.command(aliases=["img"])
     async def image(self, ctx, *, search):
@@ -794,10 +879,10 @@ class useful(commands.Cog):
         embed = discord.Embed(color=discord.Color.blurple())
 
         cache_search = f"image-{search}"
-        cache = await self.cache_check(cache_search)
+        cached = self.bot.cache.pop_random(cache_search)
 
-        if isinstance(cache, tuple):
-            url, title = cache
+        if cached is not MISSING:
+            url, title = cached
             embed.set_image(url=url)
             embed.title = title
 
@@ -830,8 +915,7 @@ class useful(commands.Cog):
 
             await ctx.send(embed=embed, view=DeleteButton(ctx.author))
 
-            cache[cache_search] = images
-            self.loop.call_later(300, self.bot.remove_from_cache, cache_search)
+            self.bot.cache.put(cache_search, list(images.items()))
 
 
 def setup(bot: commands.Bot) -> None:
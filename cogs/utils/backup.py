@@ -0,0 +1,344 @@
+"""Incremental snapshot backups of the db.
+
+A backup file is gzip compressed and starts with a header saying
+whether it is full or incremental, followed by length prefixed records
+of either a put of a key and value or a delete of a key.
+
+A manifest of every backed up key and a digest of its value is kept
+next to the newest backup so an incremental backup only writes the keys
+that changed since the last backup. Both the snapshot and the manifest
+are sorted by key so they are compared in one pass without loading
+either. Backups are written in key order too, so a restore merges a
+chain with the db in one pass the same way.
+"""
+
+import contextlib
+import gzip
+import hashlib
+import heapq
+import os
+import pathlib
+import re
+import struct
+
+MAGIC = b"SNAKEBAK1"
+FULL = b"F"
+INCREMENTAL = b"I"
+
+PUT = 0
+DELETE = 1
+
+RECORD_STRUCT = struct.Struct("<BII")
+
+EXCLUDED = (
+    b"crypto",
+    b"stocks",
+    b"boot_times",
+    b"tiolanguages",
+    b"helloworlds",
+    b"docs",
+    b"balindex",
+)
+
+FILENAME = re.compile(r"(\d+)\.(full|incr)\.gz")
+
+
+def is_excluded(key: bytes) -> bool:
+    return key.split(b"-")[0] in EXCLUDED
+
+
+def digest(value: bytes) -> bytes:
+    return hashlib.blake2b(value, digest_size=8).digest()
+
+
+class RecordWriter:
+    """Buffers records so the compressor is fed large writes."""
+
+    def __init__(self, file, buffer_size: int = 1 << 16):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+
+    def write(self, op: int, key: bytes, value: bytes = b""):
+        self.buffer += RECORD_STRUCT.pack(op, len(key), len(value))
+        self.buffer += key
+        self.buffer += value
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+
+def read_records(file):
+    """Yields the op, key and value of every record in a file.
+
+    file: BinaryIO
+    """
+    while header := file.read(RECORD_STRUCT.size):
+        if len(header) < RECORD_STRUCT.size:
+            raise ValueError("Backup is truncated")
+
+        op, key_length, value_length = RECORD_STRUCT.unpack(header)
+        key = file.read(key_length)
+        value = file.read(value_length)
+
+        if len(key) != key_length or len(value) != value_length:
+            raise ValueError("Backup is truncated")
+
+        yield op, key, value
+
+
+def aged_records(file, age: int):
+    """Yields the key, age, op and value of every record in a file so
+    records from several files merge by key then age.
+
+    file: BinaryIO
+    age: int
+    """
+    for op, key, value in read_records(file):
+        yield key, age, op, value
+
+
+class Backups:
+    """Creates, prunes and restores backups of a Database.
+
+    Every full_every backups a full backup is made, the ones in between
+    only hold changes. The newest keep chains of a full backup and its
+    incremental backups are kept.
+    """
+
+    def __init__(self, db, path: str = "backup", full_every: int = 4, keep: int = 3):
+        self.db = db
+        self.path = pathlib.Path(path)
+        self.full_every = full_every
+        self.keep = keep
+
+    def backups(self) -> dict[int, pathlib.Path]:
+        """Returns the path of every backup by its number."""
+        if not self.path.is_dir():
+            return {}
+
+        return dict(
+            sorted(
+                (int(match[1]), file)
+                for file in self.path.iterdir()
+                if (match := FILENAME.fullmatch(file.name))
+            )
+        )
+
+    def is_full(self, path: pathlib.Path) -> bool:
+        return path.name.endswith(".full.gz")
+
+    def manifest(self, number: int) -> pathlib.Path:
+        return self.path / f"{number}.manifest.gz"
+
+    def read_manifest(self, number: int):
+        """Yields the keys and value digests of a backup.
+
+        number: int
+        """
+        with gzip.open(self.manifest(number), "rb") as file:
+            for _, key, value in read_records(file):
+                yield key, value
+
+    def create(self) -> pathlib.Path:
+        """Backs up a snapshot of the db returning the path of the backup.
+
+        This blocks for the length of the backup so it should be
+        run in the db thread pool.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        backups = self.backups()
+        number = max(backups, default=-1) + 1
+
+        full = (
+            not number % self.full_every
+            or number - 1 not in backups
+            or not self.manifest(number - 1).exists()
+        )
+        path = self.path / f"{number}.{'full' if full else 'incr'}.gz"
+        temp = path.with_suffix(".tmp")
+        manifest_temp = self.manifest(number).with_suffix(".tmp")
+
+        previous = iter(()) if full else self.read_manifest(number - 1)
+        old = next(previous, None)
+
+        snapshot = self.db.main.db.snapshot()
+
+        try:
+            with gzip.open(temp, "wb", compresslevel=6) as backup_file, gzip.open(
+                manifest_temp, "wb", compresslevel=1
+            ) as manifest_file:
+                backup_file.write(MAGIC + (FULL if full else INCREMENTAL))
+                backup = RecordWriter(backup_file)
+                manifest = RecordWriter(manifest_file)
+
+                for key, value in snapshot.iterator():
+                    if is_excluded(key):
+                        continue
+
+                    value_digest = digest(value)
+                    manifest.write(PUT, key, value_digest)
+
+                    while old and old[0] < key:
+                        backup.write(DELETE, old[0])
+                        old = next(previous, None)
+
+                    if old and old[0] == key:
+                        if old[1] != value_digest:
+                            backup.write(PUT, key, value)
+                        old = next(previous, None)
+                    else:
+                        backup.write(PUT, key, value)
+
+                while old:
+                    backup.write(DELETE, old[0])
+                    old = next(previous, None)
+
+                backup.flush()
+                manifest.flush()
+        finally:
+            snapshot.close()
+
+        os.replace(manifest_temp, self.manifest(number))
+        os.replace(temp, path)
+
+        for manifest in self.path.glob("*.manifest.gz"):
+            if manifest.name != self.manifest(number).name:
+                manifest.unlink()
+
+        self.prune()
+        return path
+
+    def prune(self):
+        """Deletes every chain older than the newest keep chains."""
+        backups = self.backups()
+        fulls = [number for number, path in backups.items() if self.is_full(path)]
+
+        if len(fulls) <= self.keep:
+            return
+
+        oldest = fulls[-self.keep]
+
+        for number, path in backups.items():
+            if number < oldest:
+                path.unlink()
+
+    def chain(self, number: int) -> list[pathlib.Path]:
+        """Returns the full backup and incremental backups needed to restore.
+
+        number: int
+        """
+        backups = self.backups()
+
+        if number not in backups:
+            raise ValueError(f"Backup {number} not found")
+
+        chain = []
+
+        while number in backups:
+            chain.append(backups[number])
+            if self.is_full(backups[number]):
+                return chain[::-1]
+            number -= 1
+
+        raise ValueError(f"Backup {number + 1} has no full backup before it")
+
+    def latest(self, chain: list[pathlib.Path]):
+        """Yields every key in a chain in order with its newest value, or
+        None if it was deleted.
+
+        chain: list[pathlib.Path]
+        """
+        with contextlib.ExitStack() as stack:
+            streams = []
+
+            # Records of newer backups sort first for the same key
+            for age, path in enumerate(reversed(chain)):
+                file = stack.enter_context(gzip.open(path, "rb"))
+                header = file.read(len(MAGIC) + 1)
+
+                if header[:-1] != MAGIC:
+                    raise ValueError(f"{path.name} is not a backup")
+
+                streams.append(aged_records(file, age))
+
+            last = None
+
+            for key, _, op, value in heapq.merge(*streams):
+                if key == last:
+                    continue
+                last = key
+                yield key, value if op == PUT else None
+
+    def restore(self, number: int, batch_size: int = 10_000) -> int:
+        """Replaces every backed up key in the db with a backup returning the
+        number of keys restored.
+
+        The chain is merged with a snapshot of the db, writing batch_size
+        changes at a time, so a restore never holds more than a batch.
+        Writes made to the db while it runs can be overwritten and a
+        restore that fails part way leaves some keys restored, running
+        it again finishes it.
+
+        This blocks for the length of the restore so it should be
+        run in the db thread pool.
+
+        number: int
+        batch_size: int
+        """
+        chain = self.chain(number)
+        main = self.db.main.db
+        snapshot = main.snapshot()
+        batch = main.write_batch()
+        changes = count = 0
+
+        def changed():
+            nonlocal changes
+            changes += 1
+
+            if changes >= batch_size:
+                batch.write()
+                batch.clear()
+                changes = 0
+
+        try:
+            existing = (
+                key
+                for key in snapshot.iterator(include_value=False)
+                if not is_excluded(key)
+            )
+            current = next(existing, None)
+
+            for key, value in self.latest(chain):
+                # Keys in the db but not the backup are deleted
+                while current is not None and current < key:
+                    batch.delete(current)
+                    changed()
+                    current = next(existing, None)
+
+                if current == key:
+                    current = next(existing, None)
+
+                    if value is None:
+                        batch.delete(key)
+                        changed()
+
+                if value is not None:
+                    batch.put(key, value)
+                    changed()
+                    count += 1
+
+            while current is not None:
+                batch.delete(current)
+                changed()
+                current = next(existing, None)
+
+            batch.write()
+        finally:
+            snapshot.close()
+
+        return count
@@ -0,0 +1,180 @@
+"""A response cache for api results that are handed out one at a time.
+
+Each entry is a list of results such as reddit posts or image urls for
+one search. Entries expire after the ttl of their namespace, the least
+recently used entries are evicted when the cache goes over its byte
+budget and a random result is popped in O(1) by swapping it with the
+last result.
+"""
+
+import random
+import time
+from collections import OrderedDict
+
+import orjson
+
+MISSING = object()
+
+TTLS = {
+    "reddit": 300,
+    "urban": 3600,
+    "google": 1800,
+    "image": 1800,
+}
+
+
+class Entry:
+    __slots__ = ("items", "expires", "item_size")
+
+    def __init__(self, items: list, expires: float, item_size: int):
+        self.items = items
+        self.expires = expires
+        self.item_size = item_size
+
+    @property
+    def size(self) -> int:
+        return self.item_size * len(self.items)
+
+
+class ResponseCache:
+    """A byte bounded LRU cache of result lists with per namespace ttls.
+
+    Keys are namespace-search, e.g reddit-memes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttls: dict[str, float] = None,
+        default_ttl: float = 300,
+    ):
+        self.max_bytes = max_bytes
+        self.ttls = TTLS | (ttls or {})
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.last_purge = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, key: str):
+        return self.get_entry(key) is not None
+
+    def ttl(self, key: str) -> float:
+        return self.ttls.get(key.split("-", 1)[0], self.default_ttl)
+
+    def get_entry(self, key: str) -> Entry | None:
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return None
+
+        if entry.expires <= time.monotonic():
+            self.remove(key)
+            self.expirations += 1
+            return None
+
+        return entry
+
+    def put(self, key: str, items: list):
+        """Caches a list of results replacing any already cached.
+
+        key: str
+        items: list
+        """
+        self.remove(key)
+
+        if not items:
+            return
+
+        item_size = len(orjson.dumps(items)) // len(items) + 1
+        entry = Entry(list(items), time.monotonic() + self.ttl(key), item_size)
+
+        if entry.size > self.max_bytes:
+            return
+
+        self.entries[key] = entry
+        self.size += entry.size
+
+        if time.monotonic() - self.last_purge >= 60:
+            self.purge()
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def take(self, key: str, index: int):
+        entry = self.get_entry(key)
+
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+
+        items = entry.items
+        items[index], items[-1] = items[-1], items[index]
+        item = items.pop()
+        self.size -= entry.item_size
+
+        if not items:
+            self.remove(key)
+
+        return item
+
+    def pop(self, key: str):
+        """Removes and returns the last result of a key or MISSING.
+
+        key: str
+        """
+        return self.take(key, -1)
+
+    def pop_random(self, key: str):
+        """Removes and returns a random result of a key or MISSING.
+
+        key: str
+        """
+        entry = self.entries.get(key)
+        return self.take(key, random.randrange(len(entry.items)) if entry else -1)
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+
+        if entry is not None:
+            self.size -= entry.size
+
+    def purge(self):
+        """Removes every expired entry."""
+        self.last_purge = now = time.monotonic()
+
+        for key in [key for key, entry in self.entries.items() if entry.expires <= now]:
+            self.remove(key)
+            self.expirations += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": len(self.entries),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
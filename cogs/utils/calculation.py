@@ -1,7 +1,10 @@
 import ast
+import functools
 import math
 from decimal import Decimal
 
+MAX_TRUTH_VARIABLES = 12
+
 
 def add(a, b):
     return a + b
@@ -192,35 +195,198 @@ def oct_float(number: float):
     return f"{octal[:-exponent]}.{octal[-exponent:]}"
 
 
+def compile_node(node):
+    """Validates an expression's ast returning a function that evaluates it.
+
+    The tree is walked once here, evaluating is just calling nested closures.
+
+    node: ast.AST
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        value = node.value if isinstance(node.value, int) else Decimal(str(node.value))
+        return lambda: value
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARYOPS:
+        op = UNARYOPS[type(node.op)]
+        operand = compile_node(node.operand)
+        return lambda: op(operand())
+
+    if isinstance(node, ast.BinOp) and type(node.op) in OPERATIONS:
+        op = OPERATIONS[type(node.op)]
+        left = compile_node(node.left)
+        right = compile_node(node.right)
+
+        if isinstance(node.op, ast.Pow):
+
+            def power():
+                base, exponent = left(), right()
+                if len(str(base)) * exponent > 1000:
+                    raise ValueError("Too large to calculate")
+                return op(base, exponent)
+
+            return power
+
+        return lambda: op(left(), right())
+
+    if isinstance(node, ast.BoolOp):
+        op = BOOLOPS[type(node.op)]
+        values = [compile_node(value) for value in node.values]
+        return lambda: op(*[value() for value in values])
+
+    if isinstance(node, ast.Compare):
+        if not all(isinstance(op, ast.Eq) for op in node.ops):
+            raise ValueError("Calculation failed")
+
+        left = compile_node(node.left)
+        comparators = [compile_node(comp) for comp in node.comparators]
+
+        def compare():
+            value = left()
+            return all(value == comp() for comp in comparators)
+
+        return compare
+
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        value = CONSTANTS[node.id]
+        return lambda: value
+
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in FUNCTIONS
+        and not node.keywords
+    ):
+        func = FUNCTIONS[node.func.id]
+        args = [compile_node(arg) for arg in node.args]
+        return lambda: func(*[arg() for arg in args])
+
+    raise ValueError("Calculation failed")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(expr: str):
+    """Parses and compiles an expression, repeated expressions are cached.
+
+    expr: str
+    """
+    return compile_node(ast.parse(expr, mode="eval").body)
+
+
 def safe_eval(node):
-    if isinstance(node, ast.Num):
-        return node.n if isinstance(node.n, int) else Decimal(str(node.n))
+    return compile_node(node)()
+
 
-    if isinstance(node, ast.UnaryOp):
-        return UNARYOPS[node.op.__class__](safe_eval(node.operand))
+BIT_OPERATIONS = {
+    ast.BitAnd: and_,
+    ast.BitOr: or_,
+    ast.BitXor: xor,
+    ast.MatMult: logical_implication,
+}
+
+
+def compile_bits(node, variables: dict):
+    """Compiles a proposition into a function evaluating every row at once.
+
+    Each variable is an int used as a bit array with a bit for every row
+    of the truth table so each operator is one bitwise operation.
 
-    if isinstance(node, ast.BinOp):
-        left = safe_eval(node.left)
-        right = safe_eval(node.right)
-        if isinstance(node.op, ast.Pow) and len(str(left)) * right > 1000:
-            raise ValueError("Too large to calculate")
-        return OPERATIONS[node.op.__class__](left, right)
+    node: ast.AST
+    variables: dict[str, int]
+        The index of each variable in the values passed to the function.
+    """
+    if isinstance(node, ast.Name) and node.id in variables:
+        index = variables[node.id]
+        return lambda values, mask: values[index]
+
+    if isinstance(node, ast.Constant) and node.value in (0, 1):
+        value = node.value
+        return lambda values, mask: mask if value else 0
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+        operand = compile_bits(node.operand, variables)
+        return lambda values, mask: ~operand(values, mask) & mask
 
     if isinstance(node, ast.BoolOp):
-        return BOOLOPS[node.op.__class__](*[safe_eval(value) for value in node.values])
+        operands = [compile_bits(value, variables) for value in node.values]
+
+        if isinstance(node.op, ast.And):
+            return lambda values, mask: functools.reduce(
+                and_, [operand(values, mask) for operand in operands]
+            )
+
+        return lambda values, mask: functools.reduce(
+            or_, [operand(values, mask) for operand in operands]
+        )
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BIT_OPERATIONS:
+        left = compile_bits(node.left, variables)
+        right = compile_bits(node.right, variables)
+
+        if isinstance(node.op, ast.MatMult):
+            return (
+                lambda values, mask: (~left(values, mask) | right(values, mask)) & mask
+            )
+
+        op = BIT_OPERATIONS[type(node.op)]
+        return lambda values, mask: op(left(values, mask), right(values, mask))
 
     if isinstance(node, ast.Compare):
-        left = safe_eval(node.left)
-        for op in node.ops:
-            if not isinstance(op, ast.Eq):
-                raise ValueError("Calculation failed")
-        return all(left == safe_eval(comp) for comp in node.comparators)
+        if not all(isinstance(op, ast.Eq) for op in node.ops):
+            raise ValueError("Calculation failed")
+
+        left = compile_bits(node.left, variables)
+        comparators = [compile_bits(comp, variables) for comp in node.comparators]
 
-    if isinstance(node, ast.Name):
-        return CONSTANTS[node.id]
+        def compare(values, mask):
+            value = left(values, mask)
+            result = mask
+            for comp in comparators:
+                result &= ~(value ^ comp(values, mask))
+            return result & mask
 
-    if isinstance(node, ast.Call):
-        return FUNCTIONS[node.func.id](*[safe_eval(arg) for arg in node.args])
+        return compare
 
-    print(type(node))
     raise ValueError("Calculation failed")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_truth(expr: str, letters: tuple):
+    """Parses and compiles a proposition, repeated ones are cached.
+
+    expr: str
+    letters: tuple[str]
+        The variables in the order of the columns.
+    """
+    variables = {letter: index for index, letter in enumerate(letters)}
+    return compile_bits(ast.parse(expr, mode="eval").body, variables)
+
+
+def column(index: int, count: int) -> int:
+    """Returns the bits of a variable's column in a truth table.
+
+    Rows count up in binary with the first variable as the highest bit
+    so a column is blocks of half zeros and half ones repeated.
+
+    index: int
+    count: int
+        The number of variables.
+    """
+    half = 1 << (count - 1 - index)
+    period = half * 2
+    block = ((1 << half) - 1) << half
+    # Multiplying by a number with a bit at the start of every period repeats it
+    return block * (((1 << (1 << count)) - 1) // ((1 << period) - 1))
+
+
+def truth_table(expr: str, letters: tuple) -> int:
+    """Evaluates a proposition for every row of its truth table at once
+    returning the results as bits, bit n being the result of row n.
+
+    expr: str
+    letters: tuple[str]
+    """
+    count = len(letters)
+    mask = (1 << (1 << count)) - 1
+    values = [column(index, count) for index in range(count)]
+
+    return compile_truth(expr, letters)(values, mask)
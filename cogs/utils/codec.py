@@ -0,0 +1,177 @@
+"""Compact binary encodings for the numeric values stored in the db.
+
+Every encoded value starts with a tag byte that says how the rest of
+the value is laid out. Legacy values are ASCII text so they never start
+with a tag byte and are decoded by parsing the text instead.
+"""
+
+import struct
+from decimal import Decimal
+
+INT = b"\x01"
+DECIMAL = b"\x02"
+PAIR = b"\x03"
+
+TAGS = (INT, DECIMAL, PAIR)
+
+INT_STRUCT = struct.Struct("<q")
+EXPONENT_STRUCT = struct.Struct("<h")
+PAIR_STRUCT = struct.Struct("<II")
+
+
+def is_legacy(value: bytes) -> bool:
+    """Returns whether a value is still stored as ASCII text.
+
+    value: bytes
+    """
+    return value[:1] not in TAGS
+
+
+def encode_int(number: int) -> bytes:
+    """Encodes an int as a tag and a fixed width little endian int64.
+
+    number: int
+    """
+    return INT + INT_STRUCT.pack(number)
+
+
+def decode_int(value: bytes) -> int:
+    """Decodes an int falling back to parsing legacy decimal strings.
+
+    value: bytes
+    """
+    if value[:1] == INT:
+        return INT_STRUCT.unpack_from(value, 1)[0]
+    return int(value)
+
+
+def encode_decimal(number: Decimal) -> bytes:
+    """Encodes a Decimal as a tag, an int16 exponent and a variable length
+    little endian coefficient.
+
+    number: Decimal
+    """
+    sign, digits, exponent = Decimal(number).as_tuple()
+
+    if not isinstance(exponent, int):
+        raise ValueError(f"Cannot encode {number}")
+
+    coefficient = int("".join(map(str, digits)))
+
+    while coefficient and not coefficient % 10:
+        coefficient //= 10
+        exponent += 1
+
+    if sign:
+        coefficient = -coefficient
+
+    return (
+        DECIMAL
+        + EXPONENT_STRUCT.pack(exponent)
+        + coefficient.to_bytes(
+            (coefficient.bit_length() + 8) // 8, "little", signed=True
+        )
+    )
+
+
+def decode_decimal(value: bytes) -> Decimal:
+    """Decodes a Decimal falling back to parsing legacy decimal strings.
+
+    value: bytes
+    """
+    if value[:1] == DECIMAL:
+        exponent = EXPONENT_STRUCT.unpack_from(value, 1)[0]
+        coefficient = int.from_bytes(value[3:], "little", signed=True)
+        return Decimal(f"{coefficient}E{exponent}")
+    return Decimal(value.decode())
+
+
+def encode_pair(first: int, second: int) -> bytes:
+    """Encodes a pair of unsigned ints such as trivia wins and losses.
+
+    first: int
+    second: int
+    """
+    return PAIR + PAIR_STRUCT.pack(first, second)
+
+
+def decode_pair(value: bytes) -> tuple[int, int]:
+    """Decodes a pair falling back to parsing legacy first:second strings.
+
+    value: bytes
+    """
+    if value[:1] == PAIR:
+        return PAIR_STRUCT.unpack_from(value, 1)
+    first, second = value.decode().split(":")
+    return int(first), int(second)
+
+
+def encode_sortable(number: Decimal) -> bytes:
+    """Encodes a Decimal truncated to cents so byte order matches numeric order.
+
+    The first byte holds the sign and the length of the big endian
+    magnitude, negative magnitudes are complemented so they sort in reverse.
+
+    number: Decimal
+    """
+    cents = int(Decimal(number) * 100)
+    magnitude = abs(cents).to_bytes((abs(cents).bit_length() + 7) // 8, "big")
+
+    if cents >= 0:
+        return bytes((0x80 + len(magnitude),)) + magnitude
+    return bytes((0x7F - len(magnitude),)) + bytes(255 - b for b in magnitude)
+
+
+def decode_sortable(value: bytes) -> tuple[Decimal, bytes]:
+    """Decodes a sortable Decimal returning it and the rest of the value.
+
+    value: bytes
+    """
+    header = value[0]
+
+    if header >= 0x80:
+        length = header - 0x80
+        cents = int.from_bytes(value[1 : length + 1], "big")
+    else:
+        length = 0x7F - header
+        cents = -int.from_bytes(bytes(255 - b for b in value[1 : length + 1]), "big")
+
+    return Decimal(cents) / 100, value[length + 1 :]
+
+
+def display(value: bytes) -> str:
+    """Returns a readable string of a value whether it is encoded or not.
+
+    value: bytes
+    """
+    tag = value[:1]
+
+    if tag == INT:
+        return str(decode_int(value))
+    if tag == DECIMAL:
+        return str(decode_decimal(value))
+    if tag == PAIR:
+        return "{}:{}".format(*decode_pair(value))
+    return value.decode()
+
+
+def migrate(db, decode, encode) -> int:
+    """Re-encodes every legacy value in a prefixed db returning the count.
+
+    db: CachedDB
+    decode: Callable[[bytes], Any]
+    encode: Callable[[Any], bytes]
+    """
+    count = 0
+
+    with db.write_batch() as wb:
+        for key, value in db:
+            if not is_legacy(value):
+                continue
+            try:
+                wb.put(key, encode(decode(value)))
+            except ValueError:
+                continue
+            count += 1
+
+    return count
@@ -1,9 +1,22 @@
+import asyncio
+import functools
 import pathlib
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 
 import orjson
 import plyvel
 
+from cogs.utils import codec
+from cogs.utils.backup import Backups
+from cogs.utils.metrics import add_time
+from cogs.utils.networth import NetWorth
+from cogs.utils.policy import Policies
+from cogs.utils.prices import PriceTable, crypto_row, stock_row
+
 prefixed_dbs = (
     "infractions",
     "karma",
@@ -23,43 +36,532 @@ prefixed_dbs = (
     "cookies",
     "reminders",
     "trivia_wins",
+    "balindex",
+    "polls",
+    "schedule",
 )
 
 
+MISSING = object()
+
+HISTORY_LIMIT = 250
+HISTORY_COUNTS = 10_000
+
+
+class LRUCache:
+    """A size bounded least recently used cache that counts hits and misses."""
+
+    def __init__(self, maxsize: int = 4096, max_value_size: int = 4096):
+        self.maxsize = maxsize
+        self.max_value_size = max_value_size
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key: bytes):
+        """Returns the cached value of a key or MISSING.
+
+        key: bytes
+        """
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return MISSING
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: bytes, value: bytes | None):
+        """Caches a value, None is cached so missing keys are also remembered.
+
+        key: bytes
+        value: bytes | None
+        """
+        if value is not None and len(value) > self.max_value_size:
+            return self.invalidate(key)
+
+        self.data[key] = value
+        self.data.move_to_end(key)
+
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: bytes):
+        """Removes a key from the cache.
+
+        key: bytes
+        """
+        self.data.pop(key, None)
+        self.generation += 1
+
+    def clear(self):
+        self.data.clear()
+        self.generation += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedWriteBatch:
+    """Wraps a plyvel WriteBatch invalidating written keys once it is written."""
+
+    def __init__(self, batch, cache: LRUCache, prefix: bytes):
+        self.batch = batch
+        self.cache = cache
+        self.prefix = prefix
+        self.keys = set()
+
+    def put(self, key: bytes, value: bytes):
+        self.batch.put(key, value)
+        self.keys.add(self.prefix + key)
+
+    def delete(self, key: bytes):
+        self.batch.delete(key)
+        self.keys.add(self.prefix + key)
+
+    def clear(self):
+        self.batch.clear()
+        self.keys.clear()
+
+    def invalidate(self):
+        for key in self.keys:
+            self.cache.invalidate(key)
+        self.keys.clear()
+
+    def write(self):
+        self.batch.write()
+        self.invalidate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        try:
+            return self.batch.__exit__(*args)
+        finally:
+            self.invalidate()
+
+
+class CachedDB:
+    """Read-through cache in front of a plyvel DB or PrefixedDB.
+
+    Keys are cached by their full key so the main db and
+    every prefixed db share one cache and stay coherent.
+    """
+
+    def __init__(self, db, cache: LRUCache, prefix: bytes = b""):
+        self.db = db
+        self.cache = cache
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __iter__(self):
+        return iter(self.db)
+
+    def get(self, key: bytes, default=None):
+        full_key = self.prefix + key
+        value = self.cache.get(full_key)
+
+        if value is MISSING:
+            start = time.perf_counter()
+            value = self.db.get(key)
+            add_time("db", time.perf_counter() - start)
+            self.cache.put(full_key, value)
+
+        return default if value is None else value
+
+    def put(self, key: bytes, value: bytes):
+        start = time.perf_counter()
+        self.db.put(key, value)
+        add_time("db", time.perf_counter() - start)
+        self.cache.invalidate(self.prefix + key)
+
+    def delete(self, key: bytes):
+        start = time.perf_counter()
+        self.db.delete(key)
+        add_time("db", time.perf_counter() - start)
+        self.cache.invalidate(self.prefix + key)
+
+    def write_batch(self, **kwargs) -> CachedWriteBatch:
+        return CachedWriteBatch(self.db.write_batch(**kwargs), self.cache, self.prefix)
+
+    def prefixed_db(self, prefix: bytes):
+        return CachedDB(self.db.prefixed_db(prefix), self.cache, self.prefix + prefix)
+
+
+class CounterBuffer:
+    """Holds counter increments in memory and writes them out in one batch.
+
+    Pending increments are flushed at most flush_interval seconds after
+    the last flush so a crash loses at most that many seconds of counts.
+    While paused, e.g during a restore, increments are kept until resumed.
+    """
+
+    def __init__(self, db: CachedDB, flush_interval: float = 10.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.last_flush = time.monotonic()
+        self.paused = False
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, db: CachedDB, key: bytes, amount: int = 1):
+        """Adds an amount to a counter in a prefixed db.
+
+        db: CachedDB
+        key: bytes
+        amount: int
+        """
+        key = db.prefix + key
+        self.pending[key] = self.pending.get(key, 0) + amount
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def get(self, db: CachedDB, key: bytes) -> int:
+        """Returns the value of a counter including pending increments.
+
+        db: CachedDB
+        key: bytes
+        """
+        value = db.get(key)
+        value = codec.decode_int(value) if value else 0
+        return value + self.pending.get(db.prefix + key, 0)
+
+    def flush(self):
+        """Writes all pending increments to the db in a single batch."""
+        self.last_flush = time.monotonic()
+
+        if self.paused or not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+
+        with self.db.write_batch() as wb:
+            for key, amount in pending.items():
+                value = self.db.get(key)
+                value = codec.decode_int(value) if value else 0
+                wb.put(key, codec.encode_int(value + amount))
+
+
 class Database:
-    def __init__(self):
-        self.main = plyvel.DB(
-            f"{pathlib.Path(__file__).parent.parent.parent}/db", create_if_missing=True
-        )
+    def __init__(self, path: str = None, workers: int = 4, max_pending: int = 32):
+        path = pathlib.Path(path or f"{pathlib.Path(__file__).parent.parent.parent}/db")
+
+        self.cache = LRUCache()
+        self.main = CachedDB(plyvel.DB(str(path), create_if_missing=True), self.cache)
         for db in prefixed_dbs:
             setattr(self, db, self.main.prefixed_db(f"{db}-".encode()))
 
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="db")
+        self.pending = asyncio.Semaphore(max_pending)
+
+        self.counters = CounterBuffer(self.main)
+        self.history_counts = OrderedDict()
+        self.backups = Backups(self)
+        self.restoring = False
+        self.prices_path = path.parent / "prices"
+        self.prices = {}
+        self.networth = NetWorth(self)
+        self.policies = Policies(self)
+
+        if not self.main.get(b"balindex_built"):
+            self.rebuild_bal_index()
+
+    async def run(self, func, *args):
+        """Runs a blocking function in the db thread pool.
+
+        At most max_pending calls are queued or running at once,
+        the rest wait here without blocking the event loop.
+
+        func: Callable
+        """
+        start = time.perf_counter()
+
+        try:
+            async with self.pending:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, functools.partial(func, *args)
+                )
+        finally:
+            add_time("db", time.perf_counter() - start)
+
+    async def aget(self, key: bytes, db: CachedDB = None, default=None):
+        """Gets a key reading the db in the thread pool on a cache miss.
+
+        key: bytes
+        db: CachedDB
+            Defaults to the main db.
+        """
+        db = db or self.main
+        full_key = db.prefix + key
+        value = self.cache.get(full_key)
+
+        if value is MISSING:
+            generation = self.cache.generation
+            value = await self.run(db.db.get, key)
+
+            # Don't cache a value that was overwritten while it was read
+            if self.cache.generation == generation:
+                self.cache.put(full_key, value)
+
+        return default if value is None else value
+
+    async def ascan(
+        self, prefix: bytes = b"", db: CachedDB = None, include_value: bool = True
+    ) -> list:
+        """Returns every key or key value pair starting with a prefix.
+
+        prefix: bytes
+        db: CachedDB
+            Defaults to the main db.
+        include_value: bool
+        """
+        db = db or self.main
+
+        def scan():
+            return list(db.iterator(prefix=prefix, include_value=include_value))
+
+        return await self.run(scan)
+
+    async def abatch(self, puts: dict = None, deletes=(), db: CachedDB = None):
+        """Writes puts and deletes in one batch in the thread pool.
+
+        puts: dict[bytes, bytes]
+        deletes: Iterable[bytes]
+        db: CachedDB
+            Defaults to the main db.
+        """
+        db = db or self.main
+        puts = puts or {}
+        deletes = list(deletes)
+
+        def write():
+            with db.db.write_batch() as wb:
+                for key, value in puts.items():
+                    wb.put(key, value)
+                for key in deletes:
+                    wb.delete(key)
+
+        await self.run(write)
+
+        for key in (*puts, *deletes):
+            self.cache.invalidate(db.prefix + key)
+
     def add_karma(self, member_id: int, amount: int):
         """Adds or removes an amount from a members karma.
 
         member_id: int
         amount: int
         """
-        member_id = str(member_id).encode()
-        member_karma = self.karma.get(member_id)
+        self.counters.add(self.karma, str(member_id).encode(), amount)
+
+    def get_karma(self, member_id: int) -> int:
+        """Returns a members karma.
+
+        member_id: int
+        """
+        return self.counters.get(self.karma, str(member_id).encode())
+
+    def add_message_count(self, guild_id: int, member_id: int):
+        """Adds one to a members message count in a guild.
+
+        guild_id: int
+        member_id: int
+        """
+        self.counters.add(self.message_count, f"{guild_id}-{member_id}".encode())
+
+    def migrate_history(self, db: CachedDB, member_id: bytes):
+        """Splits a members old single blob history into one key per entry.
+
+        db: CachedDB
+            Either edited or deleted.
+        member_id: bytes
+            The guild id and member id.
+        """
+        history = db.get(member_id)
+
+        if not history:
+            return
+
+        with db.write_batch() as wb:
+            for date, value in orjson.loads(history).items():
+                if isinstance(value, str):
+                    value = value.encode()
+                else:
+                    value = orjson.dumps(value)
+                wb.put(member_id + f"-{int(date) * 1000:013d}".encode(), value)
+            wb.delete(member_id)
+
+    def add_history(
+        self, db: CachedDB, guild_id: int, member_id: int, timestamp: int, value: bytes
+    ):
+        """Appends an entry to a members edited or deleted message history.
+
+        Only the newest HISTORY_LIMIT entries are kept, the oldest are
+        trimmed once a member goes a tenth over the limit. The entry counts
+        of the HISTORY_COUNTS most recent members are kept, the rest are
+        counted again when they next add an entry.
+
+        Keys end in a random suffix so entries from the same millisecond
+        don't overwrite each other.
+
+        db: CachedDB
+            Either edited or deleted.
+        guild_id: int
+        member_id: int
+        timestamp: int
+            When the message was edited or deleted in milliseconds.
+        value: bytes
+        """
+        member_id = f"{guild_id}-{member_id}".encode()
+        prefix = member_id + b"-"
+        self.migrate_history(db, member_id)
 
-        if not member_karma:
-            member_karma = amount
+        db.put(prefix + f"{timestamp:013d}-{secrets.token_hex(4)}".encode(), value)
+
+        count = self.history_counts.pop(db.prefix + prefix, None)
+
+        if count is None:
+            count = sum(1 for _ in db.iterator(prefix=prefix, include_value=False))
         else:
-            member_karma = int(member_karma) + amount
+            count += 1
+
+        if count > HISTORY_LIMIT * 1.1:
+            with db.write_batch() as wb:
+                for key in db.iterator(prefix=prefix, include_value=False):
+                    if count <= HISTORY_LIMIT:
+                        break
+                    wb.delete(key)
+                    count -= 1
+
+        self.history_counts[db.prefix + prefix] = count
 
-        self.karma.put(member_id, str(member_karma).encode())
+        if len(self.history_counts) > HISTORY_COUNTS:
+            self.history_counts.popitem(last=False)
+
+    def get_history(
+        self, db: CachedDB, guild_id: int, member_id: int, amount: int = None
+    ):
+        """Yields the timestamps and entries of a members history newest first.
+
+        db: CachedDB
+            Either edited or deleted.
+        guild_id: int
+        member_id: int
+        amount: int
+            The most entries to read.
+        """
+        member_id = f"{guild_id}-{member_id}".encode()
+        prefix = member_id + b"-"
+        self.migrate_history(db, member_id)
+
+        for count, (key, value) in enumerate(db.iterator(prefix=prefix, reverse=True)):
+            if count == amount:
+                return
+            yield int(key[len(prefix) :].split(b"-", 1)[0]), value
+
+    def add_poll(
+        self,
+        guild_id: int,
+        channel_id: int,
+        message_id: int,
+        options: dict[str, str],
+        job: str,
+    ):
+        """Stores a poll.
+
+        guild_id: int
+        channel_id: int
+        message_id: int
+        options: dict[str, str]
+            The name of each option by its emoji.
+        job: str
+            The key of the scheduled job that ends the poll.
+        """
+        poll = {"channel": channel_id, "options": options, "job": job}
+        self.polls.put(f"{guild_id}-{message_id}".encode(), orjson.dumps(poll))
+
+    def get_poll(self, guild_id: int, message_id: int) -> dict | None:
+        """Returns a poll without its votes.
+
+        guild_id: int
+        message_id: int
+        """
+        poll = self.polls.get(f"{guild_id}-{message_id}".encode())
+
+        if poll:
+            return orjson.loads(poll)
+        return None
+
+    def add_vote(self, guild_id: int, message_id: int, emoji: str, amount: int = 1):
+        """Adds or removes a vote from a poll option if the poll exists.
+
+        guild_id: int
+        message_id: int
+        emoji: str
+        amount: int
+            -1 when a vote is taken back.
+        """
+        poll = self.get_poll(guild_id, message_id)
+
+        if poll and emoji in poll["options"]:
+            self.counters.add(
+                self.polls, f"{guild_id}-{message_id}-{emoji}".encode(), amount
+            )
+
+    def end_poll(self, guild_id: int, message_id: int) -> dict[str, int] | None:
+        """Removes a poll returning the votes of each option.
+
+        guild_id: int
+        message_id: int
+        """
+        poll = self.get_poll(guild_id, message_id)
+
+        if not poll:
+            return None
+
+        key = f"{guild_id}-{message_id}".encode()
+        votes = {
+            emoji: self.counters.get(self.polls, key + f"-{emoji}".encode())
+            for emoji in poll["options"]
+        }
+
+        self.counters.flush()
+
+        with self.main.write_batch(transaction=True) as wb:
+            wb.delete(self.polls.prefix + key)
+            for emoji in poll["options"]:
+                wb.delete(self.polls.prefix + key + f"-{emoji}".encode())
+
+        return votes
 
     def get_blacklist(self, member_id, guild=None):
         """Returns whether someone is blacklisted.
 
         member_id: int
         """
-        if state := self.blacklist.get(str(member_id).encode()):
-            return state
-
-        if guild and (state := self.blacklist.get(f"{guild}-{member_id}".encode())):
-            return state
+        return self.policies.blacklisted(int(member_id), guild and int(guild))
 
     def get_bal(self, member_id: bytes) -> Decimal:
         """Gets the balance of an member.
@@ -69,7 +571,7 @@ class Database:
         balance = self.bal.get(member_id)
 
         if balance:
-            return Decimal(balance.decode())
+            return codec.decode_decimal(balance)
 
         return Decimal(1000.0)
 
@@ -79,10 +581,44 @@ class Database:
         member_id: bytes
         balance: float
         """
-        balance_bytes = f"{balance:50f}".rstrip("0").lstrip(" ").encode()
-        self.bal.put(member_id, balance_bytes or b"0.0")
+        old_balance = self.bal.get(member_id)
+
+        with self.main.write_batch(transaction=True) as wb:
+            if old_balance:
+                wb.delete(
+                    self.balindex.prefix
+                    + codec.encode_sortable(codec.decode_decimal(old_balance))
+                    + member_id
+                )
+            wb.put(self.bal.prefix + member_id, codec.encode_decimal(balance))
+            wb.put(
+                self.balindex.prefix + codec.encode_sortable(balance) + member_id, b""
+            )
+        self.networth.update_balance(member_id, balance)
         return balance
 
+    def rebuild_bal_index(self):
+        """Rebuilds the index of members sorted by balance from the bal db."""
+        with self.main.write_batch(transaction=True) as wb:
+            for key in self.balindex.iterator(include_value=False):
+                wb.delete(self.balindex.prefix + key)
+
+            for member_id, balance in self.bal:
+                wb.put(
+                    self.balindex.prefix
+                    + codec.encode_sortable(codec.decode_decimal(balance))
+                    + member_id,
+                    b"",
+                )
+
+            wb.put(b"balindex_built", b"1")
+
+    def get_baltop(self):
+        """Yields member ids and balances from the highest balance down."""
+        for key in self.balindex.iterator(reverse=True, include_value=False):
+            balance, member_id = codec.decode_sortable(key)
+            yield member_id, balance
+
     def add_bal(self, member_id: bytes, amount: float):
         """Adds to the balance of an member.
 
@@ -104,13 +640,64 @@ class Database:
             return orjson.loads(stock)
         return None
 
-    def put_stock(self, symbol: bytes, data: dict):
-        """Sets the data of a stock.
+    def get_prices(self, kind: str) -> PriceTable:
+        """Returns the price table of stocks or crypto.
 
-        symbol: bytes
-        data: dict
+        The saved table is memory mapped, if there isn't one it is
+        built from the db and saved.
+
+        kind: str
+            Either stocks or crypto.
         """
-        self.stocks.put(symbol.encode(), orjson.dumps(data))
+        if (table := self.prices.get(kind)) is not None:
+            return table
+
+        path = self.prices_path / f"{kind}.npy"
+        table = PriceTable.load(path)
+
+        if table is None:
+            row = stock_row if kind == "stocks" else crypto_row
+            table = PriceTable.from_rows(
+                row(symbol.decode(), orjson.loads(data))
+                for symbol, data in getattr(self, kind)
+            )
+            table.save(path)
+
+        self.prices[kind] = table
+        return table
+
+    def build_prices(self, kind: str, rows: list, complete: bool) -> PriceTable:
+        """Builds and saves a price table, blocking so it runs in the thread pool.
+
+        kind: str
+            Either stocks or crypto.
+        rows: list[tuple[str, float, float, float]]
+        complete: bool
+            Whether rows has every symbol, if not they are merged into the
+            current table.
+        """
+        if complete:
+            table = PriceTable.from_rows(rows)
+        else:
+            table = self.get_prices(kind).with_rows(rows)
+
+        table.save(self.prices_path / f"{kind}.npy")
+        return table
+
+    async def put_prices(self, kind: str, rows: list, complete: bool = True):
+        """Replaces the price table of stocks or crypto and revalues net worths.
+
+        A complete refresh replaces the table so delisted symbols are
+        dropped. Only swapping in the new table happens on the loop.
+
+        kind: str
+            Either stocks or crypto.
+        rows: list[tuple[str, float, float, float]]
+        complete: bool
+            Whether rows has every symbol.
+        """
+        self.prices[kind] = await self.run(self.build_prices, kind, rows, complete)
+        await self.networth.update_prices()
 
     def get_stockbal(self, member_id: bytes) -> dict | None:
         """Returns a members stockbal.
@@ -130,6 +717,7 @@ class Database:
         data: dict
         """
         self.stockbal.put(member_id, orjson.dumps(data))
+        self.networth.update_holdings(member_id, "stocks", data)
 
     def get_crypto(self, symbol: bytes) -> dict | None:
         """Returns the data of a crypto.
@@ -142,15 +730,6 @@ class Database:
             return orjson.loads(data)
         return None
 
-    def put_crypto(self, symbol, data):
-        """Sets the data of a crypto.
-
-        symbol: bytes
-        data: dict
-        """
-        data = orjson.dumps(data)
-        self.crypto.put(symbol.encode(), data)
-
     def get_cryptobal(self, member_id):
         """Returns a members cryptobal.
 
@@ -169,3 +748,4 @@ class Database:
         data: dict
         """
         self.cryptobal.put(member_id, orjson.dumps(data))
+        self.networth.update_holdings(member_id, "crypto", data)
@@ -0,0 +1,75 @@
+"""A bigram index of command names for suggesting close matches.
+
+Rather than comparing a typo against every command only the names
+sharing the most bigrams with it are scored, the same way
+difflib.get_close_matches scores them. Names are padded so the first
+and last letters also form bigrams, which keeps short names and swapped
+letters matchable.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+
+def bigrams(word: str) -> set[str]:
+    word = f"^{word.lower()}$"
+    return {word[i : i + 2] for i in range(len(word) - 1)}
+
+
+class CommandIndex:
+    """Maps bigrams to the command names containing them."""
+
+    def __init__(self):
+        self.grams = defaultdict(set)
+        self.names = set()
+        self.stale = True
+
+    def __len__(self):
+        return len(self.names)
+
+    def build(self, names):
+        """Replaces the indexed names.
+
+        names: Iterable[str]
+        """
+        self.grams.clear()
+        self.names = set(names)
+
+        for name in self.names:
+            for gram in bigrams(name):
+                self.grams[gram].add(name)
+
+        self.stale = False
+
+    def invalidate(self):
+        """Marks the index to be rebuilt, e.g after a cog is loaded."""
+        self.stale = True
+
+    def search(self, word: str, cutoff: float = 0.6, candidates: int = 10) -> list[str]:
+        """Returns the names scoring at least cutoff against word, best first.
+
+        word: str
+        cutoff: float
+            Between 0 and 1.
+        candidates: int
+            How many of the names sharing the most bigrams are scored.
+        """
+        shared = Counter()
+        for gram in bigrams(word):
+            shared.update(self.grams.get(gram, ()))
+
+        matcher = SequenceMatcher()
+        matcher.set_seq2(word)
+        scored = []
+
+        for name, _ in shared.most_common(candidates):
+            matcher.set_seq1(name)
+            if (
+                matcher.real_quick_ratio() >= cutoff
+                and matcher.quick_ratio() >= cutoff
+                and (score := matcher.ratio()) >= cutoff
+            ):
+                scored.append((score, name))
+
+        return [name for _, name in heapq.nlargest(len(scored), scored)]
@@ -0,0 +1,458 @@
+"""The shared http session and helpers for outbound requests.
+
+The session's connector caps connections per host so slow apis can't
+take every connection from fast ones, keeps idle connections alive and
+caches dns lookups. Its responses are tracked so ones that are never
+released are reported.
+
+Every host has a circuit breaker so once an api starts failing requests
+to it fail straight away instead of waiting for their timeout.
+
+Concurrent identical requests share one in-flight task so a burst of
+the same command only reaches the upstream api once. Responses that
+allow it are kept for their Cache-Control max-age, capped to a short
+limit so data never goes too stale.
+"""
+
+import asyncio
+import re
+import sys
+import time
+import warnings
+import weakref
+from collections import OrderedDict, deque
+
+import aiohttp
+from aiohttp.resolver import AsyncResolver
+
+from cogs.utils.metrics import add_time
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+LIMIT = 100
+LIMIT_PER_HOST = 10
+KEEPALIVE_TIMEOUT = 30
+DNS_TTL = 300
+
+TIMEOUTS = {
+    "default": aiohttp.ClientTimeout(total=10, sock_connect=5),
+    "slow": aiohttp.ClientTimeout(total=30, sock_connect=5),
+    "long": aiohttp.ClientTimeout(total=60, sock_connect=5),
+}
+
+FAILURE_STATUSES = frozenset((429, 500, 502, 503, 504, 520, 521, 522, 523, 524))
+
+INTERNAL_MODULES = ("aiohttp", "asyncio", "contextlib", __name__)
+
+MAX_AGE = re.compile(r"(?:^|[,\s])(?:s-maxage|max-age)\s*=\s*\"?(\d+)")
+NO_CACHE = re.compile(r"no-store|no-cache|private")
+
+
+def max_age(headers, limit: float = 60) -> float:
+    """Returns how long a response may be cached from its headers.
+
+    headers: Mapping[str, str]
+    limit: float
+        The longest a response is cached for regardless of its headers.
+    """
+    cache_control = headers.get("Cache-Control", "")
+
+    if not cache_control or NO_CACHE.search(cache_control):
+        return 0
+
+    if not (match := MAX_AGE.search(cache_control)):
+        return 0
+
+    return min(int(match[1]) - int(headers.get("Age", 0) or 0), limit)
+
+
+class SingleFlight:
+    """Shares the result of one call between concurrent callers of a key."""
+
+    def __init__(self):
+        self.calls = {}
+        self.shared = 0
+
+    def __len__(self):
+        return len(self.calls)
+
+    async def do(self, key, func):
+        """Awaits func or the call of it already in flight for key.
+
+        The call is shielded so a caller being cancelled doesn't cancel
+        it for everyone else waiting on it.
+
+        key: Hashable
+        func: Callable[[], Awaitable]
+        """
+        if (task := self.calls.get(key)) is not None:
+            self.shared += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    """A size bounded LRU cache where each entry has its own ttl."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return default
+
+        expires, value = entry
+
+        if expires <= time.monotonic():
+            del self.entries[key]
+            return default
+
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl: float):
+        if ttl <= 0:
+            return
+
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def caller() -> str:
+    """Returns where the request being made was made from."""
+    frame = sys._getframe(1)
+
+    while frame:
+        module = frame.f_globals.get("__name__", "")
+
+        if not module.startswith(INTERNAL_MODULES):
+            return f"{module}:{frame.f_lineno} {frame.f_code.co_name}"
+
+        frame = frame.f_back
+
+    return "unknown"
+
+
+class LeakDetector:
+    """Keeps track of responses that are open and ones that leaked.
+
+    A response that isn't read to the end or released holds its
+    connection, those open for longer than threshold are returned by
+    stale and ones garbage collected before being released are kept in
+    leaks.
+    """
+
+    def __init__(self, threshold: float = 60, size: int = 50):
+        self.threshold = threshold
+        self.open = weakref.WeakSet()
+        self.leaks = deque(maxlen=size)
+        self.leaked = 0
+
+    def report(self, response):
+        self.leaked += 1
+        self.leaks.append(
+            (
+                time.time(),
+                response.origin,
+                str(response.url),
+                time.monotonic() - response.created,
+            )
+        )
+
+    def stale(self) -> list:
+        """Returns the origin, url and age of responses open for longer
+        than the threshold, oldest first."""
+        now = time.monotonic()
+
+        return sorted(
+            (
+                (response.origin, str(response.url), now - response.created)
+                for response in list(self.open)
+                if not response.closed and now - response.created > self.threshold
+            ),
+            key=lambda item: -item[2],
+        )
+
+
+LEAKS = LeakDetector()
+
+
+class TrackedResponse(aiohttp.ClientResponse):
+    """A response that reports itself if it is never released."""
+
+    detector = LEAKS
+    created = 0.0
+    origin = "unknown"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created = time.monotonic()
+        self.origin = caller()
+        self.detector.open.add(self)
+
+    def __del__(self, _warnings=warnings):
+        if not self.closed:
+            self.detector.report(self)
+
+        super().__del__(_warnings)
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Raised instead of making a request to a host that is failing."""
+
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"{host} is down, retrying in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """Tracks the failure rate of requests to one host.
+
+    closed: requests go through and their outcomes are recorded.
+    open: requests fail straight away until open_for has passed.
+    half open: one request is let through as a probe, if it succeeds the
+        circuit closes otherwise it opens again for twice as long.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half open"
+
+    def __init__(
+        self,
+        host: str,
+        window: float = 60,
+        min_requests: int = 5,
+        failure_rate: float = 0.5,
+        open_for: float = 5,
+        max_open_for: float = 300,
+    ):
+        self.host = host
+        self.window = window
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.base_open_for = open_for
+        self.max_open_for = max_open_for
+
+        self.state = self.CLOSED
+        self.open_for = open_for
+        self.opened = 0.0
+        self.probing = 0.0
+        self.outcomes = deque()
+        self.failures = 0
+
+    def prune(self, now: float):
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.failures -= self.outcomes.popleft()[1]
+
+    def before_request(self):
+        """Raises CircuitOpenError if a request shouldn't be made."""
+        if self.state == self.CLOSED:
+            return
+
+        now = time.monotonic()
+
+        if self.state == self.OPEN:
+            if now - self.opened < self.open_for:
+                raise CircuitOpenError(self.host, self.opened + self.open_for - now)
+            self.state = self.HALF_OPEN
+            self.probing = 0.0
+
+        # Let one probe through at a time, a probe that never finished
+        # stops blocking others after the window
+        if self.probing and now - self.probing < self.window:
+            raise CircuitOpenError(self.host, 0)
+
+        self.probing = now
+
+    def record(self, failed: bool):
+        now = time.monotonic()
+
+        if self.state == self.OPEN:
+            return
+
+        if self.state == self.HALF_OPEN:
+            if failed:
+                self.open_for = min(self.open_for * 2, self.max_open_for)
+                self.trip(now)
+            else:
+                self.state = self.CLOSED
+                self.open_for = self.base_open_for
+                self.outcomes.clear()
+                self.failures = 0
+            return
+
+        self.outcomes.append((now, failed))
+        self.failures += failed
+        self.prune(now)
+
+        if (
+            len(self.outcomes) >= self.min_requests
+            and self.failures / len(self.outcomes) >= self.failure_rate
+        ):
+            self.trip(now)
+
+    def trip(self, now: float):
+        self.state = self.OPEN
+        self.opened = now
+        self.probing = 0.0
+
+    def stats(self) -> dict:
+        self.prune(time.monotonic())
+        return {
+            "state": self.state,
+            "requests": len(self.outcomes),
+            "failures": self.failures,
+            "open_for": self.open_for,
+        }
+
+
+class Breakers:
+    """The circuit breaker of every host, hooked into a session with trace."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.breakers = {}
+
+    def __iter__(self):
+        return iter(self.breakers.values())
+
+    def get(self, host: str) -> CircuitBreaker:
+        if (breaker := self.breakers.get(host)) is None:
+            breaker = self.breakers[host] = CircuitBreaker(host, **self.options)
+        return breaker
+
+    async def on_request_start(self, session, context, params):
+        self.get(params.url.host).before_request()
+
+    async def on_request_end(self, session, context, params):
+        self.get(params.url.host).record(params.response.status in FAILURE_STATUSES)
+
+    async def on_request_exception(self, session, context, params):
+        if not isinstance(params.exception, CircuitOpenError):
+            self.get(params.url.host).record(True)
+
+    def trace(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self.on_request_start)
+        trace.on_request_end.append(self.on_request_end)
+        trace.on_request_exception.append(self.on_request_exception)
+        return trace
+
+
+BREAKERS = Breakers()
+
+
+async def on_request_start(session, context, params):
+    context.start = time.perf_counter()
+
+
+async def on_request_done(session, context, params):
+    # Requests stopped by a circuit breaker never started
+    if start := getattr(context, "start", None):
+        add_time("http", time.perf_counter() - start)
+
+
+def timing_trace() -> aiohttp.TraceConfig:
+    """Returns a trace adding the time of requests to the running command."""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_done)
+    trace.on_request_exception.append(on_request_done)
+    return trace
+
+
+async def hedge(factories, delay: float = 1):
+    """Returns the index and result of the first factory to return something.
+
+    The first factory is started straight away and each one after it
+    once the ones before have failed or delay has passed without an
+    answer, the rest are cancelled once one succeeds.
+
+    factories: Iterable[Callable[[], Awaitable]]
+    delay: float
+    """
+    factories = enumerate(factories)
+    tasks = {}
+
+    try:
+        while True:
+            if (item := next(factories, None)) is not None:
+                index, factory = item
+                tasks[asyncio.ensure_future(factory())] = index
+            elif not tasks:
+                return None, None
+
+            done, _ = await asyncio.wait(
+                tasks,
+                timeout=delay if item is not None else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            for task in done:
+                index = tasks.pop(task)
+
+                if not task.cancelled() and not task.exception() and task.result():
+                    return index, task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def create_session(
+    limit: int = LIMIT,
+    limit_per_host: int = LIMIT_PER_HOST,
+    keepalive_timeout: float = KEEPALIVE_TIMEOUT,
+    dns_ttl: int = DNS_TTL,
+    timeout: aiohttp.ClientTimeout = TIMEOUTS["default"],
+) -> aiohttp.ClientSession:
+    """Creates the session shared by every cog.
+
+    Has to be called from a coroutine as the connector needs a running loop.
+
+    limit: int
+        The most connections open at once.
+    limit_per_host: int
+        The most connections open to one host at once.
+    keepalive_timeout: float
+        How long idle connections are kept for reuse.
+    dns_ttl: int
+        How long dns lookups are cached for.
+    timeout: aiohttp.ClientTimeout
+        The timeout of requests that don't pass their own.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=dns_ttl,
+        resolver=AsyncResolver() if aiodns else None,
+        enable_cleanup_closed=True,
+    )
+
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        response_class=TrackedResponse,
+        trace_configs=[BREAKERS.trace(), timing_trace()],
+    )
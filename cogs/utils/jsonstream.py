@@ -0,0 +1,128 @@
+"""Incremental parsing of the objects in a large JSON array.
+
+Only the bytes of the object currently being read are buffered, each
+object is decoded with orjson as soon as its closing brace arrives.
+"""
+
+import re
+
+import orjson
+
+TOKENS = re.compile(rb'[{}"\\\]]')
+
+QUOTE = ord('"')
+BACKSLASH = ord("\\")
+OPEN = ord("{")
+CLOSE = ord("}")
+
+
+class ArrayParser:
+    """Splits the objects out of the first array following a key."""
+
+    def __init__(self, key: bytes):
+        self.key = b'"' + key + b'"'
+        self.buffer = bytearray()
+        self.found = False
+        self.done = False
+
+        self.position = 0
+        self.start = 0
+        self.skip = 0
+        self.depth = 0
+        self.in_string = False
+
+    def feed(self, chunk: bytes) -> list:
+        """Returns the objects completed by a chunk of the body.
+
+        chunk: bytes
+        """
+        if self.done:
+            return []
+
+        self.buffer += chunk
+
+        if not self.found:
+            index = self.buffer.find(self.key)
+
+            if index == -1:
+                # Keep enough of the tail to match a key split across chunks
+                del self.buffer[: max(len(self.buffer) - len(self.key), 0)]
+                return []
+
+            bracket = self.buffer.find(b"[", index)
+            if bracket == -1:
+                return []
+
+            del self.buffer[: bracket + 1]
+            self.found = True
+
+        return self.parse()
+
+    def parse(self) -> list:
+        items = []
+        buffer = self.buffer
+
+        for match in TOKENS.finditer(buffer, self.position):
+            index = match.start()
+
+            if index < self.skip:
+                continue
+
+            char = buffer[index]
+
+            if self.in_string:
+                if char == BACKSLASH:
+                    self.skip = index + 2
+                elif char == QUOTE:
+                    self.in_string = False
+            elif char == QUOTE:
+                self.in_string = True
+            elif char == OPEN:
+                if not self.depth:
+                    self.start = index
+                self.depth += 1
+            elif char == CLOSE:
+                self.depth -= 1
+                if not self.depth:
+                    items.append(orjson.loads(buffer[self.start : index + 1]))
+            elif not self.depth:
+                self.done = True
+                break
+
+        # Drop everything before the object still being read
+        cut = self.start if self.depth else len(buffer)
+        del buffer[:cut]
+        self.start -= cut
+        self.skip -= cut
+        self.position = len(buffer)
+
+        return items
+
+
+async def iter_chunks(content, key: bytes, size: int = 500, read_size: int = 65536):
+    """Yields lists of at most size objects from the array following a key.
+
+    content: aiohttp.StreamReader
+        The body of a response.
+    key: bytes
+        The key of the array to read.
+    size: int
+        The most objects yielded at once.
+    read_size: int
+        The amount of bytes read from the body at a time.
+    """
+    parser = ArrayParser(key)
+    items = []
+
+    async for chunk in content.iter_chunked(read_size):
+        items += parser.feed(chunk)
+
+        while len(items) >= size:
+            yield items[:size]
+            del items[:size]
+
+        if parser.done:
+            break
+
+    if items:
+        yield items
@@ -0,0 +1,213 @@
+"""Per command latency, throughput and error metrics.
+
+Latencies go into log-linear histograms like HdrHistogram, every power
+of two is split into SUB_BUCKETS / 2 buckets so percentiles are at most
+6.25% over the real value while a histogram stays a few hundred ints
+no matter how many values it has seen.
+
+Time spent in the db, http requests and discord api calls during a
+command is added to the timings of the running command through a
+context variable, so the code doing the work doesn't need the context.
+"""
+
+import contextvars
+import time
+
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+HALF = SUB_BUCKETS >> 1
+
+COMPONENTS = ("db", "http", "discord")
+QUANTILES = (0.5, 0.95, 0.99)
+
+CURRENT = contextvars.ContextVar("timings", default=None)
+
+
+def add_time(component: str, seconds: float):
+    """Adds time spent in a component to the running command.
+
+    component: str
+        One of COMPONENTS.
+    seconds: float
+    """
+    if (timings := CURRENT.get()) is not None:
+        timings[component] += seconds
+
+
+def timed(component: str, func):
+    """Wraps a coroutine function so its time is added to a component.
+
+    component: str
+    func: Callable[..., Awaitable]
+    """
+
+    async def wrapper(*args, **kwargs):
+        if CURRENT.get() is None:
+            return await func(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            add_time(component, time.perf_counter() - start)
+
+    return wrapper
+
+
+class Histogram:
+    """A log-linear histogram of durations stored in microseconds."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def index(value: int) -> int:
+        if value < SUB_BUCKETS:
+            return value
+
+        shift = value.bit_length() - SUB_BITS
+        return (shift + 1) * HALF + (value >> shift) - HALF
+
+    @staticmethod
+    def upper_bound(index: int) -> int:
+        if index < SUB_BUCKETS:
+            return index
+
+        shift = index // HALF - 1
+        return ((index % HALF + HALF + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        index = self.index(int(seconds * 1_000_000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, quantile: float) -> float:
+        """Returns the duration in seconds quantile of values are under.
+
+        quantile: float
+            Between 0 and 1.
+        """
+        if not self.count:
+            return 0.0
+
+        target = quantile * self.count
+        seen = 0
+
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.upper_bound(index) / 1_000_000, self.max)
+
+        return self.max
+
+
+class CommandStats:
+    __slots__ = ("histogram", "errors", "components")
+
+    def __init__(self):
+        self.histogram = Histogram()
+        self.errors = 0
+        self.components = dict.fromkeys(COMPONENTS, 0.0)
+
+    @property
+    def count(self) -> int:
+        return self.histogram.count
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Collects the stats of every command since the bot started."""
+
+    def __init__(self):
+        self.commands = {}
+        self.started = time.time()
+
+    def timings(self) -> dict:
+        return dict.fromkeys(COMPONENTS, 0.0)
+
+    def record(self, command: str, seconds: float, failed: bool, timings: dict):
+        """Records one invocation of a command.
+
+        command: str
+            The qualified name of the command.
+        seconds: float
+            How long the invocation took.
+        failed: bool
+        timings: dict[str, float]
+            The time spent in each component.
+        """
+        if (stats := self.commands.get(command)) is None:
+            stats = self.commands[command] = CommandStats()
+
+        stats.histogram.record(seconds)
+        stats.errors += failed
+
+        for component, spent in timings.items():
+            stats.components[component] += spent
+
+    def reset(self):
+        self.commands.clear()
+        self.started = time.time()
+
+    def prometheus(self) -> str:
+        """Returns every stat in the Prometheus text format."""
+        lines = [
+            "# HELP snakebot_command_duration_seconds How long commands take.",
+            "# TYPE snakebot_command_duration_seconds summary",
+        ]
+
+        for command, stats in self.commands.items():
+            label = f'command="{escape(command)}"'
+            for quantile in QUANTILES:
+                lines.append(
+                    f'snakebot_command_duration_seconds{{{label},quantile="{quantile}"}}'
+                    f" {stats.histogram.percentile(quantile):.6f}"
+                )
+            lines.append(
+                f"snakebot_command_duration_seconds_sum{{{label}}}"
+                f" {stats.histogram.total:.6f}"
+            )
+            lines.append(
+                f"snakebot_command_duration_seconds_count{{{label}}} {stats.count}"
+            )
+
+        lines += [
+            "# HELP snakebot_command_errors_total Invocations that failed.",
+            "# TYPE snakebot_command_errors_total counter",
+        ]
+        lines += [
+            f'snakebot_command_errors_total{{command="{escape(command)}"}} {stats.errors}'
+            for command, stats in self.commands.items()
+        ]
+
+        lines += [
+            "# HELP snakebot_command_component_seconds_total Time commands spent"
+            " in the db, http requests and discord api calls.",
+            "# TYPE snakebot_command_component_seconds_total counter",
+        ]
+        lines += [
+            f'snakebot_command_component_seconds_total{{command="{escape(command)}",'
+            f'component="{component}"}} {spent:.6f}'
+            for command, stats in self.commands.items()
+            for component, spent in stats.components.items()
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Writes the Prometheus text format to a file.
+
+        path: str
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
@@ -0,0 +1,264 @@
+import asyncio
+import bisect
+
+import numpy as np
+import orjson
+
+from cogs.utils import codec
+
+KINDS = ("stocks", "crypto")
+HOLDINGS = {"stocks": "stockbal", "crypto": "cryptobal"}
+
+
+class NetWorth:
+    """Keeps every members net worth in memory so nettop doesn't rescan the db.
+
+    Balances and holdings are loaded from the db the first time they are
+    needed, after that the Database keeps them up to date as balances,
+    holdings and prices are written. Prices come from the Database's
+    price tables.
+
+    Scanning the db and valuing every member run in the db's thread pool
+    on copies of the state, the loop only swaps in the results. Changes
+    made while the db is being scanned are applied once the scan is in
+    and members changed while everyone is being valued are revalued
+    once the new values are in, so no change is lost.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.loaded = False
+        self.loading = None
+        self.scanning = False
+        self.pending = {}
+
+        self.lock = asyncio.Lock()
+        self.valuing = False
+        self.changed = set()
+
+        self.balances = {}
+        self.holdings = {kind: {} for kind in KINDS}
+        self.values = {}
+        self.ranking = []
+
+    @staticmethod
+    def parse_holdings(data: bytes | None) -> list[tuple[str, float]]:
+        """Returns a list of symbols and totals from a stockbal or cryptobal.
+
+        data: bytes | None
+        """
+        if not data:
+            return []
+        return [
+            (symbol, stock["total"]) for symbol, stock in orjson.loads(data).items()
+        ]
+
+    def scan(self) -> tuple[dict, dict]:
+        """Reads every balance and holding from the db.
+
+        Only builds new dicts so it can run in the thread pool.
+        """
+        balances = {
+            member_id: float(codec.decode_decimal(balance))
+            for member_id, balance in self.db.bal
+        }
+        holdings = {
+            kind: {
+                member_id: self.parse_holdings(data)
+                for member_id, data in getattr(self.db, HOLDINGS[kind])
+            }
+            for kind in KINDS
+        }
+        return balances, holdings
+
+    @staticmethod
+    def valuate(balances: dict, holdings: dict, tables: dict) -> tuple[dict, list]:
+        """Returns the net worth of every member and them ranked by it.
+
+        Every holding is flattened into arrays of owner, price row and
+        total so each kind is valued with one gather and one bincount.
+        Only reads its arguments so it can run in the thread pool.
+
+        balances: dict[bytes, float]
+        holdings: dict[str, dict[bytes, list[tuple[str, float]]]]
+        tables: dict[str, PriceTable]
+        """
+        members = list(balances)
+        index = {member_id: i for i, member_id in enumerate(members)}
+        values = np.fromiter(balances.values(), dtype=np.float64, count=len(members))
+
+        for kind in KINDS:
+            prices = tables[kind]
+            owners, symbols, totals = [], [], []
+
+            for member_id, member_holdings in holdings[kind].items():
+                if (owner := index.get(member_id)) is None:
+                    continue
+                for symbol, total in member_holdings:
+                    owners.append(owner)
+                    symbols.append(symbol)
+                    totals.append(total)
+
+            values += prices.totals(
+                np.array(owners, dtype=np.intp),
+                prices.rows(symbols),
+                np.array(totals, dtype=np.float64),
+                len(members),
+            )
+
+        # Ties are ordered by member id the same as sorting the tuples,
+        # which revalue's bisects rely on
+        ids = np.array(members, dtype=bytes) if members else np.array([], dtype="S1")
+        order = np.lexsort((ids, values)).tolist()
+        value_list = values.tolist()
+
+        return (
+            dict(zip(members, value_list)),
+            [(value_list[i], members[i]) for i in order],
+        )
+
+    async def ensure_loaded(self):
+        """Loads balances and holdings if they haven't been, concurrent
+        callers wait on the same load."""
+        if self.loaded:
+            return
+
+        if self.loading is None:
+            self.loading = asyncio.ensure_future(self.load_async())
+
+        await asyncio.shield(self.loading)
+
+    async def load_async(self):
+        self.scanning = True
+
+        try:
+            balances, holdings = await self.db.run(self.scan)
+        except BaseException:
+            self.scanning = False
+            self.pending.clear()
+            self.loading = None
+            raise
+
+        self.balances, self.holdings = balances, holdings
+        self.scanning = False
+
+        # Changes made during the scan may or may not be in it
+        for (kind, member_id), value in self.pending.items():
+            if kind == "balance":
+                self.balances[member_id] = value
+            else:
+                self.holdings[kind][member_id] = value
+        self.pending.clear()
+
+        try:
+            await self.recalculate()
+        except BaseException:
+            self.loading = None
+            raise
+
+        self.loaded = True
+
+    def reset(self):
+        """Forgets everything so it is loaded again, e.g after a restore."""
+        self.loaded = False
+        self.loading = None
+        self.balances = {}
+        self.holdings = {kind: {} for kind in KINDS}
+        self.values = {}
+        self.ranking = []
+
+    def tables(self) -> dict:
+        return {kind: self.db.get_prices(kind) for kind in KINDS}
+
+    def value_of(self, member_id: bytes, kind: str) -> float:
+        """Returns the value of a members stocks or crypto.
+
+        member_id: bytes
+        kind: str
+            Either stocks or crypto.
+        """
+        return self.db.get_prices(kind).value(self.holdings[kind].get(member_id))
+
+    def calculate(self, member_id: bytes) -> float:
+        return (
+            self.balances[member_id]
+            + self.value_of(member_id, "stocks")
+            + self.value_of(member_id, "crypto")
+        )
+
+    async def recalculate(self):
+        """Recalculates the net worth of every member in the thread pool."""
+        async with self.lock:
+            self.valuing = True
+            self.changed.clear()
+
+            # Holdings are replaced rather than changed so shallow copies do
+            balances = self.balances.copy()
+            holdings = {kind: self.holdings[kind].copy() for kind in KINDS}
+
+            try:
+                tables = await self.db.run(self.tables)
+                self.values, self.ranking = await self.db.run(
+                    self.valuate, balances, holdings, tables
+                )
+            finally:
+                self.valuing = False
+
+            for member_id in self.changed:
+                if member_id in self.balances:
+                    self.revalue(member_id)
+            self.changed.clear()
+
+    def revalue(self, member_id: bytes):
+        """Recalculates one member moving them within the ranking.
+
+        member_id: bytes
+        """
+        value = self.calculate(member_id)
+        old_value = self.values.get(member_id)
+        self.values[member_id] = value
+
+        if old_value is not None:
+            index = bisect.bisect_left(self.ranking, (old_value, member_id))
+            del self.ranking[index]
+        bisect.insort(self.ranking, (value, member_id))
+
+    def update(self, member_id: bytes):
+        if self.valuing:
+            self.changed.add(member_id)
+        elif self.loaded and member_id in self.balances:
+            self.revalue(member_id)
+
+    @property
+    def tracking(self) -> bool:
+        """Whether balances and holdings are in memory and kept up to date."""
+        return self.loaded or self.loading is not None
+
+    def update_balance(self, member_id: bytes, balance):
+        if self.scanning:
+            self.pending["balance", member_id] = float(balance)
+        elif self.tracking:
+            self.balances[member_id] = float(balance)
+            self.update(member_id)
+
+    def update_holdings(self, member_id: bytes, kind: str, data: dict):
+        holdings = [(symbol, stock["total"]) for symbol, stock in data.items()]
+
+        if self.scanning:
+            self.pending[kind, member_id] = holdings
+        elif self.tracking:
+            self.holdings[kind][member_id] = holdings
+            self.update(member_id)
+
+    async def update_prices(self):
+        """Revalues every member after the prices of stocks or crypto change."""
+        if self.loaded:
+            await self.recalculate()
+
+    def top(self):
+        """Yields member ids and net worths from the highest net worth down.
+
+        ensure_loaded has to have been awaited first.
+        """
+        for value, member_id in reversed(self.ranking):
+            yield member_id, value
@@ -0,0 +1,100 @@
+import orjson
+
+
+class GuildPolicy:
+    """What a guild has disabled and who it has blacklisted or downvoted.
+
+    disabled_channels: frozenset[int]
+    disabled_commands: frozenset[str]
+        Names of commands toggled off.
+    blacklist: dict[int, bytes]
+        Member ids mapped to b"1" if downvoted or b"2" if blacklisted.
+    """
+
+    __slots__ = ("disabled_channels", "disabled_commands", "blacklist")
+
+    def __init__(self, disabled_channels=(), disabled_commands=(), blacklist=None):
+        self.disabled_channels = frozenset(disabled_channels)
+        self.disabled_commands = frozenset(disabled_commands)
+        self.blacklist = blacklist or {}
+
+
+class Policies:
+    """Snapshots of each guild's policy so checks don't read the db.
+
+    A guild's policy is read the first time it is needed and kept until
+    a command changing it invalidates it. Global blacklists and downvotes
+    are kept in one snapshot shared by every guild.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.guilds = {}
+        self.global_blacklist = None
+
+    def __len__(self):
+        return len(self.guilds)
+
+    def load(self, guild_id: int) -> GuildPolicy:
+        """Reads the policy of a guild from the db.
+
+        guild_id: int
+        """
+        disabled = self.db.main.get(f"{guild_id}-disabled_channels".encode())
+        prefix = f"{guild_id}-t-".encode()
+
+        return GuildPolicy(
+            orjson.loads(disabled) if disabled else (),
+            (
+                key[len(prefix) :].decode()
+                for key in self.db.main.iterator(prefix=prefix, include_value=False)
+            ),
+            {
+                int(key.split(b"-")[1]): state
+                for key, state in self.db.blacklist.iterator(
+                    prefix=f"{guild_id}-".encode()
+                )
+            },
+        )
+
+    def get(self, guild_id: int) -> GuildPolicy:
+        """Returns the policy of a guild.
+
+        guild_id: int
+        """
+        if (policy := self.guilds.get(guild_id)) is None:
+            policy = self.guilds[guild_id] = self.load(guild_id)
+        return policy
+
+    def blacklisted(self, member_id: int, guild_id: int = None) -> bytes | None:
+        """Returns b"1" if someone is downvoted, b"2" if they are blacklisted.
+
+        member_id: int
+        guild_id: int
+            Also checks the guild's blacklist.
+        """
+        if self.global_blacklist is None:
+            self.global_blacklist = {
+                int(key): state for key, state in self.db.blacklist if b"-" not in key
+            }
+
+        if state := self.global_blacklist.get(member_id):
+            return state
+
+        if guild_id:
+            return self.get(guild_id).blacklist.get(member_id)
+
+    def invalidate(self, guild_id: int = None):
+        """Drops the snapshot of a guild or the global blacklist.
+
+        guild_id: int
+            Leave as None to drop the global blacklist.
+        """
+        if guild_id is None:
+            self.global_blacklist = None
+        else:
+            self.guilds.pop(guild_id, None)
+
+    def clear(self):
+        self.guilds.clear()
+        self.global_blacklist = None
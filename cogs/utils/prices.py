@@ -0,0 +1,180 @@
+"""Column oriented price tables for stocks and crypto.
+
+A table maps each symbol to a row in parallel float arrays of price,
+change and percent change. Tables are saved as a single .npy file so
+they can be memory mapped at startup instead of decoding every price
+from the db.
+"""
+
+import os
+import pathlib
+
+import numpy as np
+
+
+def to_float(value) -> float:
+    """Converts a stored number to a float treating bad numbers as 0.
+
+    value: str | float | None
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PriceTable:
+    """Prices of every stock or crypto stored as parallel numpy arrays."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.symbols = data["symbol"]
+        self.prices = data["price"]
+        self.changes = data["change"]
+        self.pct_changes = data["pct_change"]
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols.tolist())}
+        # Missing symbols gather the trailing 0 instead of raising
+        self.padded = np.append(self.prices, 0.0)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, symbol: str):
+        return symbol in self.index
+
+    @staticmethod
+    def dtype(length: int) -> np.dtype:
+        return np.dtype(
+            [
+                ("symbol", f"U{max(length, 1)}"),
+                ("price", "f8"),
+                ("change", "f8"),
+                ("pct_change", "f8"),
+            ]
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a table sorted by symbol.
+
+        rows: Iterable[tuple[str, float, float, float]]
+            Symbol, price, change and percent change.
+        """
+        rows = {row[0]: row for row in rows}
+        data = np.array(
+            [rows[symbol] for symbol in sorted(rows)],
+            dtype=cls.dtype(max(map(len, rows), default=1)),
+        )
+        return cls(data)
+
+    @classmethod
+    def load(cls, path: pathlib.Path):
+        """Memory maps a saved table returning None if there isn't one.
+
+        path: pathlib.Path
+        """
+        try:
+            return cls(np.load(path, mmap_mode="r"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, path: pathlib.Path):
+        """Writes the table to a temporary file and moves it over the old one.
+
+        path: pathlib.Path
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(".tmp")
+
+        with open(temp, "wb") as file:
+            np.save(file, self.data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp, path)
+
+    def price(self, symbol: str, default: float = 0.0) -> float:
+        """Returns the price of a symbol.
+
+        symbol: str
+        default: float
+        """
+        row = self.index.get(symbol)
+        if row is None:
+            return default
+        return float(self.prices[row])
+
+    def with_rows(self, rows):
+        """Returns a copy of the table with rows added or replaced.
+
+        rows: Iterable[tuple[str, float, float, float]]
+        """
+        current = zip(
+            self.symbols.tolist(),
+            self.prices.tolist(),
+            self.changes.tolist(),
+            self.pct_changes.tolist(),
+        )
+        return PriceTable.from_rows([*current, *rows])
+
+    def rows(self, symbols) -> np.ndarray:
+        """Returns the rows of symbols, unknown symbols get the padding row.
+
+        symbols: Iterable[str]
+        """
+        missing = len(self.prices)
+        return np.fromiter(
+            (self.index.get(symbol, missing) for symbol in symbols), dtype=np.intp
+        )
+
+    def value(self, holdings: list[tuple[str, float]]) -> float:
+        """Returns the total value of a list of symbols and amounts.
+
+        holdings: list[tuple[str, float]]
+        """
+        if not holdings:
+            return 0
+        symbols, totals = zip(*holdings)
+        owners = np.zeros(len(totals), dtype=np.intp)
+        return float(self.totals(owners, self.rows(symbols), np.array(totals), 1)[0])
+
+    def totals(self, owners: np.ndarray, rows: np.ndarray, totals: np.ndarray, size):
+        """Sums the value of holdings per owner.
+
+        owners: np.ndarray
+            The index of the owner of each holding.
+        rows: np.ndarray
+            The price row of each holding.
+        totals: np.ndarray
+            The amount of each holding.
+        size: int
+            The number of owners.
+        """
+        # bincount adds in holding order so sums match a plain python sum
+        return np.bincount(owners, weights=totals * self.padded[rows], minlength=size)
+
+
+def stock_row(symbol: str, data: dict) -> tuple[str, float, float, float]:
+    """Returns the price table row of stock data.
+
+    symbol: str
+    data: dict
+    """
+    return (
+        symbol,
+        to_float(data.get("price")),
+        to_float(data.get("change")),
+        to_float(data.get("%change")),
+    )
+
+
+def crypto_row(symbol: str, data: dict) -> tuple[str, float, float, float]:
+    """Returns the price table row of crypto data.
+
+    symbol: str
+    data: dict
+    """
+    price = to_float(data.get("price"))
+    pct_change = to_float(data.get("change_24h"))
+    change = price - price / (1 + pct_change / 100) if pct_change > -100 else 0.0
+    return symbol, price, change, pct_change
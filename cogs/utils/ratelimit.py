@@ -0,0 +1,141 @@
+"""Rate limiting in bounded memory for the anti spam.
+
+Counts are kept over sliding windows approximated from two fixed ones,
+the count of the previous window is weighted by how much of it still
+overlaps the sliding window. That makes every counter three numbers and
+every check O(1).
+
+Counters per member are kept in an LRU capped to a number of members.
+Message contents are never stored, they are hashed into a count-min
+sketch which estimates how often each was sent from a fixed size table
+no matter how many unique messages there are. Estimates can only be too
+high, the table is sized so that stays under a count even during raids.
+"""
+
+from array import array
+from collections import OrderedDict
+
+
+class SlidingWindow:
+    """Counts hits per key over the last per seconds.
+
+    rate: int
+        How many hits in a window are allowed.
+    per: float
+        The length of the window in seconds.
+    maxsize: int
+        How many keys are tracked, the least recently hit are dropped.
+    """
+
+    def __init__(self, rate: int, per: float, maxsize: int = 20_000):
+        self.rate = rate
+        self.per = per
+        self.maxsize = maxsize
+        self.counters = OrderedDict()
+
+    def __len__(self):
+        return len(self.counters)
+
+    def hit(self, key, now: float, amount: int = 1) -> bool:
+        """Adds amount hits to key, returning if it is over the rate.
+
+        key: Hashable
+        now: float
+            A timestamp in seconds.
+        amount: int
+        """
+        window, elapsed = divmod(now, self.per)
+
+        if (counter := self.counters.get(key)) is None:
+            counter = self.counters[key] = [window, 0, 0]
+
+            if len(self.counters) > self.maxsize:
+                self.counters.popitem(last=False)
+        else:
+            self.counters.move_to_end(key)
+
+            # Timestamps from before the current window are counted in it
+            if window == counter[0] + 1:
+                counter[:] = window, counter[2], 0
+            elif window > counter[0]:
+                counter[:] = window, 0, 0
+
+        counter[2] += amount
+        weight = max(1 - elapsed / self.per, 0) if window == counter[0] else 1
+
+        return counter[1] * weight + counter[2] > self.rate
+
+
+class SlidingSketch:
+    """Estimates hits per key over the last per seconds in fixed memory.
+
+    rate: int
+        How many hits in a window are allowed.
+    per: float
+        The length of the window in seconds.
+    width: int
+        The counters in each row, a power of two.
+    depth: int
+        The rows, each indexed by a different hash of a key.
+    """
+
+    def __init__(self, rate: int, per: float, width: int = 1 << 16, depth: int = 4):
+        self.rate = rate
+        self.per = per
+        self.mask = width - 1
+        self.width = width
+        self.depth = depth
+
+        self.window = 0.0
+        self.current = self.table()
+        self.previous = self.table()
+
+    def table(self) -> array:
+        return array("I", bytes(4 * self.width * self.depth))
+
+    def indexes(self, key) -> list[int]:
+        """Returns the counter of key in each row using double hashing."""
+        value = hash(key)
+        first = value & 0xFFFFFFFF
+        second = (value >> 32) | 1
+
+        return [
+            row * self.width + ((first + row * second) & self.mask)
+            for row in range(self.depth)
+        ]
+
+    def rotate(self, window: float):
+        if window == self.window + 1:
+            self.previous = self.current
+            self.current = self.table()
+        else:
+            self.previous = self.table()
+            self.current = self.table()
+
+        self.window = window
+
+    def hit(self, key, now: float, amount: int = 1) -> bool:
+        """Adds amount hits to key, returning if it is over the rate.
+
+        key: Hashable
+        now: float
+            A timestamp in seconds.
+        amount: int
+        """
+        window, elapsed = divmod(now, self.per)
+
+        if window > self.window:
+            self.rotate(window)
+
+        weight = max(1 - elapsed / self.per, 0) if window == self.window else 1
+        current, previous = self.current, self.previous
+        estimate = None
+
+        for index in self.indexes(key):
+            current[index] += amount
+            count = previous[index] * weight + current[index]
+
+            if estimate is None or count < estimate:
+                estimate = count
+
+        return estimate > self.rate
@@ -0,0 +1,167 @@
+"""A persistent scheduler for delayed actions.
+
+Jobs are stored in the db under keys starting with their deadline so
+the db keeps them in time order, adding a job is a single put and the
+next job is always the first key. One task sleeps until the next
+deadline or until an earlier job is scheduled.
+
+A job is only deleted once its handler returns so jobs run at least
+once, a job interrupted by a crash or restart runs again on the next
+start.
+"""
+
+import asyncio
+import secrets
+import time
+import traceback
+
+import orjson
+
+RETRY_INTERVAL = 60
+STOP_TIMEOUT = 10
+
+
+class Scheduler:
+    """Runs handlers for jobs once their deadline passes.
+
+    Handlers are registered by kind, jobs whose kind has no handler yet,
+    such as when a cog hasn't loaded, are retried every RETRY_INTERVAL
+    seconds instead of being dropped. Jobs whose handler raises are kept
+    and retried on the next start.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.handlers = {}
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.next_deadline = None
+        self.running = set()
+        self.running_keys = set()
+        self.failed = set()
+
+    def register(self, kind: str, handler):
+        """Sets the coroutine function that runs jobs of a kind.
+
+        kind: str
+        handler: Callable[[dict], Awaitable]
+            Called with the data the job was scheduled with.
+        """
+        self.handlers[kind] = handler
+        # Jobs of this kind may already be due
+        self.wakeup.set()
+
+    def schedule(self, kind: str, when: float, data: dict) -> str:
+        """Schedules a job returning its key.
+
+        kind: str
+        when: float
+            When to run the job as a unix timestamp.
+        data: dict
+        """
+        deadline = int(when * 1000)
+        key = f"{deadline:013d}-{kind}-{secrets.token_hex(4)}"
+        self.db.put(key.encode(), orjson.dumps(data))
+
+        if self.next_deadline is None or deadline < self.next_deadline:
+            self.wakeup.set()
+
+        return key
+
+    def cancel(self, key: str):
+        """Cancels a job.
+
+        key: str
+        """
+        self.db.delete(key.encode())
+
+    def jobs(self, kind: str = None):
+        """Yields the deadline, kind, data and key of pending jobs in order.
+
+        kind: str
+            Only yield jobs of this kind.
+        """
+        for key, data in self.db:
+            deadline, job_kind, _ = key.decode().split("-", 2)
+
+            if kind is None or job_kind == kind:
+                yield int(deadline) / 1000, job_kind, orjson.loads(data), key.decode()
+
+    def start(self):
+        if not self.task or self.task.done():
+            self.failed.clear()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops scheduling jobs and waits up to STOP_TIMEOUT seconds for
+        running ones, the rest are cancelled and run again on the next start."""
+        if self.task:
+            self.task.cancel()
+
+        if self.running:
+            _, pending = await asyncio.wait(self.running, timeout=STOP_TIMEOUT)
+
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def run_job(self, key: bytes, handler, data: dict):
+        try:
+            await handler(data)
+        except Exception:
+            traceback.print_exc()
+            self.failed.add(key)
+        else:
+            self.db.delete(key)
+        finally:
+            self.running_keys.discard(key)
+
+    def run_due(self, now: bytes) -> bool:
+        """Starts every job before now returning whether any were left
+        because their kind has no handler.
+
+        now: bytes
+            The current time as a deadline key.
+        """
+        skipped = False
+
+        for key, data in self.db.iterator(stop=now):
+            if key in self.running_keys or key in self.failed:
+                continue
+
+            kind = key.split(b"-", 2)[1].decode()
+
+            if not (handler := self.handlers.get(kind)):
+                skipped = True
+                continue
+
+            self.running_keys.add(key)
+            task = asyncio.create_task(self.run_job(key, handler, orjson.loads(data)))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+        return skipped
+
+    async def run(self):
+        """Sleeps until the next deadline and runs the jobs that are due."""
+        while True:
+            self.wakeup.clear()
+
+            now = time.time()
+            now_key = f"{int(now * 1000) + 1:013d}".encode()
+
+            skipped = self.run_due(now_key)
+            timeout = RETRY_INTERVAL if skipped else None
+
+            first = next(self.db.iterator(start=now_key, include_value=False), None)
+            self.next_deadline = None
+
+            if first:
+                self.next_deadline = int(first.split(b"-", 1)[0])
+                delay = max(self.next_deadline / 1000 - now, 0)
+                timeout = delay if timeout is None else min(timeout, delay)
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,159 @@
+"""Detects the event loop being blocked and what blocked it.
+
+A task on the loop records a heartbeat every interval while a thread
+checks how long ago the last one was. Once the loop has been stuck for
+longer than the threshold the thread grabs the stack of the loop's
+thread, which is the code doing the blocking, and attributes it to the
+cog and the command or listener it was in.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+class Stall:
+    __slots__ = ("id", "started", "duration", "cog", "source", "stack")
+
+    def __init__(
+        self, id: int, started: float, cog: str, source: str, stack: list[str]
+    ):
+        self.id = id
+        self.started = started
+        self.duration = None
+        self.cog = cog
+        self.source = source
+        self.stack = stack
+
+
+def attribute(frame) -> tuple[str, str]:
+    """Returns the cog and the command or listener a frame is running in.
+
+    frame: types.FrameType
+        The innermost frame of the loop's thread.
+    """
+    cog = source = None
+
+    while frame:
+        module = frame.f_globals.get("__name__", "")
+
+        if module.startswith("cogs.") and not module.startswith("cogs.utils"):
+            cog = cog or module.removeprefix("cogs.")
+            # The outermost cog frame is the command or listener
+            source = frame.f_code.co_name
+
+            ctx = frame.f_locals.get("ctx")
+            if command := getattr(ctx, "command", None):
+                return cog, command.qualified_name
+
+        frame = frame.f_back
+
+    return cog or "unknown", source or "unknown"
+
+
+class Watchdog:
+    """Records stalls of an event loop longer than threshold seconds.
+
+    threshold: float
+    interval: float
+        How often the heartbeat is recorded.
+    size: int
+        How many stalls are kept, each is numbered from one so it keeps its
+        number as older ones are dropped.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, size: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=size)
+        self.count = 0
+
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.last_beat = 0.0
+        self.current = None
+
+        self.task = None
+        self.thread = None
+        self.thread_id = None
+        self.stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def get(self, stall_id: int) -> Stall | None:
+        """Returns a kept stall by its number.
+
+        stall_id: int
+        """
+        # Copied as the watch thread may append while this iterates
+        for stall in list(self.stalls):
+            if stall.id == stall_id:
+                return stall
+        return None
+
+    def start(self):
+        """Starts watching the running loop."""
+        if self.running:
+            return
+
+        self.thread_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.stopped.clear()
+
+        self.task = asyncio.create_task(self.beat())
+        self.thread = threading.Thread(target=self.watch, name="watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def beat(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.last_beat = time.perf_counter()
+
+            self.lag = self.last_beat - start - self.interval
+            self.max_lag = max(self.max_lag, self.lag)
+
+            if self.current:
+                self.current.duration = self.lag
+                self.current = None
+
+    def watch(self):
+        while not self.stopped.wait(self.interval / 2):
+            blocked = time.perf_counter() - self.last_beat - self.interval
+
+            if blocked < self.threshold or self.current:
+                continue
+
+            last_beat = self.last_beat
+            frame = sys._current_frames().get(self.thread_id)
+
+            if frame is None:
+                continue
+
+            cog, source = attribute(frame)
+            stack = traceback.format_list(traceback.extract_stack(frame, limit=25))
+            del frame
+
+            # The loop got unstuck while the stack was being captured
+            if self.last_beat != last_beat:
+                continue
+
+            self.count += 1
+            self.current = Stall(self.count, time.time(), cog, source, stack)
+            self.stalls.append(self.current)
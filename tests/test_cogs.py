@@ -2,12 +2,15 @@ import asyncio
 import datetime
 import os
 import re
+import time
 import unittest
+import unittest.mock
 
 import aiohttp
 
 import tests.helpers as helpers
 from bot import Bot
+from cogs import music
 from cogs.animals import animals
 from cogs.apis import apis
 from cogs.compsci import compsci
@@ -1203,6 +1206,27 @@ class ModerationCogTests(unittest.IsolatedAsyncioTestCase):
             context.send.call_args.kwargs["embed"].color.value, 10038562
         )
 
+    async def test_end_poll_announces_the_winner_once(self):
+        bot.DB.add_poll(1, 2, 3, {"1\N{COMBINING ENCLOSING KEYCAP}": "Cat"}, "job")
+        bot.DB.add_vote(1, 3, "1\N{COMBINING ENCLOSING KEYCAP}")
+
+        reply = unittest.mock.AsyncMock()
+        channel = unittest.mock.MagicMock()
+        channel.get_partial_message.return_value.reply = reply
+
+        with unittest.mock.patch.object(
+            bot, "get_channel", return_value=channel
+        ) as get_channel:
+            self.assertEqual(
+                await self.cog.end_poll(1, 3), "1\N{COMBINING ENCLOSING KEYCAP}"
+            )
+            self.assertIsNone(await self.cog.end_poll(1, 3))
+
+        get_channel.assert_called_once_with(2)
+        reply.assert_awaited_once_with(
+            "Winner of the poll was 1\N{COMBINING ENCLOSING KEYCAP}"
+        )
+
     async def test_timeout_command(self):
         context = helpers.MockContext()
 
@@ -1235,7 +1259,157 @@ class ModerationCogTests(unittest.IsolatedAsyncioTestCase):
 
 
 class MusicCogTests(unittest.IsolatedAsyncioTestCase):
-    pass
+    def song(self, stream_url: str | None, duration: int = 600) -> music.Song:
+        song = music.Song(
+            helpers.MockContext(),
+            {
+                "webpage_url": "https://www.youtube.com/watch?v=a",
+                "title": "Song",
+                "duration": duration,
+            },
+        )
+
+        if stream_url:
+            song.stream_url = stream_url
+            song.expires = music.stream_expiry(stream_url)
+        return song
+
+    @staticmethod
+    def entry(video_id: str, duration: int | None = 600, **info) -> dict:
+        """Returns a flat playlist entry like yt-dlp's."""
+        return {
+            "_type": "url",
+            "ie_key": "Youtube",
+            "id": video_id,
+            "url": f"https://www.youtube.com/watch?v={video_id}",
+            "title": video_id,
+            "duration": duration,
+            "channel": "Channel",
+            "thumbnails": [{"url": "small.jpg"}, {"url": "large.jpg"}],
+            **info,
+        }
+
+    def test_song_from_a_playlist_entry(self):
+        song = music.YTDLSource.create_song(helpers.MockContext(), self.entry("a"))
+
+        self.assertEqual(song.url, "https://www.youtube.com/watch?v=a")
+        self.assertEqual(song.uploader, "Channel")
+        self.assertEqual(song.thumbnail, "large.jpg")
+        self.assertEqual(song.duration, 600)
+        self.assertIsNone(song.stream_url)
+        self.assertTrue(song.expiring())
+
+    def test_create_songs_does_not_extract(self):
+        entries = [
+            self.entry("a"),
+            self.entry("live", None),
+            self.entry("b"),
+            self.entry("premiere", 600, live_status="is_upcoming"),
+            self.entry("c"),
+        ]
+
+        with unittest.mock.patch.object(
+            music.YTDLSource, "ytdl"
+        ) as ytdl, unittest.mock.patch.object(music.YTDLSource, "extract") as extract:
+            songs, skipped = music.YTDLSource.create_songs(
+                helpers.MockContext(), entries
+            )
+
+        self.assertEqual([song.title for song in songs], ["a", "b", "c"])
+        self.assertEqual(skipped, 2)
+        self.assertEqual(ytdl.method_calls, [])
+        extract.assert_not_called()
+
+    def test_stream_expiry(self):
+        self.assertEqual(
+            music.stream_expiry(
+                "https://a.googlevideo.com/videoplayback?expire=123&x=1"
+            ),
+            123,
+        )
+        self.assertEqual(
+            music.stream_expiry("https://manifest.googlevideo.com/expire/456/ei/x"),
+            456,
+        )
+
+        for stream_url in ("https://example.com/song.mp3", None):
+            with self.subTest(stream_url=stream_url):
+                self.assertAlmostEqual(
+                    music.stream_expiry(stream_url),
+                    time.time() + music.STREAM_TTL,
+                    delta=5,
+                )
+
+    def test_expiring(self):
+        now = int(time.time())
+        song = self.song(f"https://a.googlevideo.com/videoplayback?expire={now + 900}")
+
+        self.assertFalse(song.expiring())
+        self.assertTrue(song.expiring(delay=300))
+
+        song.start = 300
+        self.assertFalse(song.expiring(delay=300))
+
+        self.assertTrue(self.song(f"https://a/?expire={now + 600}").expiring())
+        self.assertTrue(self.song(None).expiring())
+
+    async def test_extract_rejects_livestreams(self):
+        loop = asyncio.get_running_loop()
+
+        for info in (
+            {"webpage_url": "https://www.youtube.com/watch?v=a", "duration": None},
+            {"webpage_url": "https://www.youtube.com/watch?v=a", "is_live": True},
+            {"entries": [{"id": "a", "duration": None}]},
+        ):
+            with self.subTest(info=info), unittest.mock.patch.object(
+                music.YTDLSource.ytdl, "extract_info", return_value=info
+            ):
+                with self.assertRaises(music.YTDLError):
+                    await music.YTDLSource.extract(
+                        {"webpage_url": "https://www.youtube.com/watch?v=a"}, loop=loop
+                    )
+
+    async def test_first_resolve_extracts_the_stream(self):
+        song = music.YTDLSource.create_song(helpers.MockContext(), self.entry("a"))
+        stream_url = f"https://a/?expire={int(time.time()) + 3600}"
+
+        with unittest.mock.patch.object(
+            music.YTDLSource, "extract", return_value={"url": stream_url}
+        ) as extract:
+            self.assertEqual(await song.resolve(asyncio.get_running_loop()), stream_url)
+
+        extract.assert_called_once_with(
+            {"webpage_url": "https://www.youtube.com/watch?v=a"},
+            loop=asyncio.get_running_loop(),
+        )
+        self.assertFalse(song.expiring())
+
+    async def test_resolve_keeps_a_lasting_stream(self):
+        stream_url = f"https://a/?expire={int(time.time()) + 3600}"
+        song = self.song(stream_url)
+
+        with unittest.mock.patch.object(music.YTDLSource, "extract") as extract:
+            self.assertEqual(await song.resolve(asyncio.get_running_loop()), stream_url)
+
+        extract.assert_not_called()
+
+    async def test_resolve_refreshes_an_expiring_stream_once(self):
+        song = self.song(f"https://a/?expire={int(time.time())}")
+        fresh = f"https://a/?expire={int(time.time()) + 3600}"
+
+        async def extract(data, *, loop):
+            await asyncio.sleep(0.01)
+            return {"url": fresh}
+
+        with unittest.mock.patch.object(
+            music.YTDLSource, "extract", side_effect=extract
+        ) as mock:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(song.resolve(loop), song.resolve(loop))
+
+        self.assertEqual(results, [fresh, fresh])
+        self.assertEqual(mock.call_count, 1)
+        self.assertFalse(song.expiring())
 
 
 class OwnerCogTests(unittest.IsolatedAsyncioTestCase):
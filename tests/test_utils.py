@@ -0,0 +1,1703 @@
+import asyncio
+import ast
+import difflib
+import gzip
+import pathlib
+import tempfile
+import threading
+import time
+import types
+import unittest
+import unittest.mock
+from decimal import Decimal
+
+import orjson
+
+from cogs.utils import (
+    backup,
+    cache,
+    calculation,
+    codec,
+    database,
+    fuzzy,
+    http,
+    jsonstream,
+    metrics,
+    ratelimit,
+    scheduler,
+)
+from cogs.utils.database import MISSING, Database, LRUCache
+from cogs.utils.policy import GuildPolicy
+from cogs.utils.scheduler import Scheduler
+
+
+class Clock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def patch(self, module):
+        """Patches the time module of a module with this clock."""
+        return unittest.mock.patch.object(
+            module,
+            "time",
+            types.SimpleNamespace(
+                monotonic=self, perf_counter=time.perf_counter, time=time.time
+            ),
+        )
+
+
+class CodecTests(unittest.TestCase):
+    def test_int_round_trip(self):
+        for number in (0, 1, -1, 2**63 - 1, -(2**63)):
+            with self.subTest(number=number):
+                value = codec.encode_int(number)
+
+                self.assertFalse(codec.is_legacy(value))
+                self.assertEqual(codec.decode_int(value), number)
+
+    def test_decimal_round_trip(self):
+        for number in ("0", "0.00", "1", "-1", "12.50", "1000", "-0.01", "1E+50"):
+            with self.subTest(number=number):
+                value = codec.encode_decimal(Decimal(number))
+
+                self.assertFalse(codec.is_legacy(value))
+                self.assertEqual(codec.decode_decimal(value), Decimal(number))
+
+    def test_decimal_rejects_special_values(self):
+        for number in ("NaN", "Infinity"):
+            with self.subTest(number=number), self.assertRaises(ValueError):
+                codec.encode_decimal(Decimal(number))
+
+    def test_pair_round_trip(self):
+        value = codec.encode_pair(3, 4294967295)
+
+        self.assertFalse(codec.is_legacy(value))
+        self.assertEqual(codec.decode_pair(value), (3, 4294967295))
+
+    def test_legacy_fallback(self):
+        self.assertTrue(codec.is_legacy(b"150"))
+        self.assertEqual(codec.decode_int(b"-150"), -150)
+        self.assertEqual(codec.decode_decimal(b"12.34"), Decimal("12.34"))
+        self.assertEqual(codec.decode_pair(b"5:7"), (5, 7))
+
+    def test_display(self):
+        self.assertEqual(codec.display(codec.encode_int(5)), "5")
+        self.assertEqual(codec.display(codec.encode_decimal(Decimal("1.5"))), "1.5")
+        self.assertEqual(codec.display(codec.encode_pair(1, 2)), "1:2")
+        self.assertEqual(codec.display(b"legacy"), "legacy")
+
+    def test_sortable_round_trip(self):
+        for number in ("0", "0.01", "-0.01", "123.45", "-123.45", "1E+20"):
+            with self.subTest(number=number):
+                value = codec.encode_sortable(Decimal(number)) + b"rest"
+
+                self.assertEqual(
+                    codec.decode_sortable(value), (Decimal(number), b"rest")
+                )
+
+    def test_sortable_truncates_to_cents(self):
+        number, _ = codec.decode_sortable(codec.encode_sortable(Decimal("1.239")))
+        self.assertEqual(number, Decimal("1.23"))
+
+    def test_sortable_byte_order_matches_numeric_order(self):
+        numbers = [
+            Decimal(number)
+            for number in (
+                "-100000",
+                "-256",
+                "-255.99",
+                "-1",
+                "-0.01",
+                "0",
+                "0.01",
+                "2.55",
+                "2.56",
+                "655.36",
+                "100000",
+            )
+        ]
+        encoded = [codec.encode_sortable(number) for number in numbers]
+
+        self.assertEqual(sorted(encoded), encoded)
+
+
+class FakeContent:
+    """Stands in for an aiohttp.StreamReader of a body."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start : start + size]
+
+
+class JsonStreamTests(unittest.IsolatedAsyncioTestCase):
+    items = [
+        {"symbol": "A", "name": 'Quote " and {brace}', "price": 1.5},
+        {"symbol": "B", "nested": {"list": [1, {"deep": "]"}]}, "price": 2},
+        {"symbol": "C", "name": "Back\\slash \\", "price": None},
+    ]
+    body = orjson.dumps({"data": {"headers": {"name": "Name"}, "rows": items}})
+
+    def feed(self, size: int) -> list:
+        parser = jsonstream.ArrayParser(b"rows")
+        items = []
+
+        for start in range(0, len(self.body), size):
+            items += parser.feed(self.body[start : start + size])
+
+        return items
+
+    def test_parses_objects_at_every_chunk_size(self):
+        for size in (1, 2, 3, 7, len(self.body)):
+            with self.subTest(size=size):
+                self.assertEqual(self.feed(size), self.items)
+
+    def test_stops_at_the_end_of_the_array(self):
+        parser = jsonstream.ArrayParser(b"rows")
+
+        self.assertEqual(
+            parser.feed(b'{"rows": [{"a": 1}], "more": [{"b": 2}]}'), [{"a": 1}]
+        )
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.feed(b'{"c": 3}'), [])
+
+    def test_missing_key(self):
+        parser = jsonstream.ArrayParser(b"rows")
+
+        self.assertEqual(parser.feed(b'{"other": [{"a": 1}]}'), [])
+        self.assertFalse(parser.found)
+
+    async def test_iter_chunks(self):
+        chunks = [
+            chunk
+            async for chunk in jsonstream.iter_chunks(
+                FakeContent(self.body), b"rows", size=2, read_size=5
+            )
+        ]
+
+        self.assertEqual(chunks, [self.items[:2], self.items[2:]])
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Gives each test an empty Database in a temporary directory."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        self.DB = Database(str(self.path / "db"))
+
+    def tearDown(self):
+        self.DB.executor.shutdown()
+        self.DB.main.db.close()
+        self.directory.cleanup()
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2)
+        lru.put(b"a", b"1")
+        lru.put(b"b", b"2")
+        lru.get(b"a")
+        lru.put(b"c", b"3")
+
+        self.assertEqual(lru.get(b"a"), b"1")
+        self.assertIs(lru.get(b"b"), MISSING)
+        self.assertEqual(lru.evictions, 1)
+
+    def test_caches_missing_keys_but_not_large_values(self):
+        lru = LRUCache(max_value_size=4)
+        lru.put(b"missing", None)
+        lru.put(b"large", b"12345")
+
+        self.assertIsNone(lru.get(b"missing"))
+        self.assertIs(lru.get(b"large"), MISSING)
+
+    def test_stats(self):
+        lru = LRUCache()
+        lru.put(b"a", b"1")
+        lru.get(b"a")
+        lru.get(b"b")
+
+        stats = lru.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+
+class CachedDBTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = self.DB.cache
+        self.DB.karma.put(b"1", b"old")
+        self.assertEqual(self.DB.karma.get(b"1"), b"old")
+
+    def cached(self, key: bytes):
+        return self.cache.data.get(key, MISSING)
+
+    def test_get_reads_through_the_cache(self):
+        hits = self.cache.hits
+        self.assertEqual(self.DB.karma.get(b"1"), b"old")
+        self.assertEqual(self.cache.hits, hits + 1)
+
+        self.assertEqual(self.DB.karma.get(b"2", b"default"), b"default")
+        self.assertIsNone(self.cached(b"karma-2"))
+
+    def test_put_and_delete_invalidate(self):
+        self.DB.karma.put(b"1", b"new")
+        self.assertIs(self.cached(b"karma-1"), MISSING)
+        self.assertEqual(self.DB.karma.get(b"1"), b"new")
+
+        self.DB.karma.delete(b"1")
+        self.assertIsNone(self.DB.karma.get(b"1"))
+
+    def test_prefixed_and_main_dbs_share_keys(self):
+        self.DB.main.put(b"karma-1", b"new")
+        self.assertEqual(self.DB.karma.get(b"1"), b"new")
+
+        self.DB.karma.put(b"1", b"newer")
+        self.assertEqual(self.DB.main.get(b"karma-1"), b"newer")
+
+    def test_written_batches_invalidate(self):
+        with self.DB.karma.write_batch() as wb:
+            wb.put(b"1", b"new")
+            wb.put(b"2", b"new")
+        self.assertEqual(self.DB.karma.get(b"1"), b"new")
+
+        wb = self.DB.main.write_batch()
+        wb.delete(b"karma-1")
+        wb.write()
+        self.assertIsNone(self.DB.karma.get(b"1"))
+
+    def test_unwritten_batches_do_not_invalidate(self):
+        generation = self.cache.generation
+
+        wb = self.DB.karma.write_batch()
+        wb.put(b"1", b"new")
+        self.assertEqual(self.DB.karma.get(b"1"), b"old")
+
+        wb.clear()
+        wb.write()
+        self.assertEqual(self.cached(b"karma-1"), b"old")
+        self.assertEqual(self.cache.generation, generation)
+
+    async def test_aget(self):
+        self.assertEqual(await self.DB.aget(b"1", self.DB.karma), b"old")
+        self.assertEqual(await self.DB.aget(b"2", self.DB.karma, b"0"), b"0")
+        self.assertIsNone(self.cached(b"karma-2"))
+
+    async def test_aget_does_not_cache_values_overwritten_while_read(self):
+        self.cache.clear()
+        run = self.DB.run
+
+        async def run_then_write(func, *args):
+            value = await run(func, *args)
+            self.DB.karma.put(b"1", b"new")
+            return value
+
+        with unittest.mock.patch.object(self.DB, "run", run_then_write):
+            self.assertEqual(await self.DB.aget(b"1", self.DB.karma), b"old")
+
+        self.assertIs(self.cached(b"karma-1"), MISSING)
+        self.assertEqual(await self.DB.aget(b"1", self.DB.karma), b"new")
+
+
+class CounterBufferTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.counters = self.DB.counters
+
+    def test_pending_increments_are_counted(self):
+        self.DB.add_karma(1, 3)
+        self.DB.add_karma(1, -1)
+        self.DB.add_message_count(10, 1)
+        self.DB.add_message_count(10, 1)
+
+        self.assertIsNone(self.DB.karma.get(b"1"))
+        self.assertEqual(self.DB.get_karma(1), 2)
+        self.assertEqual(self.counters.get(self.DB.message_count, b"10-1"), 2)
+        self.assertEqual(len(self.counters), 2)
+
+    def test_flush(self):
+        self.DB.add_karma(1, 3)
+        self.DB.add_message_count(10, 1)
+        self.counters.flush()
+
+        self.assertEqual(len(self.counters), 0)
+        self.assertEqual(self.DB.karma.get(b"1"), codec.encode_int(3))
+        self.assertEqual(self.DB.message_count.get(b"10-1"), codec.encode_int(1))
+
+        self.DB.add_karma(1, 2)
+        self.counters.flush()
+        self.assertEqual(self.DB.get_karma(1), 5)
+
+    def test_flush_adds_to_legacy_values(self):
+        self.DB.karma.put(b"1", b"5")
+        self.DB.karma.put(b"2", b"-5")
+        self.DB.add_karma(1, 3)
+        self.DB.add_karma(2, 1)
+
+        self.assertEqual(self.DB.get_karma(1), 8)
+        self.counters.flush()
+
+        self.assertEqual(self.DB.karma.get(b"1"), codec.encode_int(8))
+        self.assertEqual(self.DB.karma.get(b"2"), codec.encode_int(-4))
+
+    def test_flushes_once_the_interval_passes(self):
+        self.DB.add_karma(1, 1)
+        self.assertEqual(len(self.counters), 1)
+
+        self.counters.last_flush -= self.counters.flush_interval
+        self.DB.add_karma(1, 1)
+
+        self.assertEqual(len(self.counters), 0)
+        self.assertEqual(self.DB.karma.get(b"1"), codec.encode_int(2))
+
+    def test_paused(self):
+        self.counters.paused = True
+        self.DB.add_karma(1, 3)
+        self.counters.last_flush -= self.counters.flush_interval
+        self.DB.add_karma(1, 1)
+        self.counters.flush()
+
+        self.assertIsNone(self.DB.karma.get(b"1"))
+        self.assertEqual(self.DB.get_karma(1), 4)
+
+        self.counters.paused = False
+        self.counters.flush()
+        self.assertEqual(self.DB.karma.get(b"1"), codec.encode_int(4))
+
+
+class BalanceIndexTests(DatabaseTestCase):
+    BALANCES = {
+        b"1": Decimal("1000"),
+        b"2": Decimal("-250.5"),
+        b"3": Decimal("0.01"),
+        b"4": Decimal("123456789012.34"),
+        b"5": Decimal("-0.01"),
+        b"6": Decimal("0"),
+        b"7": Decimal("99.999"),
+    }
+
+    def index(self) -> list:
+        return list(self.DB.balindex.iterator(include_value=False))
+
+    def expected(self) -> list:
+        return [
+            (member_id, int(balance * 100) / Decimal(100))
+            for member_id, balance in sorted(
+                self.BALANCES.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+
+    def test_baltop_order(self):
+        for member_id, balance in self.BALANCES.items():
+            self.DB.put_bal(member_id, balance)
+
+        self.assertEqual(list(self.DB.get_baltop()), self.expected())
+
+    def test_one_row_per_member(self):
+        for member_id, balance in self.BALANCES.items():
+            self.DB.put_bal(member_id, balance * 3)
+            self.DB.put_bal(member_id, balance)
+
+        for _ in range(3):
+            self.DB.add_bal(b"3", 0.1)
+            self.DB.add_bal(b"7", 1 / 3)
+        self.BALANCES[b"3"] = self.DB.get_bal(b"3")
+        self.BALANCES[b"7"] = self.DB.get_bal(b"7")
+
+        self.assertEqual(len(self.index()), len(self.BALANCES))
+        self.assertEqual(list(self.DB.get_baltop()), self.expected())
+
+    def test_legacy_balances(self):
+        self.DB.bal.put(b"1", b"1000.5")
+        self.DB.rebuild_bal_index()
+        self.DB.put_bal(b"1", Decimal(5))
+
+        self.assertEqual(list(self.DB.get_baltop()), [(b"1", Decimal(5))])
+
+    def test_rebuild_matches_incremental(self):
+        for member_id, balance in self.BALANCES.items():
+            self.DB.put_bal(member_id, balance + 1)
+            self.DB.put_bal(member_id, balance)
+        incremental = self.index()
+
+        self.DB.balindex.put(codec.encode_sortable(Decimal(5)) + b"stale", b"")
+        self.DB.rebuild_bal_index()
+
+        self.assertEqual(self.index(), incremental)
+        self.assertEqual(self.DB.main.get(b"balindex_built"), b"1")
+
+
+class HistoryTests(DatabaseTestCase):
+    def add(self, timestamp: int, value: bytes, member_id: int = 2):
+        self.DB.add_history(self.DB.deleted, 1, member_id, timestamp, value)
+
+    def history(self, member_id: int = 2, amount: int = None) -> list:
+        return list(self.DB.get_history(self.DB.deleted, 1, member_id, amount))
+
+    def test_newest_first(self):
+        for timestamp in (2000, 1000, 3000):
+            self.add(timestamp, str(timestamp).encode())
+
+        self.assertEqual(
+            self.history(), [(3000, b"3000"), (2000, b"2000"), (1000, b"1000")]
+        )
+        self.assertEqual(self.history(amount=2), [(3000, b"3000"), (2000, b"2000")])
+        self.assertEqual(self.history(member_id=3), [])
+
+    def test_same_millisecond(self):
+        for value in (b"a", b"b", b"c"):
+            self.add(1000, value)
+
+        history = self.history()
+        self.assertEqual(len(history), 3)
+        self.assertEqual({value for _, value in history}, {b"a", b"b", b"c"})
+        self.assertEqual({timestamp for timestamp, _ in history}, {1000})
+
+    @unittest.mock.patch.object(database, "HISTORY_LIMIT", 10)
+    def test_trims_to_the_limit(self):
+        for timestamp in range(11):
+            self.add(timestamp, b"x")
+        self.assertEqual(len(self.history()), 11)
+
+        self.add(11, b"x")
+        self.assertEqual(
+            [timestamp for timestamp, _ in self.history()], [*range(11, 1, -1)]
+        )
+
+        # Counted again from the db once forgotten
+        self.DB.history_counts.clear()
+        for timestamp in range(12, 14):
+            self.add(timestamp, b"x")
+        self.assertEqual(len(self.history()), 10)
+
+    @unittest.mock.patch.object(database, "HISTORY_COUNTS", 2)
+    def test_counts_are_bounded(self):
+        for member_id in range(3):
+            self.add(1000, b"x", member_id)
+
+        self.assertEqual(len(self.DB.history_counts), 2)
+        self.assertNotIn(self.DB.deleted.prefix + b"1-0-", self.DB.history_counts)
+
+    def test_migrates_legacy_history(self):
+        self.DB.deleted.put(b"1-2", orjson.dumps({"1": "old", "2": ["a", "b"]}))
+        self.add(3000, b"new")
+
+        self.assertEqual(
+            self.history(),
+            [(3000, b"new"), (2000, orjson.dumps(["a", "b"])), (1000, b"old")],
+        )
+        self.assertIsNone(self.DB.deleted.get(b"1-2"))
+
+
+class PollTests(DatabaseTestCase):
+    OPTIONS = {
+        "1\N{COMBINING ENCLOSING KEYCAP}": "Cat",
+        "2\N{COMBINING ENCLOSING KEYCAP}": "Dog",
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.cat, self.dog = self.OPTIONS
+        self.DB.add_poll(1, 2, 3, self.OPTIONS, "job")
+
+    def keys(self) -> list:
+        return list(self.DB.polls.iterator(include_value=False))
+
+    def test_add_poll(self):
+        self.assertEqual(
+            self.DB.get_poll(1, 3),
+            {"channel": 2, "options": self.OPTIONS, "job": "job"},
+        )
+        self.assertIsNone(self.DB.get_poll(1, 4))
+
+    def test_votes(self):
+        for emoji in (self.cat, self.dog, self.cat):
+            self.DB.add_vote(1, 3, emoji)
+
+        # Other reactions and messages aren't counted
+        self.DB.add_vote(1, 3, "\N{THUMBS UP SIGN}")
+        self.DB.add_vote(1, 4, self.cat)
+        self.DB.counters.flush()
+        self.DB.add_vote(1, 3, self.dog)
+
+        self.assertEqual(self.DB.end_poll(1, 3), {self.cat: 2, self.dog: 2})
+
+    def test_changing_a_vote(self):
+        self.DB.add_vote(1, 3, self.cat)
+        self.DB.add_vote(1, 3, self.cat, -1)
+        self.DB.add_vote(1, 3, self.dog)
+
+        self.assertEqual(self.DB.end_poll(1, 3), {self.cat: 0, self.dog: 1})
+
+    def test_end_poll_once(self):
+        self.DB.add_poll(1, 2, 4, self.OPTIONS, "other")
+        self.DB.add_vote(1, 3, self.cat)
+        self.DB.counters.flush()
+        self.DB.add_vote(1, 3, self.dog)
+        self.DB.add_vote(1, 4, self.dog)
+
+        self.assertEqual(self.DB.end_poll(1, 3), {self.cat: 1, self.dog: 1})
+        self.assertIsNone(self.DB.end_poll(1, 3))
+        self.assertIsNone(self.DB.get_poll(1, 3))
+
+        # Only the other poll and its vote are left
+        self.assertEqual(self.keys(), [b"1-4", f"1-4-{self.dog}".encode()])
+        self.assertEqual(self.DB.end_poll(1, 4), {self.cat: 0, self.dog: 1})
+        self.assertEqual(self.keys(), [])
+
+
+class BackupsTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backups = backup.Backups(self.DB, self.path / "backup", full_every=3)
+
+    def state(self) -> dict:
+        return {
+            key: value for key, value in self.DB.main.db if not backup.is_excluded(key)
+        }
+
+    def records(self, path: pathlib.Path) -> tuple[bytes, list]:
+        with gzip.open(path, "rb") as file:
+            header = file.read(len(backup.MAGIC) + 1)
+            return header, list(backup.read_records(file))
+
+    def test_create_full(self):
+        self.DB.main.put(b"a", b"1")
+        self.DB.main.put(b"stocks-AAPL", b"excluded")
+
+        path = self.backups.create()
+        header, records = self.records(path)
+
+        self.assertEqual(path.name, "0.full.gz")
+        self.assertEqual(header, backup.MAGIC + backup.FULL)
+        self.assertIn((backup.PUT, b"a", b"1"), records)
+        self.assertNotIn(b"stocks-AAPL", [key for _, key, _ in records])
+
+    def test_incremental_only_holds_changes(self):
+        self.DB.main.put(b"a", b"1")
+        self.DB.main.put(b"b", b"2")
+        self.backups.create()
+
+        self.DB.main.put(b"a", b"changed")
+        self.DB.main.delete(b"b")
+        self.DB.main.put(b"c", b"3")
+
+        path = self.backups.create()
+        header, records = self.records(path)
+
+        self.assertEqual(path.name, "1.incr.gz")
+        self.assertEqual(header, backup.MAGIC + backup.INCREMENTAL)
+        self.assertEqual(
+            records,
+            [
+                (backup.PUT, b"a", b"changed"),
+                (backup.DELETE, b"b", b""),
+                (backup.PUT, b"c", b"3"),
+            ],
+        )
+
+    def test_full_every(self):
+        for _ in range(4):
+            self.backups.create()
+
+        self.assertEqual(
+            [path.name for path in self.backups.backups().values()],
+            ["0.full.gz", "1.incr.gz", "2.incr.gz", "3.full.gz"],
+        )
+        self.assertEqual(len(self.backups.chain(2)), 3)
+        self.assertEqual(len(self.backups.chain(3)), 1)
+
+    def test_restore(self):
+        states = []
+
+        for number in range(5):
+            self.DB.main.put(f"key-{number}".encode(), b"new")
+            self.DB.main.put(b"key-0", str(number).encode())
+            self.DB.main.delete(f"key-{number - 2}".encode())
+            self.backups.create()
+            states.append(self.state())
+
+        self.DB.main.put(b"key-9", b"after")
+        self.DB.main.put(b"stocks-AAPL", b"excluded")
+
+        for number in (1, 4, 0, 2):
+            with self.subTest(number=number):
+                count = self.backups.restore(number, batch_size=2)
+
+                self.assertEqual(self.state(), states[number])
+                self.assertEqual(count, len(states[number]))
+                self.assertEqual(self.DB.main.db.get(b"stocks-AAPL"), b"excluded")
+
+    def test_restore_missing_backup(self):
+        with self.assertRaises(ValueError):
+            self.backups.restore(0)
+
+
+class SchedulerTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.scheduler = Scheduler(self.DB.schedule)
+        self.ran = []
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    async def handler(self, data: dict):
+        self.ran.append(data["n"])
+
+    async def restart(self) -> Scheduler:
+        """Stops the scheduler and starts a new one on the same db."""
+        await self.scheduler.stop()
+        self.scheduler = Scheduler(self.DB.schedule)
+        self.scheduler.register("test", self.handler)
+        self.scheduler.start()
+        return self.scheduler
+
+    async def wait_for(self, count: int):
+        for _ in range(100):
+            if len(self.ran) >= count:
+                return
+            await asyncio.sleep(0.01)
+
+    def test_jobs_are_in_deadline_order(self):
+        now = time.time()
+
+        for n in (3, 1, 2):
+            self.scheduler.schedule("test", now + n, {"n": n})
+
+        self.assertEqual(
+            [data["n"] for _, _, data, _ in self.scheduler.jobs("test")], [1, 2, 3]
+        )
+        self.assertEqual(list(self.scheduler.jobs("other")), [])
+
+    async def test_runs_due_jobs_in_order(self):
+        self.scheduler.register("test", self.handler)
+        now = time.time()
+
+        for n in (2, 0, 1):
+            self.scheduler.schedule("test", now - 10 + n, {"n": n})
+
+        self.scheduler.start()
+        await self.wait_for(3)
+
+        self.assertEqual(self.ran, [0, 1, 2])
+        self.assertEqual(list(self.scheduler.jobs()), [])
+
+    async def test_runs_future_and_earlier_jobs(self):
+        self.scheduler.register("test", self.handler)
+        self.scheduler.start()
+
+        self.scheduler.schedule("test", time.time() + 60, {"n": 1})
+        self.scheduler.schedule("test", time.time() + 0.05, {"n": 0})
+        await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+        self.assertEqual(len(list(self.scheduler.jobs())), 1)
+
+    async def test_cancel(self):
+        self.scheduler.register("test", self.handler)
+        key = self.scheduler.schedule("test", time.time() + 0.05, {"n": 0})
+        self.scheduler.cancel(key)
+
+        self.scheduler.start()
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(self.ran, [])
+
+    async def test_jobs_without_a_handler_are_retried(self):
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+        self.scheduler.start()
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(len(list(self.scheduler.jobs("test"))), 1)
+
+        self.scheduler.register("test", self.handler)
+        await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+        self.assertEqual(list(self.scheduler.jobs()), [])
+
+    @unittest.mock.patch.object(scheduler, "RETRY_INTERVAL", 0.05)
+    async def test_skipped_jobs_are_retried_every_interval(self):
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+        self.scheduler.start()
+        await asyncio.sleep(0.02)
+
+        # Added without waking the scheduler so only the retry runs it
+        self.scheduler.handlers["test"] = self.handler
+        await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+
+    async def test_failing_jobs_do_not_stop_the_scheduler(self):
+        async def fail(data):
+            raise RuntimeError
+
+        self.scheduler.register("fail", fail)
+        self.scheduler.register("test", self.handler)
+        now = time.time()
+        self.scheduler.schedule("fail", now - 2, {})
+        self.scheduler.schedule("test", now - 1, {"n": 0})
+
+        with unittest.mock.patch("traceback.print_exc"):
+            self.scheduler.start()
+            await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+
+    async def test_jobs_are_deleted_after_they_run(self):
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def slow(data):
+            started.set()
+            await finish.wait()
+            self.ran.append(data["n"])
+
+        self.scheduler.register("test", slow)
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+        self.scheduler.start()
+        await started.wait()
+
+        # Waking the scheduler doesn't start a running job again
+        self.assertEqual(len(list(self.scheduler.jobs("test"))), 1)
+        self.scheduler.wakeup.set()
+        await asyncio.sleep(0.02)
+        self.assertEqual(len(self.scheduler.running), 1)
+
+        finish.set()
+        await self.wait_for(1)
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.ran, [0])
+        self.assertEqual(list(self.scheduler.jobs()), [])
+        self.assertEqual(self.scheduler.running, set())
+
+    async def test_failed_jobs_run_again_after_a_restart(self):
+        async def fail(data):
+            raise RuntimeError
+
+        self.scheduler.register("test", fail)
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+
+        with unittest.mock.patch("traceback.print_exc") as print_exc:
+            self.scheduler.start()
+            await asyncio.sleep(0.05)
+
+        # Only tried once until the next start
+        print_exc.assert_called_once()
+        self.assertEqual(len(list(self.scheduler.jobs("test"))), 1)
+
+        await self.restart()
+        await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+
+    @unittest.mock.patch.object(scheduler, "STOP_TIMEOUT", 0.05)
+    async def test_cancelled_jobs_run_again_after_a_restart(self):
+        started = asyncio.Event()
+
+        async def hang(data):
+            started.set()
+            await asyncio.Event().wait()
+
+        self.scheduler.register("test", hang)
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+        self.scheduler.start()
+        await started.wait()
+
+        await self.scheduler.stop()
+        self.assertEqual(len(list(self.scheduler.jobs("test"))), 1)
+
+        await self.restart()
+        await self.wait_for(1)
+
+        self.assertEqual(self.ran, [0])
+
+    async def test_stop_waits_for_running_jobs(self):
+        started = asyncio.Event()
+
+        async def slow(data):
+            started.set()
+            await asyncio.sleep(0.05)
+            self.ran.append(data["n"])
+
+        self.scheduler.register("test", slow)
+        self.scheduler.schedule("test", time.time() - 1, {"n": 0})
+        self.scheduler.start()
+        await started.wait()
+        await self.scheduler.stop()
+
+        self.assertEqual(self.ran, [0])
+        self.assertEqual(list(self.scheduler.jobs()), [])
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = self.clock.patch(cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_namespace_ttl(self):
+        responses = cache.ResponseCache(ttls={"test": 10}, default_ttl=20)
+        responses.put("test-a", [1])
+        responses.put("other-a", [1])
+
+        self.clock.now += 9
+        self.assertIn("test-a", responses)
+
+        self.clock.now += 1
+        self.assertNotIn("test-a", responses)
+        self.assertIn("other-a", responses)
+        self.assertIs(responses.pop("test-a"), cache.MISSING)
+        self.assertEqual(responses.expirations, 1)
+
+        self.clock.now += 10
+        self.assertNotIn("other-a", responses)
+        self.assertEqual(responses.size, 0)
+
+    def test_purge_removes_expired_entries(self):
+        responses = cache.ResponseCache(ttls={"test": 10})
+        responses.put("test-a", [1])
+
+        self.clock.now += 60
+        responses.put("test-b", [1])
+
+        self.assertEqual(list(responses), ["test-b"])
+
+    def test_pop_takes_each_result_once(self):
+        responses = cache.ResponseCache()
+        responses.put("reddit-memes", [1, 2, 3])
+
+        self.assertEqual(
+            sorted(responses.pop_random("reddit-memes") for _ in range(3)), [1, 2, 3]
+        )
+        self.assertNotIn("reddit-memes", responses)
+        self.assertIs(responses.pop_random("reddit-memes"), cache.MISSING)
+        self.assertEqual(responses.size, 0)
+        self.assertEqual((responses.hits, responses.misses), (3, 1))
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        items = ["x" * 98] * 5
+        responses = cache.ResponseCache(max_bytes=1600)
+
+        for key in ("image-a", "image-b", "image-c"):
+            responses.put(key, items)
+
+        self.assertEqual(list(responses), ["image-a", "image-b", "image-c"])
+
+        responses.pop("image-a")
+        responses.put("image-d", items)
+
+        self.assertEqual(list(responses), ["image-c", "image-a", "image-d"])
+        self.assertLessEqual(responses.size, responses.max_bytes)
+        self.assertEqual(responses.evictions, 1)
+
+    def test_entries_over_the_budget_are_not_cached(self):
+        responses = cache.ResponseCache(max_bytes=100)
+        responses.put("image-a", ["x" * 200])
+
+        self.assertEqual(len(responses), 0)
+        self.assertEqual(responses.size, 0)
+
+    def test_put_replaces(self):
+        responses = cache.ResponseCache()
+        responses.put("urban-a", [1, 2])
+        size = responses.size
+        responses.put("urban-a", [3])
+
+        self.assertLess(responses.size, size)
+        self.assertEqual(responses.pop("urban-a"), 3)
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one(self):
+        flight = http.SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            call = calls
+            await asyncio.sleep(0.01)
+            return call
+
+        results = await asyncio.gather(
+            *(flight.do("a", fetch) for _ in range(5)), flight.do("b", fetch)
+        )
+
+        self.assertEqual(calls, 2)
+        self.assertEqual(results[:5], [1] * 5)
+        self.assertEqual(flight.shared, 4)
+        self.assertEqual(len(flight), 0)
+
+        self.assertEqual(await flight.do("a", fetch), 3)
+
+    async def test_cancelling_a_caller_keeps_the_call(self):
+        flight = http.SingleFlight()
+        event = asyncio.Event()
+
+        async def fetch():
+            await event.wait()
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("a", fetch))
+        second = asyncio.ensure_future(flight.do("a", fetch))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        event.set()
+
+        self.assertEqual(await second, "done")
+        self.assertTrue(first.cancelled())
+
+    async def test_errors_reach_every_caller(self):
+        flight = http.SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError
+
+        results = await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(len(flight), 0)
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = self.clock.patch(http)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_their_ttl(self):
+        responses = http.TTLCache()
+        responses.put("a", 1, 10)
+        responses.put("b", 2, 20)
+
+        self.clock.now += 10
+        self.assertIsNone(responses.get("a"))
+        self.assertEqual(responses.get("b"), 2)
+        self.assertEqual(len(responses), 1)
+
+    def test_no_ttl_is_not_cached(self):
+        responses = http.TTLCache()
+        responses.put("a", 1, 0)
+
+        self.assertEqual(responses.get("a", "default"), "default")
+
+    def test_maxsize_evicts_least_recently_used(self):
+        responses = http.TTLCache(maxsize=2)
+        responses.put("a", 1, 10)
+        responses.put("b", 2, 10)
+        responses.get("a")
+        responses.put("c", 3, 10)
+
+        self.assertIsNone(responses.get("b"))
+        self.assertEqual((responses.get("a"), responses.get("c")), (1, 3))
+
+    def test_max_age(self):
+        for headers, expected in (
+            ({}, 0),
+            ({"Cache-Control": "public, max-age=30"}, 30),
+            ({"Cache-Control": "s-maxage=20"}, 20),
+            ({"Cache-Control": 'max-age="45"'}, 45),
+            ({"Cache-Control": "max-age=3600"}, 60),
+            ({"Cache-Control": "max-age=30", "Age": "25"}, 5),
+            ({"Cache-Control": "no-cache, max-age=30"}, 0),
+            ({"Cache-Control": "private, max-age=30"}, 0),
+            ({"Cache-Control": "no-store"}, 0),
+        ):
+            with self.subTest(headers=headers):
+                self.assertEqual(http.max_age(headers), expected)
+
+        self.assertEqual(http.max_age({"Cache-Control": "max-age=600"}, 300), 300)
+        self.assertLessEqual(
+            http.max_age({"Cache-Control": "max-age=30", "Age": "40"}), 0
+        )
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = self.clock.patch(http)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.breaker = http.CircuitBreaker(
+            "example.com", window=60, min_requests=4, open_for=5, max_open_for=15
+        )
+
+    def fail(self, times: int):
+        for _ in range(times):
+            self.breaker.before_request()
+            self.breaker.record(True)
+
+    def test_trips_at_the_failure_rate(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.fail(1)
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+
+        self.fail(1)
+        self.assertEqual(self.breaker.state, self.breaker.OPEN)
+
+        with self.assertRaises(http.CircuitOpenError) as error:
+            self.breaker.before_request()
+
+        self.assertEqual(error.exception.retry_after, 5)
+        self.assertIsInstance(error.exception, http.aiohttp.ClientError)
+
+    def test_needs_min_requests(self):
+        self.fail(3)
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+
+    def test_old_outcomes_leave_the_window(self):
+        self.fail(3)
+        self.clock.now += 61
+        self.breaker.record(False)
+
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.assertEqual(self.breaker.stats()["requests"], 1)
+
+    def test_half_open_probe_closes(self):
+        self.fail(4)
+        self.clock.now += 5
+
+        self.breaker.before_request()
+        self.assertEqual(self.breaker.state, self.breaker.HALF_OPEN)
+
+        # Only one probe at a time
+        with self.assertRaises(http.CircuitOpenError):
+            self.breaker.before_request()
+
+        self.breaker.record(False)
+
+        self.assertEqual(self.breaker.state, self.breaker.CLOSED)
+        self.breaker.before_request()
+
+    def test_failed_probe_backs_off(self):
+        self.fail(4)
+
+        for open_for in (10, 15, 15):
+            self.clock.now += self.breaker.open_for
+            self.fail(1)
+
+            self.assertEqual(self.breaker.state, self.breaker.OPEN)
+            self.assertEqual(self.breaker.open_for, open_for)
+
+        self.clock.now += 15
+        self.breaker.before_request()
+        self.breaker.record(False)
+
+        self.assertEqual(self.breaker.open_for, 5)
+
+    def test_stuck_probe_stops_blocking_after_the_window(self):
+        self.fail(4)
+        self.clock.now += 5
+        self.breaker.before_request()
+
+        self.clock.now += 60
+        self.breaker.before_request()
+
+
+class HedgeTests(unittest.IsolatedAsyncioTestCase):
+    def source(self, result, delay: float = 0, error: bool = False):
+        async def factory():
+            self.started.append(result)
+            await asyncio.sleep(delay)
+            if error:
+                raise http.aiohttp.ClientError
+            return result
+
+        return factory
+
+    def setUp(self):
+        self.started = []
+
+    async def test_first_answer_wins(self):
+        result = await http.hedge([self.source("a"), self.source("b")], delay=1)
+
+        self.assertEqual(result, (0, "a"))
+        self.assertEqual(self.started, ["a"])
+
+    async def test_slow_source_is_hedged(self):
+        result = await http.hedge(
+            [self.source("a", delay=1), self.source("b")], delay=0.01
+        )
+
+        self.assertEqual(result, (1, "b"))
+
+    async def test_failures_start_the_next_straight_away(self):
+        start = time.perf_counter()
+        result = await http.hedge(
+            [
+                self.source("a", error=True),
+                self.source(None),
+                self.source("c"),
+            ],
+            delay=10,
+        )
+
+        self.assertEqual(result, (2, "c"))
+        self.assertLess(time.perf_counter() - start, 1)
+
+    async def test_losers_are_cancelled(self):
+        slow = asyncio.Event()
+
+        async def never():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                slow.set()
+                raise
+
+        result = await http.hedge([never, self.source("b")], delay=0.01)
+        await asyncio.sleep(0)
+
+        self.assertEqual(result, (1, "b"))
+        self.assertTrue(slow.is_set())
+
+    async def test_nothing_answers(self):
+        result = await http.hedge(
+            [self.source("a", error=True), self.source(None)], delay=0.01
+        )
+
+        self.assertEqual(result, (None, None))
+
+
+class HistogramTests(unittest.TestCase):
+    def test_buckets_cover_every_value_once(self):
+        for value in [*range(1, 5000), *range(5000, 10_000_000, 997)]:
+            index = metrics.Histogram.index(value)
+
+            self.assertLessEqual(value, metrics.Histogram.upper_bound(index))
+            self.assertLess(metrics.Histogram.upper_bound(index - 1), value)
+
+    def test_percentiles_are_within_a_bucket(self):
+        histogram = metrics.Histogram()
+        values = [value / 1000 for value in range(1, 10_001)]
+
+        for value in values:
+            histogram.record(value)
+
+        for quantile in (0.5, 0.9, 0.99):
+            with self.subTest(quantile=quantile):
+                real = values[int(quantile * len(values)) - 1]
+                percentile = histogram.percentile(quantile)
+
+                self.assertGreaterEqual(percentile, real)
+                self.assertLessEqual(percentile, real * 1.0625)
+
+        self.assertEqual(histogram.count, 10_000)
+        self.assertEqual(histogram.percentile(1), 10)
+        self.assertAlmostEqual(histogram.total, sum(values))
+
+    def test_stays_small(self):
+        histogram = metrics.Histogram()
+
+        for value in range(100_000):
+            histogram.record(value / 1000)
+
+        self.assertLess(len(histogram.counts), 500)
+
+    def test_empty(self):
+        self.assertEqual(metrics.Histogram().percentile(0.5), 0.0)
+
+
+class MetricsTests(unittest.IsolatedAsyncioTestCase):
+    async def test_timed_adds_to_the_running_command(self):
+        timings = metrics.Metrics().timings()
+
+        async def sleep():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        self.assertEqual(await metrics.timed("http", sleep)(), "done")
+
+        token = metrics.CURRENT.set(timings)
+        try:
+            await metrics.timed("http", sleep)()
+            metrics.add_time("db", 0.5)
+        finally:
+            metrics.CURRENT.reset(token)
+
+        self.assertGreaterEqual(timings["http"], 0.01)
+        self.assertEqual(timings["db"], 0.5)
+        self.assertEqual(timings["discord"], 0)
+
+    def test_prometheus_exposition(self):
+        stats = metrics.Metrics()
+        stats.record("ping", 0.002, False, {"db": 0.001, "http": 0, "discord": 0})
+        stats.record("ping", 0.004, True, {"db": 0, "http": 0, "discord": 0.003})
+        stats.record('odd "name"', 1, False, stats.timings())
+
+        lines = stats.prometheus().splitlines()
+
+        for line in (
+            "# TYPE snakebot_command_duration_seconds summary",
+            'snakebot_command_duration_seconds_count{command="ping"} 2',
+            'snakebot_command_duration_seconds_sum{command="ping"} 0.006000',
+            'snakebot_command_errors_total{command="ping"} 1',
+            'snakebot_command_component_seconds_total{command="ping",'
+            'component="discord"} 0.003000',
+            'snakebot_command_errors_total{command="odd \\"name\\""} 0',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, lines)
+
+        quantiles = [
+            line
+            for line in lines
+            if line.startswith('snakebot_command_duration_seconds{command="ping"')
+        ]
+        self.assertEqual(len(quantiles), len(metrics.QUANTILES))
+
+        # Every sample ends in a number
+        for line in lines:
+            if not line.startswith("#"):
+                float(line.rsplit(" ", 1)[1])
+
+    def test_reset(self):
+        stats = metrics.Metrics()
+        stats.record("ping", 0.002, False, stats.timings())
+        stats.reset()
+
+        self.assertEqual(stats.commands, {})
+
+
+class CalculationTests(unittest.TestCase):
+    def test_expressions(self):
+        for expr, expected in (
+            ("2 + 3 * 4", 14),
+            ("(2 + 3) * 4", 20),
+            ("7 // 2 + 7 % 2", 4),
+            ("0.1 + 0.2", Decimal("0.3")),
+            ("-2 ** 2", -4),
+            ("1 << 4 | 1", 17),
+            ("~5 ^ 3", -7),
+            ("sqrt(16) + fact(4)", 28),
+            ("comb(5, 2) == 10", True),
+            ("pi", calculation.CONSTANTS["pi"]),
+        ):
+            with self.subTest(expr=expr):
+                self.assertEqual(calculation.compile_expression(expr)(), expected)
+
+    def test_rejects_unsafe_expressions(self):
+        for expr in (
+            "__import__('os')",
+            "x + 1",
+            "(1).real",
+            "'a' * 5",
+            "1 < 2",
+            "sqrt(x=4)",
+            "[1, 2]",
+        ):
+            with self.subTest(expr=expr), self.assertRaises(ValueError):
+                calculation.compile_expression(expr)()
+
+    def test_limits(self):
+        for expr in ("9 ** 9999", "fact(5001)", "comb(10001, 2)", "perm(5001)"):
+            with self.subTest(expr=expr), self.assertRaises(ValueError):
+                calculation.compile_expression(expr)()
+
+    def test_compiled_expressions_are_cached(self):
+        self.assertIs(
+            calculation.compile_expression("1 + 1"),
+            calculation.compile_expression("1 + 1"),
+        )
+
+    def test_safe_eval(self):
+        node = ast.parse("3 * 3", mode="eval").body
+        self.assertEqual(calculation.safe_eval(node), 9)
+
+    def test_column(self):
+        self.assertEqual(calculation.column(0, 2), 0b1100)
+        self.assertEqual(calculation.column(1, 2), 0b1010)
+        self.assertEqual(calculation.column(0, 1), 0b10)
+
+    def test_truth_table_matches_evaluating_each_row(self):
+        for expr, letters, func in (
+            ("A", ("A",), lambda a: a),
+            ("not A", ("A",), lambda a: not a),
+            ("A and B", ("A", "B"), lambda a, b: a and b),
+            ("A or B", ("A", "B"), lambda a, b: a or b),
+            ("A @ B", ("A", "B"), lambda a, b: not a or b),
+            ("A == B", ("A", "B"), lambda a, b: a == b),
+            ("A ^ B", ("A", "B"), lambda a, b: a != b),
+            ("A == B == C", ("A", "B", "C"), lambda a, b, c: a == b == c),
+            (
+                "not (A @ B) or C and 1",
+                ("A", "B", "C"),
+                lambda a, b, c: not (not a or b) or c,
+            ),
+            (
+                "((A @ B) and (B @ C)) @ (A @ C)",
+                ("A", "B", "C"),
+                lambda a, b, c: True,
+            ),
+            ("A and 0", ("A",), lambda a: False),
+        ):
+            with self.subTest(expr=expr):
+                count = len(letters)
+                results = calculation.truth_table(expr, letters)
+
+                for row in range(1 << count):
+                    values = [bool(row >> (count - 1 - i) & 1) for i in range(count)]
+
+                    self.assertEqual(
+                        bool(results >> row & 1), bool(func(*values)), values
+                    )
+
+                self.assertLess(results, 1 << (1 << count))
+
+    def test_truth_table_handles_the_most_variables(self):
+        letters = tuple("ABCDEFGHIJKL")[: calculation.MAX_TRUTH_VARIABLES]
+        results = calculation.truth_table(" or ".join(letters), letters)
+
+        # Only the row where every variable is false is false
+        self.assertEqual(results, (1 << (1 << len(letters))) - 2)
+
+    def test_truth_table_rejects_unknown_syntax(self):
+        for expr in ("A + B", "A < B", "C"):
+            with self.subTest(expr=expr), self.assertRaises(ValueError):
+                calculation.truth_table(expr, ("A", "B"))
+
+
+class CommandIndexTests(unittest.TestCase):
+    names = [
+        "balance",
+        "baltop",
+        "nettop",
+        "networth",
+        "stock",
+        "stocks",
+        "crypto",
+        "cryptobal",
+        "truth",
+        "calc",
+        "poll",
+        "endpoll",
+        "restore",
+        "backup",
+        "watchdog",
+        "watchdog stack",
+    ]
+
+    def setUp(self):
+        self.index = fuzzy.CommandIndex()
+        self.index.build(self.names)
+
+    def test_build(self):
+        self.assertEqual(len(self.index), len(self.names))
+        self.assertFalse(self.index.stale)
+        self.assertIn("baltop", self.index.grams["^b"])
+
+        self.index.invalidate()
+        self.assertTrue(self.index.stale)
+
+        self.index.build(["other"])
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.search("baltop"), [])
+
+    def test_typos(self):
+        for word, expected in (
+            ("baltpo", "baltop"),
+            ("blaance", "balance"),
+            ("netwroth", "networth"),
+            ("trth", "truth"),
+            ("endpol", "endpoll"),
+        ):
+            with self.subTest(word=word):
+                self.assertEqual(self.index.search(word)[0], expected)
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("zzzzzz"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_agrees_with_difflib(self):
+        for word in ("stcok", "crpyto", "calk", "pol", "watchdg", "resotre", "ntetop"):
+            with self.subTest(word=word):
+                self.assertEqual(
+                    self.index.search(word)[:3],
+                    difflib.get_close_matches(word, self.names, 3),
+                )
+
+
+class SlidingWindowTests(unittest.TestCase):
+    def test_rate(self):
+        window = ratelimit.SlidingWindow(5, 10)
+
+        self.assertFalse(any(window.hit("a", 1 + i / 10) for i in range(5)))
+        self.assertTrue(window.hit("a", 2))
+        self.assertFalse(window.hit("b", 2))
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        window = ratelimit.SlidingWindow(5, 10)
+
+        for _ in range(5):
+            window.hit("a", 5)
+
+        # 5 * 0.8 + 1 then 2 hits over the last 10 seconds
+        self.assertFalse(window.hit("a", 12))
+        self.assertTrue(window.hit("a", 12))
+
+        # 5 * 0.2 + 3 hits
+        self.assertFalse(window.hit("a", 18))
+
+    def test_old_windows_are_forgotten(self):
+        window = ratelimit.SlidingWindow(5, 10)
+        window.hit("a", 5, amount=5)
+
+        self.assertFalse(window.hit("a", 25, amount=5))
+        self.assertTrue(window.hit("a", 25))
+
+    def test_late_hits_count_in_the_current_window(self):
+        window = ratelimit.SlidingWindow(1, 10)
+        window.hit("a", 15)
+
+        self.assertTrue(window.hit("a", 5))
+
+    def test_maxsize_drops_least_recently_hit(self):
+        window = ratelimit.SlidingWindow(1, 10, maxsize=2)
+        window.hit("a", 1, amount=2)
+        window.hit("b", 1)
+        window.hit("a", 1)
+        window.hit("c", 1)
+
+        self.assertEqual(len(window), 2)
+        self.assertEqual(list(window.counters), ["a", "c"])
+        self.assertFalse(window.hit("b", 1))
+
+
+class SlidingSketchTests(unittest.TestCase):
+    def test_rate(self):
+        sketch = ratelimit.SlidingSketch(5, 10)
+
+        for key in range(10_000):
+            sketch.hit(f"noise {key}", 1)
+
+        self.assertFalse(any(sketch.hit("a", 1) for _ in range(5)))
+        self.assertTrue(sketch.hit("a", 1))
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        sketch = ratelimit.SlidingSketch(5, 10)
+        sketch.hit("a", 5, amount=5)
+
+        self.assertFalse(sketch.hit("a", 12))
+        self.assertTrue(sketch.hit("a", 12))
+        self.assertFalse(sketch.hit("a", 18))
+
+    def test_old_windows_are_forgotten(self):
+        sketch = ratelimit.SlidingSketch(5, 10)
+        sketch.hit("a", 5, amount=5)
+
+        self.assertFalse(sketch.hit("a", 25, amount=5))
+        self.assertTrue(sketch.hit("a", 25))
+
+    def test_never_underestimates(self):
+        sketch = ratelimit.SlidingSketch(3, 10, width=16, depth=2)
+        counts = {}
+
+        for i in range(500):
+            key = f"key {i % 50}"
+            counts[key] = counts.get(key, 0) + 1
+            over = sketch.hit(key, 1)
+
+            if counts[key] > 3:
+                self.assertTrue(over)
+
+    def test_fixed_size(self):
+        sketch = ratelimit.SlidingSketch(5, 10, width=1 << 8, depth=4)
+
+        for key in range(10_000):
+            sketch.hit(key, key / 1000)
+
+        self.assertEqual(len(sketch.current), (1 << 8) * 4)
+        self.assertEqual(len(sketch.previous), (1 << 8) * 4)
+
+
+class PoliciesTests(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.policies = self.DB.policies
+
+        self.DB.main.put(b"1-disabled_channels", orjson.dumps([10, 11]))
+        self.DB.main.put(b"1-t-ping", b"1")
+        self.DB.main.put(b"2-t-calc", b"1")
+        self.DB.blacklist.put(b"1-100", b"2")
+        self.DB.blacklist.put(b"2-101", b"1")
+        self.DB.blacklist.put(b"102", b"1")
+
+    def test_load(self):
+        policy = self.policies.get(1)
+
+        self.assertIsInstance(policy, GuildPolicy)
+        self.assertEqual(policy.disabled_channels, {10, 11})
+        self.assertEqual(policy.disabled_commands, {"ping"})
+        self.assertEqual(policy.blacklist, {100: b"2"})
+
+        empty = self.policies.get(3)
+        self.assertEqual(
+            (empty.disabled_channels, empty.disabled_commands, empty.blacklist),
+            (frozenset(), frozenset(), {}),
+        )
+
+    def test_snapshot_is_kept_until_invalidated(self):
+        policy = self.policies.get(1)
+        self.DB.main.put(b"1-t-calc", b"1")
+
+        self.assertIs(self.policies.get(1), policy)
+        self.assertNotIn("calc", self.policies.get(1).disabled_commands)
+
+        self.policies.get(2)
+        self.policies.invalidate(1)
+
+        self.assertEqual(len(self.policies), 1)
+        self.assertEqual(self.policies.get(1).disabled_commands, {"ping", "calc"})
+
+    def test_blacklisted(self):
+        self.assertEqual(self.policies.blacklisted(102), b"1")
+        self.assertEqual(self.policies.blacklisted(102, 1), b"1")
+        self.assertEqual(self.policies.blacklisted(100, 1), b"2")
+        self.assertIsNone(self.policies.blacklisted(100))
+        self.assertIsNone(self.policies.blacklisted(100, 2))
+        self.assertEqual(self.DB.get_blacklist(b"101", b"2"), b"1")
+
+    def test_global_blacklist_is_kept_until_invalidated(self):
+        self.assertIsNone(self.policies.blacklisted(103))
+        self.DB.blacklist.put(b"103", b"2")
+
+        self.assertIsNone(self.policies.blacklisted(103))
+
+        self.policies.invalidate(1)
+        self.assertIsNone(self.policies.blacklisted(103))
+
+        self.policies.invalidate()
+        self.assertEqual(self.policies.blacklisted(103), b"2")
+
+    def test_clear(self):
+        self.policies.get(1)
+        self.policies.blacklisted(102)
+        self.policies.clear()
+
+        self.assertEqual(len(self.policies), 0)
+        self.assertIsNone(self.policies.global_blacklist)
+
+
+class NetWorthTests(DatabaseTestCase):
+    PRICES = {"stocks": {"AAPL": 10.0, "MSFT": 20.0}, "crypto": {"BTC": 100.0}}
+
+    async def asyncSetUp(self):
+        self.networth = self.DB.networth
+
+        for kind, prices in self.PRICES.items():
+            await self.DB.put_prices(
+                kind, [(symbol, price, 0.0, 0.0) for symbol, price in prices.items()]
+            )
+
+        for number in range(20):
+            member_id = str(number).encode()
+            self.DB.put_bal(member_id, Decimal(number * 7 % 11 * 100))
+            self.DB.put_stockbal(
+                member_id,
+                {"AAPL": {"total": number % 3}, "MSFT": {"total": number % 2}},
+            )
+            if number % 4 == 0:
+                self.DB.put_cryptobal(member_id, {"BTC": {"total": number / 8}})
+
+    def brute_force(self) -> list:
+        """Values every member straight from the db."""
+        ranking = []
+
+        for member_id, balance in self.DB.bal:
+            value = float(codec.decode_decimal(balance))
+
+            for kind, name in (("stocks", "stockbal"), ("crypto", "cryptobal")):
+                if data := getattr(self.DB, name).get(member_id):
+                    value += sum(
+                        self.PRICES[kind].get(symbol, 0) * holding["total"]
+                        for symbol, holding in orjson.loads(data).items()
+                    )
+
+            ranking.append((member_id, value))
+
+        return sorted(ranking, key=lambda item: (item[1], item[0]), reverse=True)
+
+    async def test_load(self):
+        await self.networth.ensure_loaded()
+
+        self.assertEqual(list(self.networth.top()), self.brute_force())
+
+    async def test_concurrent_loads_scan_once(self):
+        with unittest.mock.patch.object(
+            self.networth, "scan", wraps=self.networth.scan
+        ) as scan:
+            await asyncio.gather(*(self.networth.ensure_loaded() for _ in range(5)))
+            await self.networth.ensure_loaded()
+
+        self.assertEqual(scan.call_count, 1)
+        self.assertTrue(self.networth.loaded)
+
+    async def test_updates_during_scan_are_kept(self):
+        scan = self.networth.scan
+        scanned = threading.Event()
+        resume = threading.Event()
+
+        def slow_scan():
+            result = scan()
+            scanned.set()
+            resume.wait(5)
+            return result
+
+        with unittest.mock.patch.object(self.networth, "scan", slow_scan):
+            loading = asyncio.create_task(self.networth.ensure_loaded())
+            await asyncio.to_thread(scanned.wait, 5)
+
+            self.DB.put_bal(b"3", Decimal(50_000))
+            self.DB.put_stockbal(b"4", {"MSFT": {"total": 100}})
+            resume.set()
+            await loading
+
+        self.assertEqual(list(self.networth.top()), self.brute_force())
+        self.assertEqual(next(self.networth.top())[0], b"3")
+
+    async def test_updates_after_load(self):
+        await self.networth.ensure_loaded()
+
+        self.DB.put_bal(b"5", Decimal(0))
+        self.DB.put_cryptobal(b"6", {"BTC": {"total": 1000}})
+        self.DB.put_bal(b"new", Decimal(250))
+
+        self.assertEqual(list(self.networth.top()), self.brute_force())
+
+    async def test_update_prices(self):
+        await self.networth.ensure_loaded()
+
+        # MSFT is delisted so is valued at nothing
+        self.PRICES = {"stocks": {"AAPL": 30.0}, "crypto": {"BTC": 100.0}}
+        await self.DB.put_prices("stocks", [("AAPL", 30.0, 0.0, 0.0)])
+
+        self.assertEqual(list(self.networth.top()), self.brute_force())
+
+    async def test_reset(self):
+        await self.networth.ensure_loaded()
+        self.networth.reset()
+
+        self.assertFalse(self.networth.tracking)
+        self.assertEqual(list(self.networth.top()), [])
+
+        await self.networth.ensure_loaded()
+        self.assertEqual(list(self.networth.top()), self.brute_force())